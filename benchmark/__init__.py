@@ -0,0 +1,17 @@
+# FILE: benchmark/__init__.py
+"""Load benchmark for the notes app.
+
+    python -m benchmark generate --scale small --db /tmp/bench.db
+    python -m benchmark run --db /tmp/bench.db
+    python -m benchmark run --db /tmp/bench.db --save-baseline benchmark/baseline.json
+    python -m benchmark startup --runs 10 --imports
+    python -m benchmark capacity --db /tmp/bench.db --levels 10 100 500
+
+`generate` builds a synthetic dataset (see benchmark.dataset.SCALES);
+`run` drives the key routes through the Flask test client (or a live server
+with --url, optionally with --concurrency clients and Socket.IO collab
+traffic) and reports p50/p95/p99 latency and queries per request, diffed
+against benchmark/baseline.json (or --baseline PATH; --baseline '' skips
+the diff). `capacity` holds increasing numbers of
+long-poll connections against the debug dev server and serve.py.
+"""
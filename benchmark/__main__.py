@@ -0,0 +1,130 @@
+# FILE: benchmark/__main__.py
+import argparse
+import os
+import sys
+
+from . import capacity, dataset, report, runner, scenarios, startup
+
+
+def _app(db_path, extra=None):
+    from website import create_app
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.abspath(db_path)}",
+        'INSTRUMENTATION_ENABLED': True,
+        'ATTACHMENT_PROCESS_INLINE': True,
+        # One benchmark user hammers each write route; measure the route, not the budget
+        'RATELIMIT_ENABLED': False,
+    }
+    config.update(extra or {})
+    return create_app(config)
+
+
+def cmd_generate(args):
+    if os.path.exists(args.db):
+        sys.exit(f"{args.db} already exists; pick a fresh path")
+    scale = dataset.resolve_scale(
+        args.scale, users=args.users, notes=args.notes, messages=args.messages,
+        classrooms=args.classrooms, class_size=args.class_size
+    )
+    context = dataset.generate(_app(args.db), scale, seed=args.seed)
+    dataset.save_context(args.db, context)
+    print(f"Context written to {dataset.context_path(args.db)}")
+
+
+def cmd_run(args):
+    context = dataset.load_context(args.db)
+    selected = scenarios.select(args.only)
+
+    if args.url:
+        results = runner.run_scenarios(
+            lambda: runner.HttpClient(args.url), selected, context,
+            iterations=args.iterations, warmup=args.warmup, concurrency=args.concurrency
+        )
+        if args.socketio:
+            try:
+                results.update(runner.run_socketio_http(args.url, context, args.iterations, args.concurrency))
+            except ImportError as exc:
+                print(f"Skipping Socket.IO benchmark: {exc}", file=sys.stderr)
+    else:
+        app = _app(args.db)
+        results = runner.run_scenarios(
+            lambda: runner.TestClient(app), selected, context,
+            iterations=args.iterations, warmup=args.warmup, concurrency=args.concurrency
+        )
+        if args.socketio:
+            results.update(runner.run_socketio_inprocess(app, context, args.iterations, args.concurrency))
+
+    summary = report.summarize(results)
+    baseline = report.load_baseline(args.baseline) if args.baseline and os.path.exists(args.baseline) else None
+    print(report.format_table(summary, baseline, args.tolerance))
+
+    if args.save_baseline:
+        options = {k: getattr(args, k) for k in ('iterations', 'warmup', 'concurrency', 'url', 'socketio')}
+        report.save_baseline(args.save_baseline, summary, context, options)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if baseline is not None and args.fail_on_regression:
+        if any(regressions for *_, regressions in report.compare(summary, baseline, args.tolerance)):
+            sys.exit(1)
+
+
+def cmd_startup(args):
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.abspath(args.db)}"} if args.db else {}
+    print(startup.format_report(startup.measure(args.runs, config)))
+    if args.imports:
+        print("\nslowest imports (self time):")
+        for seconds, module in startup.slowest_imports(config=config):
+            print(f"  {seconds * 1000:>7.1f}ms  {module}")
+
+
+def cmd_capacity(args):
+    results = capacity.compare(args.db, args.levels, worker=args.worker, probes=args.probes)
+    print(capacity.format_report(results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='build a synthetic dataset')
+    gen.add_argument('--db', required=True, help='path of the new SQLite database')
+    gen.add_argument('--scale', choices=sorted(dataset.SCALES), default='tiny')
+    gen.add_argument('--seed', type=int, default=1)
+    for name in ('users', 'notes', 'messages', 'classrooms', 'class-size'):
+        gen.add_argument(f'--{name}', type=int, help=f'override the preset {name}')
+    gen.set_defaults(func=cmd_generate)
+
+    run = sub.add_parser('run', help='benchmark the key routes')
+    run.add_argument('--db', required=True, help='database created by "generate"')
+    run.add_argument('--url', help='benchmark a live server instead of the test client')
+    run.add_argument('--iterations', type=int, default=20)
+    run.add_argument('--warmup', type=int, default=2)
+    run.add_argument('--concurrency', type=int, default=1)
+    run.add_argument('--socketio', action='store_true', help='also measure collab_submit round trips')
+    run.add_argument('--only', nargs='*', help='scenario names (e.g. views.home admin.dashboard)')
+    run.add_argument('--baseline', default='benchmark/baseline.json',
+                     help='baseline JSON to diff against (default: %(default)s; "" to skip)')
+    run.add_argument('--save-baseline', help='write this run as a baseline JSON')
+    run.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth before flagging (0.2 = 20%%)')
+    run.add_argument('--fail-on-regression', action='store_true')
+    run.set_defaults(func=cmd_run)
+
+    boot = sub.add_parser('startup', help='time cold imports, create_app and the first request')
+    boot.add_argument('--runs', type=int, default=10)
+    boot.add_argument('--db', help='database for the first request (default: the app default)')
+    boot.add_argument('--imports', action='store_true', help='also list the slowest imports')
+    boot.set_defaults(func=cmd_startup)
+
+    cap = sub.add_parser('capacity', help='concurrent connections: debug dev server vs serve.py')
+    cap.add_argument('--db', required=True, help='database created by "generate"')
+    cap.add_argument('--levels', type=int, nargs='+', default=[10, 100, 250, 500])
+    cap.add_argument('--worker', default='auto', help='serve.py --worker (auto, eventlet, gevent, threading)')
+    cap.add_argument('--probes', type=int, default=20, help='GET /login timings per level')
+    cap.set_defaults(func=cmd_capacity)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# FILE: benchmark/capacity.py
+"""Concurrent-connection capacity: the debug dev server against serve.py.
+
+Each level opens N Engine.IO long-polls (the transport clients without
+WebSockets use), holds them open, and meanwhile times plain GET requests.
+A server that cannot hold N connections shows failed handshakes and a
+slow or failing probe.
+"""
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from website.instrumentation import percentile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# What run_socketio_app() does, on a chosen port and database
+DEV_SERVER = """
+from website import create_app, socketio
+app = create_app({{'SQLALCHEMY_DATABASE_URI': {uri!r}}})
+socketio.run(app, host='127.0.0.1', port={port}, debug=True, allow_unsafe_werkzeug=True)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, db_path, port, worker='auto', connections=1000):
+    """Start 'dev' (socketio.run with debug=True) or 'serve' (serve.py) as a subprocess."""
+    if kind == 'dev':
+        script = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+        script.write(DEV_SERVER.format(uri=f"sqlite:///{os.path.abspath(db_path)}", port=port))
+        script.close()
+        command = [sys.executable, script.name]
+    else:
+        command = [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(port), '--db', db_path,
+                   '--worker', worker, '--connections', str(connections)]
+    # Own process group: the dev reloader forks a child that must be stopped too
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    process.script = command[1] if kind == 'dev' else None
+    return process
+
+
+def stop_server(process, timeout=30):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    if process.script:
+        os.unlink(process.script)
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if _get(port, '/login')[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not come up in {timeout}s")
+
+
+def rss_mb(pid):
+    """Resident memory of `pid` and its descendants (Linux /proc), or None."""
+    try:
+        parents = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+    except OSError:
+        return None
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [p for p, pp in parents.items() if pp == parent and p not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for p in tree:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def _get(port, path, timeout=10):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+class _HeldPoll(threading.Thread):
+    """One Engine.IO client: handshake, then a long-poll GET left waiting on the server."""
+
+    def __init__(self, port, timeout):
+        super().__init__(daemon=True)
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+        self.holding = threading.Event()
+        self.failed = False
+
+    def run(self):
+        try:
+            status, body = _get(self.port, '/socket.io/?EIO=4&transport=polling', self.timeout)
+            sid = json.loads(body.decode()[1:])['sid']
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            self.conn.request('GET', f'/socket.io/?EIO=4&transport=polling&sid={sid}')
+            self.holding.set()
+            self.conn.getresponse().read()
+        except (OSError, ValueError, KeyError, http.client.HTTPException):
+            self.failed = not self.holding.is_set()
+            self.holding.set()
+
+    def release(self):
+        if self.conn is not None and self.conn.sock is not None:
+            try:
+                self.conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def measure_level(port, connections, probes=20, timeout=20):
+    """Hold `connections` long-polls, time `probes` GET /login meanwhile."""
+    polls = [_HeldPoll(port, timeout) for _ in range(connections)]
+    started = time.perf_counter()
+    for poll in polls:
+        poll.start()
+    for poll in polls:
+        poll.holding.wait(timeout)
+    open_seconds = time.perf_counter() - started
+
+    latencies, errors = [], 0
+    for _ in range(probes):
+        t0 = time.perf_counter()
+        try:
+            ok = _get(port, '/login', timeout)[0] == 200
+        except OSError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - t0)
+        else:
+            errors += 1
+
+    for poll in polls:
+        poll.release()
+    for poll in polls:
+        poll.join(1)
+    latencies.sort()
+    return {
+        'connections': connections,
+        'failed': sum(poll.failed for poll in polls),
+        'open_seconds': open_seconds,
+        'probe_errors': errors,
+        'probe_p50': percentile(latencies, 50) if latencies else None,
+        'probe_p95': percentile(latencies, 95) if latencies else None,
+    }
+
+
+def compare(db_path, levels, worker='auto', probes=20):
+    """{server: {'rss_mb': ..., 'levels': [measure_level rows]}} for the dev server and serve.py."""
+    results = {}
+    for kind in ('dev', 'serve'):
+        port = free_port()
+        process = start_server(kind, db_path, port, worker, connections=max(levels) + 100)
+        try:
+            wait_ready(port)
+            rows = [measure_level(port, level, probes) for level in levels]
+            results[kind] = {'rss_mb': rss_mb(process.pid), 'levels': rows}
+        finally:
+            stop_server(process)
+    return results
+
+
+def format_report(results):
+    lines = [f"{'server':7} {'conns':>6} {'failed':>7} {'open':>8} {'probe p50':>10} {'probe p95':>10} {'errors':>7}"]
+    for kind, result in results.items():
+        for row in result['levels']:
+            p50 = f"{row['probe_p50'] * 1000:.1f}ms" if row['probe_p50'] is not None else '-'
+            p95 = f"{row['probe_p95'] * 1000:.1f}ms" if row['probe_p95'] is not None else '-'
+            lines.append(f"{kind:7} {row['connections']:>6} {row['failed']:>7} {row['open_seconds']:>7.2f}s "
+                         f"{p50:>10} {p95:>10} {row['probe_errors']:>7}")
+    lines.append('')
+    for kind, result in results.items():
+        if result['rss_mb'] is not None:
+            lines.append(f"{kind} resident memory (process tree): {result['rss_mb']:.0f} MB")
+    return '\n'.join(lines)
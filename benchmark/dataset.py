@@ -0,0 +1,305 @@
+# FILE: benchmark/dataset.py
+"""Synthetic dataset generator.
+
+Rows are written with Core executemany inserts in large batches with
+explicit ids, inside a single transaction with FK checks deferred and one
+precomputed password hash, so a 'large' dataset (100k users, 1M notes, 10M
+messages) is practical on SQLite. A small set of well-known principals (admin, a teacher, a student in
+the biggest classroom and their busiest DM partner) is written to
+<db>.context.json for the runner.
+"""
+
+import json
+import random
+import time
+from dataclasses import dataclass, asdict, replace
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select, func, text
+from werkzeug.security import generate_password_hash
+
+from website import db
+from website.models import (
+    User, Note, Tag, Comment, Reaction, ClassRoom, ClassPost, ClassChatMessage,
+    Message, Poll, PollOption, PollVote, tags_notes_association, classroom_students
+)
+from website.tags import recount_tags
+
+PASSWORD = "password123"
+BATCH_SIZE = 5000
+
+FIRST_NAMES = [
+    "Ada", "Ben", "Chloe", "Dev", "Elena", "Farah", "Gus", "Hana", "Ivan", "Jada",
+    "Kofi", "Lena", "Milo", "Nora", "Omar", "Priya", "Quinn", "Rosa", "Sami", "Tara",
+]
+WORDS = (
+    "lecture summary flask sqlalchemy query index join cache session template route "
+    "exam project deadline review notes chapter theorem proof graph tree heap python"
+).split()
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    notes: int
+    messages: int
+    classrooms: int
+    class_size: int
+    tags: int
+    tags_per_note: int = 3
+    posts_per_class: int = 20
+    chat_per_class: int = 200
+    polls_per_class: int = 2
+    comments: int = 0
+    reactions: int = 0
+    partners_per_user: int = 5
+
+
+SCALES = {
+    'tiny': Scale(users=200, notes=2_000, messages=10_000, classrooms=10, class_size=100, tags=100,
+                  comments=1_000, reactions=1_000),
+    'small': Scale(users=5_000, notes=50_000, messages=200_000, classrooms=100, class_size=1_000, tags=1_000,
+                   comments=25_000, reactions=25_000),
+    'large': Scale(users=100_000, notes=1_000_000, messages=10_000_000, classrooms=1_000, class_size=20_000,
+                   tags=10_000, comments=500_000, reactions=500_000),
+}
+
+
+def email_for(user_id):
+    return f"user{user_id}@bench.local"
+
+
+def _words(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def _insert_batches(table, rows, stats, progress=None, batch_size=BATCH_SIZE):
+    """Execute `rows` (an iterable of dicts) as batched executemany inserts; the caller commits."""
+    target = table.__table__ if hasattr(table, '__table__') else table
+    started = time.perf_counter()
+    batch, count = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(target), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(target), batch)
+        count += len(batch)
+    elapsed = time.perf_counter() - started
+    rows_done, seconds = stats.get(target.name, (0, 0.0))
+    stats[target.name] = (rows_done + count, seconds + elapsed)
+    if progress and count:
+        progress(f"  {target.name}: {count:,} rows in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+    return count
+
+
+def _defer_foreign_keys():
+    """Postpone FK enforcement to COMMIT for the current transaction."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(text('PRAGMA defer_foreign_keys = ON'))
+    elif dialect == 'postgresql':
+        db.session.execute(text('SET CONSTRAINTS ALL DEFERRED'))
+
+
+def generate(app, scale, seed=1, progress=print, batch_size=BATCH_SIZE):
+    """Populate an empty database for `scale`; returns the context dict."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(days=365)
+    span = int((now - start).total_seconds())
+
+    def ts():
+        return start + timedelta(seconds=rng.randrange(span))
+
+    stats = {}
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        if db.session.scalar(select(func.count()).select_from(User)):
+            raise RuntimeError("Benchmark database is not empty; use a fresh --db path")
+
+        # Everything below is one transaction: no per-batch commits or fsyncs
+        _defer_foreign_keys()
+
+        password = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+        teachers = max(1, scale.classrooms // 2)
+        admin_id = 1
+        teacher_ids = range(2, 2 + teachers)
+        first_student = 2 + teachers
+        student_id = first_student
+        partner_id = first_student + 1
+        student_ids = range(first_student, scale.users + 1)
+        student_pool = list(student_ids)
+
+        def users():
+            for i in range(1, scale.users + 1):
+                role = 'admin' if i == admin_id else ('teacher' if i in teacher_ids else 'student')
+                yield {
+                    'id': i, 'email': email_for(i), 'password': password,
+                    'first_name': f"{rng.choice(FIRST_NAMES)} {i}",
+                    'is_admin': i == admin_id, 'role': role,
+                }
+        _insert_batches(User, users(), stats, progress, batch_size)
+
+        # Notes: the benchmark student owns 1% of them, the rest are spread evenly
+        heavy = max(1, scale.notes // 100)
+        student_note_ids = []
+        public_note_ids = []
+
+        def notes():
+            for i in range(1, scale.notes + 1):
+                owner = student_id if i <= heavy else rng.randint(1, scale.users)
+                is_public = rng.random() < 0.3
+                if owner == student_id:
+                    student_note_ids.append(i)
+                elif is_public and not public_note_ids:
+                    public_note_ids.append(i)
+                yield {
+                    'id': i, 'title': _words(rng, 4).title(),
+                    'content': f"<p>{_words(rng, 60)}</p>",
+                    'pinned': rng.random() < 0.02, 'is_public': is_public,
+                    'share_link': f"b{i:x}", 'collab_rev': 0,
+                    'timestamp': ts(), 'user_id': owner,
+                }
+        _insert_batches(Note, notes(), stats, progress, batch_size)
+
+        tag_names = [f"{rng.choice(WORDS)}-{i}" for i in range(1, scale.tags + 1)]
+        _insert_batches(Tag, ({'id': i, 'name': name, 'note_count': 0}
+                              for i, name in enumerate(tag_names, start=1)), stats, progress, batch_size)
+
+        def tag_links():
+            for note_id in range(1, scale.notes + 1):
+                # Skewed popularity: low tag ids are used far more often
+                picked = {1 + int(scale.tags * rng.random() ** 3) for _ in range(rng.randint(0, scale.tags_per_note * 2))}
+                for tag_id in picked:
+                    yield {'note_id': note_id, 'tag_id': tag_id}
+        _insert_batches(tags_notes_association, tag_links(), stats, progress, batch_size)
+        all_tag_ids = list(range(1, scale.tags + 1))
+        for i in range(0, len(all_tag_ids), 500):
+            recount_tags(all_tag_ids[i:i + 500])
+
+        # Classrooms: #1 is the big one, and the benchmark student sits in it
+        def classrooms():
+            for i in range(1, scale.classrooms + 1):
+                yield {'id': i, 'name': f"Class {i}: {_words(rng, 2).title()}",
+                       'code': f"BENCH{i}", 'teacher_id': teacher_ids[(i - 1) % teachers]}
+        _insert_batches(ClassRoom, classrooms(), stats, progress, batch_size)
+
+        def memberships():
+            pool = student_pool
+            for class_id in range(1, scale.classrooms + 1):
+                size = scale.class_size if class_id == 1 else rng.randint(10, max(10, scale.class_size // 10))
+                members = set(rng.sample(pool, min(size, len(pool))))
+                if class_id <= 3:
+                    members.add(student_id)
+                for user_id in members:
+                    yield {'user_id': user_id, 'classroom_id': class_id}
+        _insert_batches(classroom_students, memberships(), stats, progress, batch_size)
+
+        def posts():
+            for class_id in range(1, scale.classrooms + 1):
+                teacher = teacher_ids[(class_id - 1) % teachers]
+                for _ in range(scale.posts_per_class * (5 if class_id == 1 else 1)):
+                    yield {'title': _words(rng, 3).title(), 'content': f"<p>{_words(rng, 30)}</p>",
+                           'timestamp': ts(), 'user_id': teacher, 'classroom_id': class_id}
+        _insert_batches(ClassPost, posts(), stats, progress, batch_size)
+
+        def chat():
+            for class_id in range(1, scale.classrooms + 1):
+                for _ in range(scale.chat_per_class * (10 if class_id == 1 else 1)):
+                    yield {'classroom_id': class_id, 'user_id': rng.choice(student_ids),
+                           'content': _words(rng, 8), 'timestamp': ts()}
+        _insert_batches(ClassChatMessage, chat(), stats, progress, batch_size)
+
+        poll_rows, option_rows, vote_rows = [], [], []
+        option_id = 0
+        for class_id in range(1, scale.classrooms + 1):
+            for _ in range(scale.polls_per_class):
+                poll_id = len(poll_rows) + 1
+                poll_rows.append({'id': poll_id, 'question': _words(rng, 5) + '?', 'classroom_id': class_id,
+                                  'created_by': teacher_ids[(class_id - 1) % teachers], 'timestamp': ts()})
+                options = []
+                for _ in range(3):
+                    option_id += 1
+                    options.append(option_id)
+                    option_rows.append({'id': option_id, 'poll_id': poll_id, 'text': _words(rng, 2)})
+                for voter in rng.sample(student_pool, min(20, len(student_pool))):
+                    vote_rows.append({'option_id': rng.choice(options), 'user_id': voter})
+        _insert_batches(Poll, poll_rows, stats, progress, batch_size)
+        _insert_batches(PollOption, option_rows, stats, progress, batch_size)
+        _insert_batches(PollVote, vote_rows, stats, progress, batch_size)
+
+        # Direct messages: everybody has a few partners; the benchmark student's
+        # thread with their partner is the hot one (2% of all messages)
+        def messages():
+            hot = max(1, scale.messages // 50)
+            for i in range(1, scale.messages + 1):
+                if i <= hot:
+                    pair = (student_id, partner_id) if rng.random() < 0.5 else (partner_id, student_id)
+                else:
+                    sender = rng.randint(1, scale.users)
+                    receiver = (sender + rng.randint(1, scale.partners_per_user)) % scale.users + 1
+                    pair = (sender, receiver)
+                yield {'sender_id': pair[0], 'receiver_id': pair[1], 'content': _words(rng, 10),
+                       'timestamp': ts(), 'is_read': rng.random() > 0.05}
+        _insert_batches(Message, messages(), stats, progress, batch_size)
+
+        def comments():
+            for _ in range(scale.comments):
+                yield {'note_id': rng.randint(1, scale.notes), 'user_id': rng.randint(1, scale.users),
+                       'content': _words(rng, 12), 'timestamp': ts()}
+        _insert_batches(Comment, comments(), stats, progress, batch_size)
+
+        def reactions():
+            for _ in range(scale.reactions):
+                yield {'note_id': rng.randint(1, scale.notes), 'user_id': rng.randint(1, scale.users),
+                       'type': 'like' if rng.random() < 0.8 else 'dislike'}
+        _insert_batches(Reaction, reactions(), stats, progress, batch_size)
+
+        popular = db.session.execute(
+            select(Tag.name).order_by(Tag.note_count.desc()).limit(3)
+        ).scalars().all()
+        db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    total = sum(count for count, _ in stats.values())
+    progress(f"{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    return {
+        'scale': asdict(scale),
+        'seed': seed,
+        'password': PASSWORD,
+        'admin': admin_id,
+        'teacher': teacher_ids[0],
+        'student': student_id,
+        'partner': partner_id,
+        'big_class': 1,
+        'note': student_note_ids[0] if student_note_ids else 1,
+        'public_note': public_note_ids[0] if public_note_ids else 1,
+        'tags': popular,
+        'search': FIRST_NAMES[0],
+        'rows': {name: count for name, (count, _) in stats.items()},
+        'seconds': round(elapsed, 2),
+    }
+
+
+def resolve_scale(name, **overrides):
+    scale = SCALES[name]
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    return replace(scale, **overrides) if overrides else scale
+
+
+def context_path(db_path):
+    return f"{db_path}.context.json"
+
+
+def save_context(db_path, context):
+    with open(context_path(db_path), 'w') as fh:
+        json.dump(context, fh, indent=2)
+
+
+def load_context(db_path):
+    with open(context_path(db_path)) as fh:
+        return json.load(fh)
@@ -0,0 +1,91 @@
+# FILE: benchmark/report.py
+"""Summaries, baseline files and regression diffs."""
+
+import json
+import platform
+from datetime import datetime, timezone
+
+from website.instrumentation import percentile
+
+
+def summarize(results):
+    """{name: {count, errors, p50_ms, p95_ms, p99_ms, max_ms, queries}} from raw samples."""
+    summary = {}
+    for name, samples in results.items():
+        if not samples:
+            continue
+        durations = sorted(s[0] for s in samples)
+        queries = [s[1] for s in samples if s[1] is not None]
+        summary[name] = {
+            'count': len(samples),
+            'errors': sum(1 for s in samples if s[2] >= 400),
+            'p50_ms': round(percentile(durations, 50) * 1000, 2),
+            'p95_ms': round(percentile(durations, 95) * 1000, 2),
+            'p99_ms': round(percentile(durations, 99) * 1000, 2),
+            'max_ms': round(durations[-1] * 1000, 2),
+            'queries': round(sum(queries) / len(queries), 1) if queries else None,
+        }
+    return summary
+
+
+def save_baseline(path, summary, context, options):
+    data = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'scale': context.get('scale'),
+        'options': options,
+        'results': summary,
+    }
+    with open(path, 'w') as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def compare(summary, baseline, tolerance=0.2):
+    """Rows of (name, current, previous, regressions) against a loaded baseline.
+
+    A scenario regresses when its p95 grows by more than `tolerance` or it
+    issues more queries per request than before.
+    """
+    previous = baseline.get('results', {})
+    rows = []
+    for name, current in summary.items():
+        before = previous.get(name)
+        regressions = []
+        if before:
+            if before['p95_ms'] and current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append('p95')
+            if current['queries'] is not None and before.get('queries') is not None \
+                    and current['queries'] > before['queries']:
+                regressions.append('queries')
+        rows.append((name, current, before, regressions))
+    return rows
+
+
+def _delta(now, before):
+    if before in (None, 0) or now is None:
+        return ''
+    return f'{(now - before) / before * 100:+.0f}%'
+
+
+def format_table(summary, baseline=None, tolerance=0.2):
+    header = f"{'scenario':34} {'n':>5} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}"
+    if baseline is not None:
+        header += f" {'Δp95':>7} {'Δq':>6}"
+    lines = [header, '-' * len(header)]
+    rows = compare(summary, baseline or {}, tolerance)
+    for name, cur, before, regressions in rows:
+        q = '-' if cur['queries'] is None else f"{cur['queries']:g}"
+        line = (f"{name:34} {cur['count']:>5} {cur['errors']:>4} {cur['p50_ms']:>7.1f}ms "
+                f"{cur['p95_ms']:>7.1f}ms {cur['p99_ms']:>7.1f}ms {q:>8}")
+        if baseline is not None:
+            line += (f" {_delta(cur['p95_ms'], before and before['p95_ms']):>7}"
+                     f" {_delta(cur['queries'], before and before.get('queries')):>6}")
+            if regressions:
+                line += '  REGRESSED: ' + ', '.join(regressions)
+        lines.append(line)
+    return '\n'.join(lines)
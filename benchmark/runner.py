@@ -0,0 +1,202 @@
+# FILE: benchmark/runner.py
+"""Drive the benchmark scenarios and collect per-request samples.
+
+Latency is measured on the client. Query counts come from the
+Server-Timing header added by website.instrumentation, so a live server
+(--url) needs INSTRUMENTATION_ENABLED for them to be reported.
+"""
+
+import http.cookiejar
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .dataset import email_for
+from .scenarios import render
+
+_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def queries_from(header):
+    match = _QUERIES_RE.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+# ---------- clients ----------
+
+class TestClient:
+    """Flask test client, logged in as one principal."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self, email, password):
+        self.client.post('/login', data={'email': email, 'password': password})
+
+    def request(self, method, path, body=None, form=False):
+        kwargs = {}
+        if body is not None:
+            kwargs['data' if form else 'json'] = body
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, queries_from(response.headers.get('Server-Timing'))
+
+    def cookie_header(self):
+        cookie = self.client.get_cookie('session')
+        return f'session={cookie.value}' if cookie else ''
+
+
+class HttpClient:
+    """Plain urllib client with its own cookie jar, for a live server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar))
+
+    def login(self, email, password):
+        self.request('POST', '/login', {'email': email, 'password': password}, form=True)
+
+    def request(self, method, path, body=None, form=False):
+        data, headers = None, {}
+        if body is not None:
+            if form:
+                data = urllib.parse.urlencode(body).encode()
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            else:
+                data = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status, queries_from(response.headers.get('Server-Timing'))
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code, queries_from(exc.headers.get('Server-Timing'))
+
+    def cookie_header(self):
+        return '; '.join(f'{c.name}={c.value}' for c in self.jar)
+
+
+# ---------- HTTP scenarios ----------
+
+def _clients_for(make_client, context):
+    clients = {}
+    for role in ('student', 'teacher', 'admin'):
+        client = make_client()
+        client.login(email_for(context[role]), context['password'])
+        clients[role] = client
+    clients['anonymous'] = make_client()
+    return clients
+
+
+def run_scenarios(make_client, scenarios, context, iterations=20, warmup=2, concurrency=1):
+    """{scenario name: [(seconds, queries, status), ...]} over all workers."""
+    results = {s.name: [] for s in scenarios}
+    lock = threading.Lock()
+
+    def worker():
+        clients = _clients_for(make_client, context)
+        for scenario in scenarios:
+            client = clients[scenario.role]
+            path, body = render(scenario, context)
+            for i in range(warmup + iterations):
+                started = time.perf_counter()
+                status, queries = client.request(scenario.method, path, body, scenario.form)
+                elapsed = time.perf_counter() - started
+                if i >= warmup:
+                    with lock:
+                        results[scenario.name].append((elapsed, queries, status))
+
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results
+
+
+# ---------- Socket.IO ----------
+
+def _collab_round_trips(emit, note_id, iterations):
+    samples = []
+    joined = emit('collab_join', {'note_id': note_id})
+    if not joined or not joined.get('success'):
+        raise RuntimeError(f"collab_join failed: {joined}")
+    rev = joined['rev']
+    for _ in range(iterations):
+        started = time.perf_counter()
+        ack = emit('collab_submit', {'note_id': note_id, 'rev': rev, 'ops': [{'insert': 'x'}]})
+        elapsed = time.perf_counter() - started
+        ok = bool(ack and ack.get('success'))
+        if ok:
+            rev = ack['rev']
+        samples.append((elapsed, None, 200 if ok else 409))
+    emit('collab_leave', {'note_id': note_id})
+    return samples
+
+
+def run_socketio_inprocess(app, context, iterations=50, concurrency=1):
+    """collab_submit ack latency through Flask-SocketIO's test client."""
+    from website import socketio
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        http = TestClient(app)
+        http.login(email_for(context['student']), context['password'])
+        sio = socketio.test_client(app, flask_test_client=http.client)
+
+        def emit(event, data):
+            return sio.emit(event, data, callback=True)
+
+        samples = _collab_round_trips(emit, context['note'], iterations)
+        sio.disconnect()
+        with lock:
+            results.extend(samples)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'socketio.collab_submit': results}
+
+
+def run_socketio_http(base_url, context, iterations=50, concurrency=1):
+    """Same as run_socketio_inprocess against a live server (needs the python-socketio client extras)."""
+    import socketio as socketio_client
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        http = HttpClient(base_url)
+        http.login(email_for(context['student']), context['password'])
+        sio = socketio_client.Client()
+        sio.connect(base_url, headers={'Cookie': http.cookie_header()})
+
+        def emit(event, data):
+            return sio.call(event, data, timeout=30)
+
+        try:
+            samples = _collab_round_trips(emit, context['note'], iterations)
+        finally:
+            sio.disconnect()
+        with lock:
+            results.extend(samples)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'socketio.collab_submit': results}
@@ -0,0 +1,65 @@
+# FILE: benchmark/scenarios.py
+"""The routes the benchmark drives.
+
+Each scenario names the principal it runs as (a key of the dataset
+context), the HTTP method and a path template formatted with the context.
+"""
+
+from collections import namedtuple
+
+from .dataset import email_for
+
+Scenario = namedtuple('Scenario', 'name role method path body form')
+
+
+def _s(name, role, path, method='GET', body=None, form=False):
+    return Scenario(name, role, method, path, body, form)
+
+
+SCENARIOS = [
+    _s('views.home', 'student', '/'),
+    _s('views.my_notes', 'student', '/my-notes'),
+    _s('views.my_notes[tags]', 'student', '/my-notes?tags={tag0}'),
+    _s('views.view_note', 'student', '/note/{note}'),
+    _s('views.view_note[public]', 'student', '/note/{public_note}'),
+    _s('views.classes', 'student', '/classes'),
+    _s('views.class_feed', 'student', '/class/{big_class}'),
+    _s('views.class_chat', 'student', '/class/{big_class}/chat'),
+    _s('views.class_chat_feed', 'student', '/class/{big_class}/chat/feed'),
+    _s('views.messages_index', 'student', '/messages'),
+    _s('views.messages', 'student', '/messages/{partner}'),
+    _s('views.messages_feed', 'student', '/messages/{partner}/feed'),
+    _s('views.messages_unread_summary', 'student', '/messages/unread-summary'),
+    _s('views.user_search', 'student', '/user-search?q={search}'),
+    _s('views.messages_send', 'student', '/messages/{partner}/send', 'POST', {'content': 'benchmark ping'}),
+    _s('views.class_chat_send', 'student', '/class/{big_class}/chat/send', 'POST', {'content': 'benchmark ping'}),
+    _s('views.add_comment', 'student', '/add-comment', 'POST', {'noteId': '{public_note}', 'content': 'benchmark'}),
+    _s('views.add_reaction', 'student', '/add-reaction', 'POST', {'noteId': '{public_note}', 'type': 'like'}),
+    _s('views.class_feed[teacher]', 'teacher', '/class/{big_class}'),
+    _s('admin.dashboard', 'admin', '/admin/dashboard'),
+    _s('auth.login', 'anonymous', '/login', 'POST', {'email': '{student_email}', 'password': '{password}'},
+       form=True),
+]
+
+
+def render(scenario, context):
+    """(path, body) with the context substituted."""
+    values = dict(context)
+    values['tag0'] = (context.get('tags') or [''])[0]
+    values['student_email'] = email_for(context['student'])
+    path = scenario.path.format(**values)
+    body = None
+    if scenario.body is not None:
+        body = {}
+        for key, value in scenario.body.items():
+            if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
+                value = values[value[1:-1]]
+            body[key] = value
+    return path, body
+
+
+def select(names=None):
+    if not names:
+        return list(SCENARIOS)
+    wanted = set(names)
+    return [s for s in SCENARIOS if s.name in wanted or s.name.split('[')[0] in wanted]
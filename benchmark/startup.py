@@ -0,0 +1,58 @@
+# FILE: benchmark/startup.py
+"""Cold-start timing: fresh interpreters importing the package and building the app."""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+from website.instrumentation import percentile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import website
+t1 = time.perf_counter()
+app = website.create_app({config})
+t2 = time.perf_counter()
+with app.test_client() as client:
+    client.get('/login')
+t3 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2, 'total': t3 - t0}}))
+"""
+
+
+def measure(runs=10, config=None):
+    """{phase: [seconds per run]} over `runs` fresh interpreters."""
+    code = PROBE.format(config=repr(config or {}))
+    phases = {}
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        for phase, seconds in sample.items():
+            phases.setdefault(phase, []).append(seconds)
+    return phases
+
+
+def slowest_imports(limit=15, config=None):
+    """Top modules by their own import time (python -X importtime)."""
+    code = f"import website; website.create_app({config or {}!r})"
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)', line)
+        if match:
+            rows.append((int(match.group(1)) / 1e6, match.group(2)))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def format_report(phases):
+    lines = [f"{'phase':14} {'min':>9} {'p50':>9} {'max':>9}"]
+    for phase, samples in phases.items():
+        samples = sorted(samples)
+        lines.append(f"{phase:14} {samples[0] * 1000:>7.1f}ms {percentile(samples, 50) * 1000:>7.1f}ms "
+                     f"{samples[-1] * 1000:>7.1f}ms")
+    return '\n'.join(lines)
@@ -0,0 +1,48 @@
+"""Incremental tag counts
+
+Revision ID: 5f0b3a6c8e19
+Revises: d52a7e90c1f4
+Create Date: 2026-10-19 13:21:55.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b3a6c8e19'
+down_revision = 'd52a7e90c1f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_tag_count',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'tag_id')
+    )
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('note_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing associations
+    op.execute(
+        "UPDATE tag SET note_count = "
+        "(SELECT COUNT(*) FROM tags_notes WHERE tags_notes.tag_id = tag.id)"
+    )
+    op.execute(
+        "INSERT INTO user_tag_count (user_id, tag_id, count) "
+        "SELECT note.user_id, tags_notes.tag_id, COUNT(*) FROM tags_notes "
+        "JOIN note ON note.id = tags_notes.note_id "
+        "WHERE note.user_id IS NOT NULL "
+        "GROUP BY note.user_id, tags_notes.tag_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_column('note_count')
+    op.drop_table('user_tag_count')
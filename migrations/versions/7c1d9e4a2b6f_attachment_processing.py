@@ -0,0 +1,36 @@
+"""Attachment thumbnails and extracted text
+
+Revision ID: 7c1d9e4a2b6f
+Revises: 414a2776d433
+Create Date: 2026-10-19 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1d9e4a2b6f'
+down_revision = '414a2776d433'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note_attachment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('thumbnail_path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('extracted_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('processing_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('processing_attempts', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('processing_error', sa.String(length=255), nullable=True))
+        batch_op.create_index(batch_op.f('ix_note_attachment_processing_status'), ['processing_status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('note_attachment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_note_attachment_processing_status'))
+        batch_op.drop_column('processing_error')
+        batch_op.drop_column('processing_attempts')
+        batch_op.drop_column('processing_status')
+        batch_op.drop_column('extracted_text')
+        batch_op.drop_column('thumbnail_path')
@@ -0,0 +1,24 @@
+"""Index tags_notes by tag
+
+Revision ID: 9a4c2d7b1e03
+Revises: 5f0b3a6c8e19
+Create Date: 2026-10-19 14:48:09.271930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c2d7b1e03'
+down_revision = '5f0b3a6c8e19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tags_notes_tag_note', 'tags_notes', ['tag_id', 'note_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tags_notes_tag_note', table_name='tags_notes')
@@ -0,0 +1,47 @@
+"""Delta-encoded note history
+
+Revision ID: b3e8f1c05d27
+Revises: 7c1d9e4a2b6f
+Create Date: 2026-10-19 10:04:17.932641
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f1c05d27'
+down_revision = '7c1d9e4a2b6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('is_keyframe', sa.Boolean(), nullable=True, server_default=sa.true()))
+        batch_op.add_column(sa.Column('compressed_blob', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column('content_snapshot',
+               existing_type=sa.TEXT(),
+               nullable=True)
+
+    # Existing rows are full snapshots; number them per note in id order
+    op.execute(
+        "UPDATE note_history SET version = ("
+        " SELECT COUNT(*) FROM note_history AS h2"
+        " WHERE h2.note_id = note_history.note_id AND h2.id <= note_history.id)"
+    )
+
+    with op.batch_alter_table('note_history', schema=None) as batch_op:
+        batch_op.create_index('ix_note_history_note_version', ['note_id', 'version'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('note_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_note_history_note_version')
+        batch_op.alter_column('content_snapshot',
+               existing_type=sa.TEXT(),
+               nullable=False)
+        batch_op.drop_column('compressed_blob')
+        batch_op.drop_column('is_keyframe')
+        batch_op.drop_column('version')
@@ -0,0 +1,39 @@
+"""Collaborative editing op log
+
+Revision ID: d52a7e90c1f4
+Revises: b3e8f1c05d27
+Create Date: 2026-10-19 11:37:02.117485
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd52a7e90c1f4'
+down_revision = 'b3e8f1c05d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('note_op',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('rev', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('delta', sa.Text(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['note_id'], ['note.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('note_id', 'rev', name='uq_note_op_rev')
+    )
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('collab_rev', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('collab_rev')
+    op.drop_table('note_op')
@@ -1,4 +1,9 @@
 # FILE: seed.py (Final Fixed Version)
+#
+#   python seed.py                       demo users/notes/classes
+#   python seed.py --bulk --scale large  millions of rows for load testing
+
+import argparse
 
 from werkzeug.security import generate_password_hash
 from website import create_app, db
@@ -58,7 +63,7 @@ def create_seed_data(app):
         print("-> Cleared all tables.")
 
         # Create users
-        hashed_password = generate_password_hash(TEST_PASSWORD, method='pbkdf2:sha256')
+        hashed_password = generate_password_hash(TEST_PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
 
         admin_user = User(
             email="admin@app.com",
@@ -191,10 +196,68 @@ def create_seed_data(app):
         print("Password:", TEST_PASSWORD)
 
 
+# ================================
+# BULK SEED (large datasets)
+# ================================
+def create_bulk_data(app, scale_name="small", seed=1, batch_size=5000, target_rate=None, **overrides):
+    """Recreate the schema and generate a large synthetic dataset.
+
+    Uses the benchmark generator: Core executemany batches in one
+    transaction with FK checks deferred and a single password hash.
+    """
+    from benchmark import dataset
+
+    with app.app_context():
+        # Dropping and recreating is far cheaper than DELETE on millions of rows
+        db.drop_all()
+        db.create_all()
+        db.session.commit()
+        print("-> Recreated schema.")
+
+    scale = dataset.resolve_scale(scale_name, **overrides)
+    print(f"Bulk seeding '{scale_name}': {scale}")
+    context = dataset.generate(app, scale, seed=seed, batch_size=batch_size)
+
+    db_file = app.config['SQLALCHEMY_DATABASE_URI'].replace("sqlite:///", "")
+    dataset.save_context(db_file, context)
+
+    total = sum(context['rows'].values())
+    rate = total / max(context['seconds'], 1e-9)
+    if target_rate:
+        verdict = "met" if rate >= target_rate else "MISSED"
+        print(f"-> Target {target_rate:,.0f} rows/s {verdict} ({rate:,.0f} rows/s).")
+
+    print("BULK SEEDING COMPLETE!")
+    print(f"Login emails: {dataset.email_for(context['admin'])} (admin), "
+          f"{dataset.email_for(context['teacher'])} (teacher), {dataset.email_for(context['student'])} (student)")
+    print("Password:", dataset.PASSWORD)
+    return context
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the notes database.")
+    parser.add_argument("--bulk", action="store_true", help="generate a large synthetic dataset instead of the demo rows")
+    parser.add_argument("--scale", default="small", help="bulk preset: tiny, small or large")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per executemany batch")
+    parser.add_argument("--target-rows-per-sec", type=float, help="report whether bulk seeding reached this rate")
+    for name in ("users", "notes", "messages", "classrooms", "class-size"):
+        parser.add_argument(f"--{name}", type=int, help=f"override the preset {name}")
+    return parser.parse_args(argv)
+
+
 # ================================
 # RUN
 # ================================
 if __name__ == "__main__":
+    args = parse_args()
     app = create_app()
-    create_initial_schema(app)
-    create_seed_data(app)
+    if args.bulk:
+        create_bulk_data(
+            app, args.scale, seed=args.seed, batch_size=args.batch_size, target_rate=args.target_rows_per_sec,
+            users=args.users, notes=args.notes, messages=args.messages,
+            classrooms=args.classrooms, class_size=args.class_size
+        )
+    else:
+        create_initial_schema(app)
+        create_seed_data(app)
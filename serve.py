@@ -0,0 +1,333 @@
+# FILE: serve.py
+#
+# Production entrypoint. main.py / run_socketio_app() is the debug dev server
+# (reloader + debugger); this runs the same app without either.
+#
+#   python serve.py                                    auto: eventlet, gevent, else threads
+#   python serve.py --worker eventlet --connections 2000 --port 8000
+#   SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 RATELIMIT_STORAGE_URL=redis://localhost:6379/1 \
+#       python serve.py --workers 4
+#
+# Workers are forked processes sharing one listening socket. More than one
+# worker is refused unless SOCKETIO_MESSAGE_QUEUE (so emits and cache
+# invalidations reach every worker) and RATELIMIT_STORAGE_URL (so the rate
+# limits and the login guard, which defaults to the same storage, are not
+# multiplied by the worker count) name shared backends.
+#
+# Some state stays per process even then:
+#   - collab documents: two workers editing one note resync through the op
+#     log's unique revision, but each conflict costs the editors a reload;
+#   - the autosave buffer: a client that moves workers gets a 409 and resyncs;
+#   - the profiler: /admin/profile samples only the worker that served it.
+# So put several workers behind a sticky proxy (the Engine.IO polling
+# transport needs sticky sessions anyway), or run one port per serve.py.
+#
+# SIGTERM (or Ctrl+C) drains: stop accepting, disconnect Socket.IO clients so
+# they reconnect elsewhere, wait up to --drain-timeout for in-flight
+# requests, flush the autosave buffer, exit.
+#
+# Only stdlib is imported at module level: eventlet/gevent must patch
+# threading and socket before Flask, SQLAlchemy or the app are imported.
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+WORKERS = ('auto', 'eventlet', 'gevent', 'threading')
+
+
+def log(message):
+    print(f"[serve {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+# ================================
+# WORKER SELECTION / MONKEY-PATCHING
+# ================================
+def resolve_worker(name):
+    """'auto' picks the first installed green library, falling back to threads."""
+    if name != 'auto':
+        return name
+    for candidate in ('eventlet', 'gevent'):
+        try:
+            __import__(candidate)
+        except ImportError:
+            continue
+        return candidate
+    return 'threading'
+
+
+def monkey_patch(worker):
+    """Patch the stdlib for green threads. Must run before the app is imported."""
+    if 'website' in sys.modules:
+        raise RuntimeError("the app was imported before monkey-patching; start it through serve.py")
+    if worker == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif worker == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def app_config(args, worker):
+    config = {
+        'DEBUG': False,
+        'SOCKETIO_ASYNC_MODE': worker,
+        # Green threads queue for one of a few pooled connections rather than
+        # each opening its own; sessions stay scoped to the (greenlet-local)
+        # app context, so no two requests share one.
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': args.db_pool, 'max_overflow': 0, 'pool_timeout': 30},
+    }
+    if args.db:
+        config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(args.db)}"
+    return config
+
+
+# ================================
+# SERVERS
+# ================================
+class InFlight:
+    """WSGI middleware counting requests in progress, so a drain knows when it is done."""
+
+    def __init__(self, wsgi_app):
+        import threading
+        self.wsgi_app = wsgi_app
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _add(self, n):
+        with self._lock:
+            self.count += n
+
+    def __call__(self, environ, start_response):
+        self._add(1)
+        try:
+            return _ClosingIterator(self.wsgi_app(environ, start_response), lambda: self._add(-1))
+        except BaseException:
+            self._add(-1)
+            raise
+
+
+class _ClosingIterator:
+    def __init__(self, iterable, on_close):
+        self.iterable = iterable
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.on_close()
+
+
+class EventletServer:
+    def __init__(self, app, sock, args):
+        import eventlet
+        import eventlet.wsgi
+        self.pool = eventlet.GreenPool(args.connections)
+        self.thread = eventlet.spawn(
+            eventlet.wsgi.server, sock, app, custom_pool=self.pool, log_output=args.access_log
+        )
+
+    def stop_accepting(self):
+        # GreenletExit leaves the accept loop; the pool keeps serving open requests
+        self.thread.kill()
+
+    def close(self):
+        for green_thread in list(self.pool.coroutines_running):
+            green_thread.kill()
+
+
+class GeventServer:
+    def __init__(self, app, sock, args):
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        options = {}
+        try:
+            from geventwebsocket.handler import WebSocketHandler
+            options['handler_class'] = WebSocketHandler
+        except ImportError:
+            log("gevent-websocket is not installed; Socket.IO falls back to long-polling")
+        self.server = WSGIServer(sock, app, spawn=Pool(args.connections),
+                                 log='default' if args.access_log else None, **options)
+        self.server.start()
+
+    def stop_accepting(self):
+        self.server.close()
+
+    def close(self):
+        self.server.stop(timeout=0)
+
+
+class ThreadingServer:
+    """Werkzeug's threaded server without the debugger, for hosts without eventlet/gevent."""
+
+    def __init__(self, app, sock, args):
+        import logging
+        import threading
+        from werkzeug.serving import make_server
+        if not args.access_log:
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        host, port = sock.getsockname()[:2]
+        self.server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        self.thread = threading.Thread(target=self.server.serve_forever, name='http-accept', daemon=True)
+        self.thread.start()
+
+    def stop_accepting(self):
+        self.server.shutdown()
+
+    def close(self):
+        self.server.server_close()
+
+
+SERVERS = {'eventlet': EventletServer, 'gevent': GeventServer, 'threading': ThreadingServer}
+
+
+# ================================
+# WORKER PROCESS
+# ================================
+def run_worker(sock, args, worker):
+    """Serve on `sock` until SIGTERM/SIGINT, then drain. Returns the exit code."""
+    monkey_patch(worker)
+    import socket
+    listener = socket.socket(fileno=sock.detach())  # re-wrapped as a patched (green) socket
+
+    from website import create_app, db, socketio
+    from website.autosave import autosave_buffer
+    from website.longpoll import feed_notifier
+    from website.sse import event_hub
+
+    app = create_app(app_config(args, worker))
+    in_flight = InFlight(app.wsgi_app)
+    app.wsgi_app = in_flight
+
+    stop = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop.append(signum))
+
+    server = SERVERS[worker](app, listener, args)
+    log(f"{worker} worker serving on {listener.getsockname()[0]}:{listener.getsockname()[1]}")
+    while not stop:
+        time.sleep(0.2)  # green under eventlet/gevent
+
+    log(f"draining ({in_flight.count} requests in flight)")
+    deadline = time.monotonic() + args.drain_timeout
+    eio = socketio.server.eio
+    for client in list(eio.sockets.values()):
+        # Queue the close packet for waiting polls/websockets without blocking on idle clients
+        client.close(wait=False, reason=eio.reason.SERVER_DISCONNECT)
+    server.stop_accepting()
+    feed_notifier.wake_all()  # parked long-polls answer now instead of after their wait
+    event_hub.wake_all()  # event streams end; EventSource reconnects elsewhere and resumes
+    while in_flight.count and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if in_flight.count:
+        log(f"drain timed out with {in_flight.count} requests in flight")
+    server.close()
+    socketio.server.shutdown()
+    autosave_buffer.flush_all()
+    with app.app_context():
+        db.engine.dispose()
+    log("stopped")
+    return 0
+
+
+# ================================
+# SUPERVISOR
+# ================================
+def bind(host, port, backlog=2048):
+    import socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def supervise(sock, args, worker):
+    """Fork args.workers processes on the shared socket; restart crashes, forward SIGTERM."""
+    children = {}
+    stopping = []
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            sys.exit(run_worker(sock, args, worker))
+        children[pid] = time.monotonic()
+
+    def on_signal(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    for _ in range(args.workers):
+        spawn()
+
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if stopping:
+            exit_code = exit_code or code
+        elif time.monotonic() - started < 1:
+            log(f"worker {pid} exited with {code} during startup; giving up")
+            on_signal(signal.SIGTERM, None)
+            exit_code = code or 1
+        else:
+            log(f"worker {pid} exited with {code}; restarting")
+            spawn()
+    return exit_code
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Run the notes app in production (no reloader, no debugger).")
+    parser.add_argument("--worker", choices=WORKERS, default=env("SERVER_WORKER", "auto"),
+                        help="green-thread library; auto prefers eventlet, then gevent, then threads")
+    parser.add_argument("--workers", type=int, default=int(env("WEB_CONCURRENCY", 1)), help="worker processes")
+    parser.add_argument("--connections", type=int, default=1000,
+                        help="concurrent connections per eventlet/gevent worker")
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", 5001)))
+    parser.add_argument("--db", help="SQLite database path (default: the app default)")
+    parser.add_argument("--db-pool", type=int, default=10, help="pooled database connections per worker")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="seconds to finish requests on SIGTERM")
+    parser.add_argument("--access-log", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    worker = resolve_worker(args.worker)
+    if args.workers > 1:
+        missing = [name for name in ('SOCKETIO_MESSAGE_QUEUE', 'RATELIMIT_STORAGE_URL') if not os.environ.get(name)]
+        if missing:
+            sys.exit(f"--workers > 1 needs {' and '.join(missing)} (see the notes at the top of serve.py)")
+    if worker == 'threading':
+        log("eventlet/gevent not installed; using threads (--connections is not enforced)")
+
+    sock = bind(args.host, args.port)
+    log(f"listening on {args.host}:{sock.getsockname()[1]} ({args.workers} x {worker})")
+    if args.workers == 1:
+        return run_worker(sock, args, worker)
+    return supervise(sock, args, worker)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
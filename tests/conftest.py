@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from website import create_app, db
+from website.models import User
+
+TEST_PASSWORD = "password123"
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """make_app(**config) -> an app on a fresh database; test modules override `app` with it."""
+    apps = []
+
+    def _make_app(**config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'ATTACHMENT_PROCESS_INLINE': True,
+            **config,
+        })
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app
+    yield _make_app
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def make_user(app):
+    def _make_user(email, first_name=None, role='student', is_admin=False):
+        with app.app_context():
+            user = User(
+                email=email,
+                first_name=first_name or email.split('@')[0],
+                password=generate_password_hash(TEST_PASSWORD, method='pbkdf2:sha256'),
+                role=role,
+                is_admin=is_admin,
+            )
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return _make_user
+
+
+@pytest.fixture
+def login(app):
+    def _login(email):
+        client = app.test_client()
+        client.post('/login', data={'email': email, 'password': TEST_PASSWORD})
+        return client
+    return _login
+
+
+class QueryCounter:
+    """Counts SQL statements (and wall time) executed on `engine` inside a with-block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.elapsed = 0.0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._started
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+
+@pytest.fixture
+def count_queries():
+    """count_queries(app) -> QueryCounter for that app's engine."""
+    def _count_queries(app):
+        with app.app_context():
+            return QueryCounter(db.engine)
+    return _count_queries
@@ -0,0 +1,67 @@
+import io
+import time
+
+from website import attachments, db
+from website.attachments import attachment_processor
+from website.models import NoteAttachment
+
+
+def _upload(client, body=b'photosynthesis happens in chloroplasts', filename='bio.txt'):
+    return client.post('/create-note', data={
+        'title': 'Biology', 'note': '<p>lecture</p>', 'tags': '',
+        'attachment': (io.BytesIO(body), filename),
+    }, content_type='multipart/form-data')
+
+
+def _attachment(app):
+    with app.app_context():
+        att = NoteAttachment.query.one()
+        return att.processing_status, att.extracted_text, att.processing_attempts, att.processing_error
+
+
+def test_text_is_extracted_and_searchable(app, make_user, login):
+    make_user('alice@example.com')
+    client = login('alice@example.com')
+    assert _upload(client).status_code == 302
+
+    status, text, attempts, _ = _attachment(app)
+    assert (status, attempts) == ('done', 1)
+    assert 'chloroplasts' in text
+
+    found = client.get('/my-notes?q=CHLOROPLAST').get_data(as_text=True)
+    assert 'Biology' in found
+    missing = client.get('/my-notes?q=mitochondria').get_data(as_text=True)
+    assert 'Biology' not in missing and 'No notes match' in missing
+
+
+def test_failures_are_retried_then_marked_failed(app, make_user, login, monkeypatch):
+    make_user('alice@example.com')
+    client = login('alice@example.com')
+    app.config.update(ATTACHMENT_PROCESS_INLINE=False, ATTACHMENT_RETRY_DELAY=0.01, ATTACHMENT_MAX_RETRIES=3)
+    calls = []
+
+    def flaky(att, folder):
+        calls.append(att.id)
+        if len(calls) < 3:
+            raise OSError('disk hiccup')
+        att.extracted_text = 'recovered'
+    monkeypatch.setattr(attachments, 'process_attachment', flaky)
+
+    _upload(client)
+    deadline = time.monotonic() + 5
+    while _attachment(app)[0] != 'done' and time.monotonic() < deadline:
+        time.sleep(0.02)
+    attachment_processor.join()
+    assert _attachment(app)[:3] == ('done', 'recovered', 3)
+
+    def broken(att, folder):
+        raise OSError('still broken')
+    monkeypatch.setattr(attachments, 'process_attachment', broken)
+    app.config['ATTACHMENT_PROCESS_INLINE'] = True
+    with app.app_context():
+        db.session.query(NoteAttachment).update({'processing_status': 'pending'})
+        db.session.commit()
+        attachment_id = NoteAttachment.query.one().id
+    attachment_processor.enqueue(attachment_id, attempt=3)
+    status, _, attempts, error = _attachment(app)
+    assert (status, attempts, error) == ('failed', 3, 'still broken')
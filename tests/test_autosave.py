@@ -0,0 +1,95 @@
+from website import db, history, socketio
+from website.autosave import autosave_buffer
+from website.models import Note
+
+
+def _note(app, user_id, content='<p>hello</p>'):
+    with app.app_context():
+        note = Note(title='draft', content=content, user_id=user_id)
+        db.session.add(note)
+        db.session.commit()
+        return note.id
+
+
+def _autosave(client, note_id, text):
+    return client.post(f'/note/{note_id}/autosave', json={'seq': 0, 'ops': [{'insert': text + '\n'}], 'full': True})
+
+
+def test_flush_writes_without_holding_the_buffer_lock(app, make_user, login, monkeypatch):
+    note_id = _note(app, make_user('alice@example.com'))
+    client = login('alice@example.com')
+    held = []
+    record_version = history.record_version
+
+    def probe(note):
+        free = autosave_buffer._lock.acquire(blocking=False)
+        held.append(not free)
+        if free:
+            autosave_buffer._lock.release()
+        return record_version(note)
+    monkeypatch.setattr(history, 'record_version', probe)
+
+    assert _autosave(client, note_id, 'first draft').get_json() == {'success': True, 'seq': 1}
+    assert held == [False]
+    with app.app_context():
+        note = db.session.get(Note, note_id)
+        assert 'first draft' in note.content
+        assert note.collab_rev == 0
+
+
+def test_notes_with_a_live_collab_document_are_left_to_collab(app, make_user, login):
+    note_id = _note(app, make_user('alice@example.com'))
+    client = login('alice@example.com')
+    editor = socketio.test_client(app, flask_test_client=login('alice@example.com'))
+    try:
+        editor.emit('collab_join', {'note_id': note_id}, callback=True)
+        assert _autosave(client, note_id, 'stale copy').status_code == 200
+
+        with app.app_context():
+            assert db.session.get(Note, note_id).content == '<p>hello</p>'
+        assert not [msg for msg in editor.get_received() if msg['name'] == 'collab_reset']
+        assert note_id not in autosave_buffer._entries
+        # The buffer was dropped, so the client's next delta is stale and it resyncs
+        stale = client.post(f'/note/{note_id}/autosave', json={'seq': 1, 'ops': [{'insert': 'x'}]})
+        assert stale.status_code == 409
+    finally:
+        editor.disconnect()
+
+
+def _edit(client, note_id, seq, text='x'):
+    return client.post(f'/note/{note_id}/autosave', json={'seq': seq, 'ops': [{'insert': text}]})
+
+
+def test_eviction_writes_dirty_entries_and_keeps_flushing_ones(app, make_user, login):
+    user_id = make_user('alice@example.com')
+    first, second, third = (_note(app, user_id) for _ in range(3))
+    client = login('alice@example.com')
+    app.config.update(AUTOSAVE_MAX_PENDING=1, AUTOSAVE_INTERVAL=3600)
+
+    _edit(client, first, 0)             # flushed at once (never flushed before)
+    _edit(client, first, 1, 'y')        # buffered: dirty
+    assert _edit(client, second, 0).status_code == 200
+    with app.app_context():
+        assert db.session.get(Note, first).content.startswith('<p>yx')
+    assert list(autosave_buffer._entries) == [second]
+
+    # An entry whose flush is still running is not evicted, so later edits to it survive
+    autosave_buffer._entries[second].flushing = True
+    _edit(client, third, 0)
+    assert list(autosave_buffer._entries) == [second, third]
+    autosave_buffer._entries[second].flushing = False
+
+
+def test_failed_eviction_keeps_the_entry_and_answers_normally(app, make_user, login, monkeypatch):
+    user_id = make_user('alice@example.com')
+    first, second = _note(app, user_id), _note(app, user_id)
+    client = login('alice@example.com')
+    app.config.update(AUTOSAVE_MAX_PENDING=1, AUTOSAVE_INTERVAL=3600)
+    _edit(client, first, 0)
+    _edit(client, first, 1, 'y')
+
+    def broken(note):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(history, 'record_version', broken)
+    assert _edit(client, second, 0).status_code == 200
+    assert autosave_buffer._entries[first].dirty
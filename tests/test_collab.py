@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+from website import db, socketio
+from website import delta as ot
+from website.models import Note, NoteOp
+
+
+def _random_change(rng, length):
+    """A random delta applicable to a document of `length` characters."""
+    ops, pos = [], 0
+    while pos < length or rng.random() < 0.3:
+        kind = rng.choice(('retain', 'delete', 'insert')) if pos < length else 'insert'
+        if kind == 'insert':
+            op = {'insert': rng.choice(('a', 'xy', 'é', '😀', '\n'))}
+            if rng.random() < 0.3:
+                op['attributes'] = {'bold': True}
+            ops.append(op)
+            if pos >= length:
+                break
+            continue
+        n = rng.randint(1, length - pos)
+        op = {kind: n}
+        if kind == 'retain' and rng.random() < 0.3:
+            op['attributes'] = {'italic': True}
+        ops.append(op)
+        pos += n
+    return ot.validate(ops)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_concurrent_changes_converge(seed):
+    rng = random.Random(seed)
+    doc = [{'insert': 'Hello wörld 😀\n'}]
+    length = ot.doc_length(doc)
+    a, b = _random_change(rng, length), _random_change(rng, length)
+
+    # Server order: `a` was applied first, so it has priority
+    via_a = ot.compose(ot.compose(doc, a), ot.transform(a, b, priority=True))
+    via_b = ot.compose(ot.compose(doc, b), ot.transform(b, a, priority=False))
+    assert via_a == via_b
+
+
+def test_compose_is_associative():
+    rng = random.Random(7)
+    doc = [{'insert': 'abcdef\n'}]
+    a = _random_change(rng, ot.doc_length(doc))
+    b = _random_change(rng, ot.doc_length(ot.compose(doc, a)))
+    assert ot.compose(ot.compose(doc, a), b) == ot.compose(doc, ot.compose(a, b))
+
+
+@pytest.fixture
+def note_id(app, make_user):
+    owner = make_user('alice@example.com')
+    with app.app_context():
+        note = Note(title='shared', content='<p>hello</p>', user_id=owner)
+        db.session.add(note)
+        db.session.commit()
+        return note.id
+
+
+@pytest.fixture
+def editors(app, login):
+    """editors() -> a new Socket.IO client for alice; all are disconnected afterwards (freeing the documents)."""
+    clients = []
+
+    def _editor():
+        clients.append(socketio.test_client(app, flask_test_client=login('alice@example.com')))
+        return clients[-1]
+    yield _editor
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
+
+
+def test_concurrent_submits_are_transformed_and_logged(app, editors, note_id):
+    first, second = editors(), editors()
+    joined = first.emit('collab_join', {'note_id': note_id}, callback=True)
+    second.emit('collab_join', {'note_id': note_id}, callback=True)
+    base = joined['rev']
+
+    ack_a = first.emit('collab_submit', {'note_id': note_id, 'rev': base, 'ops': [{'insert': 'A'}]}, callback=True)
+    ack_b = second.emit('collab_submit', {'note_id': note_id, 'rev': base, 'ops': [{'insert': 'B'}]}, callback=True)
+    assert ack_a == {'success': True, 'rev': base + 1}
+    assert ack_b == {'success': True, 'rev': base + 2}
+
+    rejoined = editors().emit('collab_join', {'note_id': note_id}, callback=True)
+    assert ot.delta_to_html(rejoined['content']).startswith('<p>ABhello')  # the earlier op keeps its place
+    with app.app_context():
+        assert [op.rev for op in NoteOp.query.filter_by(note_id=note_id).order_by(NoteOp.rev)] == [base + 1, base + 2]
+
+
+def test_failed_commit_leaves_the_document_unchanged(app, editors, note_id):
+    editor = editors()
+    base = editor.emit('collab_join', {'note_id': note_id}, callback=True)['rev']
+
+    # Another worker with its own copy of the document already took the next revision
+    with app.app_context():
+        db.session.add(NoteOp(note_id=note_id, rev=base + 1, delta='[{"insert":"Z"}]'))
+        db.session.commit()
+
+    ack = editor.emit('collab_submit', {'note_id': note_id, 'rev': base, 'ops': [{'insert': 'A'}]}, callback=True)
+    assert ack['success'] is False and ack['resync'] is True
+    assert any(msg['name'] == 'collab_reset' for msg in editor.get_received())
+
+    # Rejoining reloads from the op log, not from the phantom revision
+    rejoined = editor.emit('collab_join', {'note_id': note_id}, callback=True)
+    assert rejoined['rev'] == base + 1
+    assert ot.delta_to_html(rejoined['content']).startswith('<p>Zhello')
+    ack = editor.emit('collab_submit', {'note_id': note_id, 'rev': base + 1, 'ops': [{'insert': 'A'}]}, callback=True)
+    assert ack == {'success': True, 'rev': base + 2}
@@ -0,0 +1,117 @@
+import pytest
+
+from website import db, history
+from website.models import Note
+
+SAMPLES = [
+    '',
+    '<p>plain text</p>',
+    '1 < 2 and 3 > 2',
+    '<p>a &lt; b</p><p>&lt;not a tag&gt;</p>',
+    '<p>unclosed <b',
+    '<<<>>> <',
+    '<p>tail <',
+]
+
+
+@pytest.mark.parametrize('old', SAMPLES)
+@pytest.mark.parametrize('new', SAMPLES)
+def test_delta_round_trip(old, new):
+    assert ''.join(history._tokens(new)) == new
+    assert history.apply_delta(old, history.make_delta(old, new)) == new
+
+
+def test_versions_rebuild_exactly_across_keyframes(app, make_user):
+    user_id = make_user('alice@example.com')
+    app.config['NOTE_HISTORY_KEYFRAME_INTERVAL'] = 3
+    body = '<p>' + ' '.join(f'word{i}' for i in range(200)) + '</p>'
+    contents = [body, body + '<p>1 < 2</p>', body + '<p>1 < 2 &lt; 3</p>', body + '<p>open <i',
+                body + '<p>open <i>done</i></p>']
+    with app.app_context():
+        note = Note(title='n', content=contents[0], user_id=user_id)
+        db.session.add(note)
+        db.session.flush()
+        for content in contents:
+            note.content = content
+            history.record_version(note)
+            db.session.flush()
+        db.session.commit()
+
+        assert [history.get_version_content(note.id, v) for v in range(1, len(contents) + 1)] == contents
+        assert any(not v['keyframe'] for v in history.list_versions(note.id))
+
+
+def _record_versions(app, user_id, count):
+    contents = [f'<p>version {v}</p>' + ''.join(f'<p>line {i}</p>' for i in range(v)) for v in range(1, count + 1)]
+    note = Note(title='n', content=contents[0], user_id=user_id)
+    db.session.add(note)
+    db.session.flush()
+    for content in contents:
+        note.content = content
+        history.record_version(note)
+    db.session.commit()
+    return note.id, contents
+
+
+def test_concurrent_save_retries_with_next_version(app, make_user, monkeypatch):
+    user_id = make_user('alice@example.com')
+    with app.app_context():
+        note_id, _ = _record_versions(app, user_id, 2)
+        note = db.session.get(Note, note_id)
+
+        # Another worker committed version 2 between our read and our insert:
+        # the first lookup sees the stale version 1 row, the retry sees the truth.
+        stale = history._rows(note_id).first()
+        real_last_row = history._last_row
+        calls = []
+
+        def racing_last_row(nid):
+            calls.append(nid)
+            return stale if len(calls) == 1 else real_last_row(nid)
+
+        monkeypatch.setattr(history, '_last_row', racing_last_row)
+        note.title = 'renamed'
+        note.content = '<p>third</p>'
+        row = history.record_version(note)
+        db.session.commit()
+
+        assert len(calls) == 2
+        assert row.version == 3
+        assert db.session.get(Note, note_id).title == 'renamed'
+        assert history.get_version_content(note_id, 3) == '<p>third</p>'
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_compact_history_keeps_every_nth_and_rebuilds(app, make_user, compress):
+    user_id = make_user('alice@example.com')
+    app.config['NOTE_HISTORY_KEYFRAME_INTERVAL'] = 4
+    app.config['NOTE_HISTORY_COMPRESS'] = compress
+    with app.app_context():
+        note_id, contents = _record_versions(app, user_id, 30)
+        if compress:
+            assert any(row.compressed_blob is not None for row in history._rows(note_id))
+
+        removed = history.compact_history(note_id, keep_recent=8, keep_every=5)
+        db.session.commit()
+
+        kept = [v['version'] for v in history.list_versions(note_id)]
+        assert kept == [1, 5, 10, 15, 20] + list(range(23, 31))
+        assert removed == 30 - len(kept)
+        for version in kept:
+            assert history.get_version_content(note_id, version) == contents[version - 1]
+
+
+def test_compact_history_command(app, make_user):
+    user_id = make_user('alice@example.com')
+    with app.app_context():
+        big_id, big = _record_versions(app, user_id, 12)
+        small_id, _ = _record_versions(app, user_id, 3)
+
+    result = app.test_cli_runner().invoke(args=['compact-history', '--keep-recent', '4', '--keep-every', '3'])
+    assert result.exit_code == 0, result.output
+    assert 'Removed 5 history rows.' in result.output
+
+    with app.app_context():
+        assert [v['version'] for v in history.list_versions(big_id)] == [1, 3, 6, 9, 10, 11, 12]
+        assert history.get_version_content(big_id, 6) == big[5]
+        assert len(history.list_versions(small_id)) == 3
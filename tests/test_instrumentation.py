@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from website import db, instrumentation
+from website.instrumentation import request_stats
+
+
+@pytest.fixture
+def app(make_app):
+    request_stats.reset()
+    yield make_app(INSTRUMENTATION_ENABLED=True)
+    request_stats.reset()
+
+
+def test_requests_report_their_timings_and_query_counts(app, make_user, login, count_queries):
+    make_user('root@example.com', is_admin=True)
+    client = login('root@example.com')
+
+    with count_queries(app) as counter:
+        response = client.get('/my-notes')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('app;dur=') and f'desc="{counter.count} queries"' in timing
+
+    stats = client.get('/admin/instrumentation').get_json()
+    assert stats['enabled'] is True
+    my_notes = stats['endpoints']['views.my_notes']
+    assert my_notes['count'] == 1 and my_notes['max_queries'] == counter.count
+    assert my_notes['errors'] == 0 and my_notes['p95_ms'] >= my_notes['p50_ms'] > 0
+
+
+def test_query_observers_see_every_statement(app, make_user, login, count_queries):
+    seen = []
+
+    def observer(conn, cursor, statement, parameters, executemany, elapsed):
+        seen.append((statement, elapsed))
+    instrumentation.add_query_observer(observer)
+    try:
+        make_user('ann@example.com')
+        with count_queries(app) as counter:
+            login('ann@example.com').get('/my-notes')
+    finally:
+        instrumentation._query_observers.remove(observer)
+    assert [s for s, _ in seen[-counter.count:]] == counter.statements
+    assert all(elapsed >= 0 for _, elapsed in seen)
+
+
+def test_failed_statement_leaves_no_stale_start_time(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            assert conn.info.get('query_start') == []
+            conn.execute(text('SELECT 1'))
+            assert conn.info.get('query_start') == []
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from website.load_shedding import load_shedder
+from website.longpoll import dm_topic, feed_notifier
+
+
+def test_pollers_get_stale_or_503_under_db_pressure_while_writes_go_through(app, make_user, login):
+    make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    client = login('alice@example.com')
+    client.post(f'/messages/{bob}/send', json={'content': 'before the rush'})
+
+    fresh = client.get(f'/messages/{bob}/feed?after=0')
+    assert fresh.status_code == 200
+
+    app.config['SHED_DB_LATENCY_MS'] = 1e-6  # any recent statement now counts as contention
+    assert load_shedder.pressure() >= 1
+
+    stale = client.get(f'/messages/{bob}/feed?after=0')
+    assert stale.status_code == 200
+    assert stale.get_json() == fresh.get_json()
+    assert 'Stale' in stale.headers['Warning']
+    assert int(stale.headers['Retry-After']) >= 1
+
+    uncached = client.get('/messages/unread-summary')
+    assert uncached.status_code == 503
+    assert int(uncached.headers['Retry-After']) >= 1
+
+    sent = client.post(f'/messages/{bob}/send', json={'content': 'still works'})
+    assert sent.status_code == 200 and sent.get_json()['success']
+
+
+def test_concurrent_poller_cap(app, make_user, login):
+    make_user('alice@example.com')
+    client = login('alice@example.com')
+    app.config['SHED_MAX_POLLERS'] = 0
+    assert client.get('/messages/unread-summary').status_code == 503
+    assert client.get('/messages').status_code == 200
+    assert load_shedder.in_flight() == 0
+
+
+def test_shedding_can_be_disabled(app, make_user, login):
+    make_user('alice@example.com')
+    client = login('alice@example.com')
+    app.config.update(SHED_ENABLED=False, SHED_MAX_POLLERS=0)
+    assert client.get('/messages/unread-summary').status_code == 200
+
+
+def test_parked_long_polls_do_not_count_against_the_poller_cap(app, make_user, login):
+    alice = make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    client = login('alice@example.com')
+    sender = login('bob@example.com')
+    app.config['SHED_MAX_POLLERS'] = 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        client.get(f'/messages/{bob}/feed?after=0&wait=10').status_code)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while feed_notifier._waiters.get(dm_topic(alice, bob), 0) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert client.get('/messages/unread-summary').status_code == 200
+    assert sender.post(f'/messages/{alice}/send', json={'content': 'wake up'}).status_code == 200
+    for thread in threads:
+        thread.join(10)
+    assert results == [200, 200]
+    assert load_shedder.in_flight() == 0 and load_shedder._pollers == 0
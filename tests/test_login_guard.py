@@ -0,0 +1,100 @@
+import threading
+import time
+
+from website.login_guard import SQLiteFailureLog, login_guard
+from website.passwords import HashPoolBusy, password_hasher
+
+
+def _attempt(client, password, email='alice@example.com'):
+    return client.post('/login', data={'email': email, 'password': password})
+
+
+def test_failures_delay_then_lock_out_before_any_query(app, make_user, count_queries):
+    make_user('alice@example.com')
+    app.config.update(LOGIN_GUARD_EMAIL_FREE=2, LOGIN_GUARD_EMAIL_LOCKOUT=4, LOGIN_GUARD_BASE_DELAY=60.0)
+    client = app.test_client()
+
+    assert [_attempt(client, 'wrong').status_code for _ in range(2)] == [200, 200]
+    with count_queries(app) as counter:
+        throttled = _attempt(client, 'password123')
+    assert throttled.status_code == 429
+    assert 55 <= int(throttled.headers['Retry-After']) <= 60
+    assert counter.count == 0
+
+    # Another address is still held back by the email's failures
+    other = app.test_client()
+    assert other.post('/login', data={'email': 'alice@example.com', 'password': 'password123'},
+                      environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 429
+
+    app.config['LOGIN_GUARD_BASE_DELAY'] = 0.0
+    assert [_attempt(client, 'wrong').status_code for _ in range(2)] == [200, 200]
+    locked = _attempt(client, 'password123')
+    assert locked.status_code == 429
+    assert int(locked.headers['Retry-After']) > 800
+
+
+def test_success_clears_email_failures_but_not_the_address(app, make_user):
+    make_user('alice@example.com')
+    app.config.update(LOGIN_GUARD_EMAIL_FREE=2, LOGIN_GUARD_IP_FREE=2, LOGIN_GUARD_BASE_DELAY=60.0)
+    client = app.test_client()
+
+    _attempt(client, 'wrong')
+    assert _attempt(client, 'password123').status_code == 302
+    assert login_guard.check('127.0.0.1', 'alice@example.com') == 0
+
+    _attempt(client, 'wrong', email='bob@example.com')
+    assert _attempt(app.test_client(), 'wrong', email='carol@example.com').status_code == 429
+
+
+def test_sqlite_failure_log_is_shared_between_workers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'guard.db'}"
+    worker_a, worker_b = SQLiteFailureLog(url), SQLiteFailureLog(url)
+
+    worker_a.record('email:a@x', now=100.0, since=0.0)
+    worker_b.record('email:a@x', now=105.0, since=0.0)
+    assert worker_a.failures('email:a@x', since=0.0) == (2, 105.0)
+    assert worker_b.failures('email:a@x', since=101.0) == (1, 105.0)
+    worker_b.clear('email:a@x')
+    assert worker_a.failures('email:a@x', since=0.0) == (0, None)
+
+
+def test_a_parallel_burst_cannot_outrun_the_first_failure(app, make_user, monkeypatch):
+    make_user('alice@example.com')
+    app.config.update(LOGIN_GUARD_EMAIL_FREE=2, LOGIN_GUARD_BASE_DELAY=60.0)
+    started = threading.Barrier(6)
+
+    def slow_verify(pwhash, password):
+        time.sleep(0.3)  # every attempt is in flight before any of them fails
+        return False
+    monkeypatch.setattr(password_hasher, 'verify', slow_verify)
+
+    def attempt(statuses):
+        client = app.test_client()
+        started.wait()
+        statuses.append(_attempt(client, 'wrong').status_code)
+    statuses = []
+    threads = [threading.Thread(target=attempt, args=(statuses,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [200, 200, 429, 429, 429, 429]
+
+
+def test_attempts_that_never_ran_are_released(app, make_user, monkeypatch):
+    make_user('alice@example.com')
+
+    def busy(pwhash, password):
+        raise HashPoolBusy()
+    monkeypatch.setattr(password_hasher, 'verify', busy)
+    assert _attempt(app.test_client(), 'wrong').status_code == 503
+    assert login_guard.storage.failures('email:alice@example.com', since=0.0) == (0, None)
+    assert login_guard.storage.failures('ip:127.0.0.1', since=0.0) == (0, None)
+
+
+def test_sqlite_reservations_count_and_release(tmp_path):
+    log = SQLiteFailureLog(f"sqlite:///{tmp_path / 'guard.db'}")
+    assert log.reserve('ip:1', now=100.0, since=0.0) == (0, None, 100.0)
+    assert log.reserve('ip:1', now=101.0, since=0.0)[:2] == (1, 100.0)
+    log.release('ip:1', 101.0)
+    assert log.failures('ip:1', since=0.0) == (1, 100.0)
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from website import db
+from website.longpoll import feed_notifier
+from website.models import ClassRoom
+
+
+def _in_thread(fn):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn(), finished=time.monotonic()))
+    thread.start()
+    return thread, result
+
+
+def test_messages_feed_long_poll_wakes_on_send(app, make_user, login):
+    alice = make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    alice_client, bob_client = login('alice@example.com'), login('bob@example.com')
+
+    started = time.monotonic()
+    thread, result = _in_thread(lambda: alice_client.get(f'/messages/{bob}/feed?after=0&wait=10').get_json())
+    time.sleep(0.3)
+    assert bob_client.post(f'/messages/{alice}/send', json={'content': 'hi'}).get_json()['success']
+    thread.join(10)
+
+    assert [m['content'] for m in result['value']] == ['hi']
+    assert result['finished'] - started < 5
+
+
+def test_class_chat_feed_long_poll_wakes_on_send(app, make_user, login):
+    teacher = make_user('teacher@example.com', role='teacher')
+    with app.app_context():
+        classroom = ClassRoom(name='Maths', code='MATHS1', teacher_id=teacher)
+        db.session.add(classroom)
+        db.session.commit()
+        class_id = classroom.id
+    client = login('teacher@example.com')
+    sender = login('teacher@example.com')
+
+    thread, result = _in_thread(lambda: client.get(f'/class/{class_id}/chat/feed?after=0&wait=10').get_json())
+    time.sleep(0.3)
+    sender.post(f'/class/{class_id}/chat/send', json={'content': 'homework'})
+    thread.join(10)
+
+    assert [m['content'] for m in result['value']] == ['homework']
+
+
+def test_idle_long_poll_times_out_without_extra_queries(app, make_user, login, count_queries):
+    make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    client = login('alice@example.com')
+
+    with count_queries(app) as plain:
+        assert client.get(f'/messages/{bob}/feed?after=0').get_json() == []
+    started = time.monotonic()
+    with count_queries(app) as parked:
+        assert client.get(f'/messages/{bob}/feed?after=0&wait=0.5').get_json() == []
+
+    assert time.monotonic() - started >= 0.5
+    assert parked.count == plain.count
+
+
+def test_long_poll_wait_is_capped(app, make_user, login):
+    app.config['FEED_LONGPOLL_MAX_WAIT'] = 0.2
+    make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    client = login('alice@example.com')
+
+    started = time.monotonic()
+    assert client.get(f'/messages/{bob}/feed?after=0&wait=60').get_json() == []
+    assert time.monotonic() - started < 5
+
+
+def test_topic_versions_are_bounded_without_losing_wakeups(app, monkeypatch):
+    monkeypatch.setattr(feed_notifier, 'max_topics', 3)
+
+    # Read before the topic is known, then bumped and forgotten before the wait
+    seen = feed_notifier.version('dm:1:2')
+    feed_notifier.notify('dm:1:2')
+    for n in range(5):
+        feed_notifier.notify(f'idle:{n}')
+    assert len(feed_notifier._versions) <= 3 and 'dm:1:2' not in feed_notifier._versions
+    assert feed_notifier.wait('dm:1:2', seen, 0) is True
+
+    # A topic with a parked waiter is never dropped
+    feed_notifier.notify('class_chat:7')
+    seen = feed_notifier.version('class_chat:7')
+    thread, result = _in_thread(lambda: feed_notifier.wait('class_chat:7', seen, 10))
+    time.sleep(0.2)
+    for n in range(5):
+        feed_notifier.notify(f'other:{n}')
+    assert 'class_chat:7' in feed_notifier._versions and thread.is_alive()
+    feed_notifier.notify('class_chat:7')
+    thread.join(5)
+    assert result['value'] is True
@@ -0,0 +1,60 @@
+from website import db
+from website.membership import membership_cache
+from website.models import ClassRoom, classroom_students
+
+
+def _make_class(app, teacher_id, code='JOINME'):
+    with app.app_context():
+        classroom = ClassRoom(name='Algebra', code=code, teacher_id=teacher_id)
+        db.session.add(classroom)
+        db.session.commit()
+        return classroom.id
+
+
+def test_join_and_remove_invalidate_cached_membership(app, make_user, login):
+    teacher = make_user('teach@example.com', role='teacher')
+    student = make_user('stu@example.com')
+    class_id = _make_class(app, teacher)
+    client = login('stu@example.com')
+
+    assert client.get(f'/class/{class_id}/chat/feed').status_code == 403
+    client.post('/class/join', data={'code': 'JOINME'})
+    assert client.get(f'/class/{class_id}/chat/feed').status_code == 200
+
+    login('teach@example.com').post(f'/class/{class_id}/remove-student/{student}')
+    assert client.get(f'/class/{class_id}/chat/feed').status_code == 403
+
+
+def test_cached_access_check_skips_the_membership_query(app, make_user, login, count_queries):
+    teacher = make_user('teach@example.com', role='teacher')
+    make_user('stu@example.com')
+    class_id = _make_class(app, teacher)
+    client = login('stu@example.com')
+    client.post('/class/join', data={'code': 'JOINME'})
+    client.get(f'/class/{class_id}/chat/feed')
+
+    with count_queries(app) as counter:
+        assert client.get(f'/class/{class_id}/chat/feed').status_code == 200
+    assert not [s for s in counter.statements if 'classroom_students' in s]
+
+    membership_cache.clear()
+    with count_queries(app) as counter:
+        client.get(f'/class/{class_id}/chat/feed')
+    assert len([s for s in counter.statements if 'classroom_students' in s]) == 1
+
+
+def test_without_a_message_queue_the_cache_only_briefly_outlives_a_removal(app, make_user, login):
+    teacher = make_user('teach@example.com', role='teacher')
+    student = make_user('stu@example.com')
+    class_id = _make_class(app, teacher)
+    client = login('stu@example.com')
+    client.post('/class/join', data={'code': 'JOINME'})
+    assert client.get(f'/class/{class_id}/chat/feed').status_code == 200
+    assert membership_cache.ttl == app.config['MEMBERSHIP_CACHE_LOCAL_TTL'] == 2.0
+
+    # Removed on another worker: no invalidation reaches this one, only the short TTL protects it
+    membership_cache.ttl = 0
+    with app.app_context():
+        db.session.execute(classroom_students.delete().where(classroom_students.c.user_id == student))
+        db.session.commit()
+    assert client.get(f'/class/{class_id}/chat/feed').status_code == 403
@@ -0,0 +1,58 @@
+import time
+
+import socketio as python_socketio
+
+from website import message_queue, socketio
+from website.message_queue import SERVER_ROOM, SQLiteManager, make_client_manager, on_server_event
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_single_process_by_default(app):
+    assert not isinstance(socketio.server.manager, python_socketio.PubSubManager)
+
+
+def test_sqlite_bus_delivers_emits_between_workers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'bus.db'}"
+
+    # "Worker" side: a server whose manager listens on the bus
+    listener = make_client_manager(url)
+    assert isinstance(listener, SQLiteManager)
+    received = []
+    listener._handle_emit = received.append
+    python_socketio.Server(client_manager=listener, async_mode='threading')
+    listener.initialize()
+
+    # Another worker (or any process) emitting through a write-only manager
+    publisher = make_client_manager(url, write_only=True)
+    publisher.emit('chat_message', {'content': 'hi'}, room='class_1', namespace='/')
+
+    assert wait_for(lambda: received)
+    message = received[0]
+    assert message['event'] == 'chat_message'
+    assert message['data'] == [{'content': 'hi'}]
+    assert message['room'] == 'class_1'
+
+
+def test_server_room_emits_run_listeners_on_every_worker(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'bus.db'}"
+    received = []
+    # A fresh entry, so the listener is gone from the global registry after the test
+    monkeypatch.setitem(message_queue._server_listeners, 'test_server_event', [])
+    on_server_event('test_server_event', received.append)
+
+    listener = make_client_manager(url)
+    python_socketio.Server(client_manager=listener, async_mode='threading')
+    listener.initialize()
+    make_client_manager(url, write_only=True).emit('test_server_event', ('class_chat:1',), room=SERVER_ROOM)
+
+    # once locally in the publisher, once from the bus in the listening worker
+    assert wait_for(lambda: len(received) == 2)
+    assert received == ['class_chat:1', 'class_chat:1']
@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from website.metrics import DEFAULT_BUCKETS, registry, snapshot_writer
+
+
+@pytest.fixture
+def app(make_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_writer, 'directory', None)  # restored afterwards
+    registry.reset()
+    yield make_app(METRICS_ENABLED=True, METRICS_MULTIPROC_DIR=str(tmp_path / 'metrics'), METRICS_TOKEN='s3cret')
+    registry.reset()
+
+
+def scrape(app):
+    response = app.test_client().get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    return response.get_data(as_text=True).splitlines()
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_metrics_need_the_token(app):
+    assert app.test_client().get('/metrics').status_code == 403
+
+
+def test_metrics_are_closed_without_a_token(make_app, monkeypatch):
+    monkeypatch.setattr(snapshot_writer, 'directory', None)
+    app = make_app(METRICS_ENABLED=True)
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_exposition_merges_live_and_exited_workers(app, tmp_path):
+    client = app.test_client()
+    client.get('/login')
+    client.get('/login')
+
+    # A worker that has exited: its counters still count, its gauges don't
+    labels = [['blueprint', 'auth'], ['endpoint', 'auth.login'], ['method', 'GET'], ['status', '200']]
+    (tmp_path / 'metrics' / 'metrics_1.json').write_text(json.dumps({
+        'pid': exited_pid(),
+        'counters': [['flask_http_requests_total', labels, 3]],
+        'histograms': [['flask_http_request_duration_seconds', labels[:2],
+                        {'buckets': list(DEFAULT_BUCKETS), 'counts': [0] * (len(DEFAULT_BUCKETS) - 1) + [3],
+                         'sum': 30.0, 'count': 3}]],
+        'gauges': [['socketio_connections', [], 7]],
+    }))
+
+    lines = scrape(app)
+    assert '# TYPE flask_http_requests_total counter' in lines
+    assert 'flask_http_requests_total{blueprint="auth",endpoint="auth.login",method="GET",status="200"} 5' in lines
+    assert '# TYPE flask_http_request_duration_seconds histogram' in lines
+    assert 'flask_http_request_duration_seconds_count{blueprint="auth",endpoint="auth.login"} 5' in lines
+    assert 'flask_http_request_duration_seconds_bucket{blueprint="auth",endpoint="auth.login",le="5.0"} 2' in lines
+    assert 'flask_http_request_duration_seconds_bucket{blueprint="auth",endpoint="auth.login",le="10.0"} 5' in lines
+    assert 'flask_http_request_duration_seconds_bucket{blueprint="auth",endpoint="auth.login",le="+Inf"} 5' in lines
+    assert 'socketio_connections 0' in lines  # only this live worker's gauge
+    assert not [line for line in lines if 'endpoint="metrics.metrics"' in line]
@@ -0,0 +1,49 @@
+import logging
+import os
+import sqlite3
+
+import pytest
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from flask_migrate import upgrade
+
+from website import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+
+
+def head_revision():
+    config = Config()
+    config.set_main_option('script_location', MIGRATIONS)
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def test_shipped_database_is_at_the_latest_migration():
+    conn = sqlite3.connect(f"file:{os.path.join(ROOT, 'database.db')}?mode=ro", uri=True)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert conn.execute('SELECT version_num FROM alembic_version').fetchall() == [(head_revision(),)]
+    finally:
+        conn.close()
+    assert set(db.metadata.tables) <= tables
+
+
+@pytest.fixture
+def keep_loggers():
+    # env.py runs logging.config.fileConfig, which disables every logger it doesn't name
+    loggers = [l for l in logging.Logger.manager.loggerDict.values() if isinstance(l, logging.Logger)]
+    states = [(l, l.disabled) for l in loggers]
+    yield
+    for logger, disabled in states:
+        logger.disabled = disabled
+
+
+def test_init_db_stamps_a_fresh_database_so_upgrade_is_a_no_op(make_app, keep_loggers):
+    app = make_app(MIGRATIONS_ENABLED=True)
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        assert db.session.execute(db.text('SELECT version_num FROM alembic_version')).scalar() == head_revision()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from website import db
+from website.models import User
+from website.passwords import HashPoolBusy, password_hasher
+
+
+def test_login_upgrades_outdated_hashes(app):
+    with app.app_context():
+        db.session.add(User(email='old@example.com', first_name='Old',
+                            password=generate_password_hash('legacy-pass', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'wrong'}).status_code == 200
+    with app.app_context():
+        assert User.query.filter_by(email='old@example.com').one().password.startswith('pbkdf2:sha256:1000$')
+
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'legacy-pass'}).status_code == 302
+    with app.app_context():
+        upgraded = User.query.filter_by(email='old@example.com').one().password
+    assert upgraded.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not password_hasher.needs_rehash(upgraded)
+
+    # The upgraded hash still logs in
+    assert app.test_client().post('/login', data={'email': 'old@example.com', 'password': 'legacy-pass'}).status_code == 302
+
+
+def test_signup_uses_configured_method(app):
+    client = app.test_client()
+    client.post('/signup', data={'email': 'new@example.com', 'firstName': 'New',
+                                 'password1': 'secret123', 'password2': 'secret123'})
+    with app.app_context():
+        stored = User.query.filter_by(email='new@example.com').one().password
+    assert stored.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+
+
+def test_full_hash_pool_answers_503(app, make_user):
+    make_user('alice@example.com')
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_QUEUE=0)
+    release = threading.Event()
+    holder = threading.Thread(target=password_hasher._run, args=(release.wait,))
+    holder.start()
+    try:
+        while password_hasher.pending() < 1:
+            release.wait(0.01)
+        busy = app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password123'})
+        assert busy.status_code == 503
+        assert busy.headers['Retry-After']
+    finally:
+        release.set()
+        holder.join()
+    ok = app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password123'})
+    assert ok.status_code == 302
+
+
+def test_timed_out_hash_answers_503_and_keeps_its_slot(app, make_user):
+    make_user('alice@example.com')
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_QUEUE=1, PASSWORD_HASH_TIMEOUT=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(HashPoolBusy):
+            password_hasher._run(release.wait)
+        assert password_hasher.pending() == 1  # still running on the pool
+
+        # Queued behind it, this one times out too; cancelling frees its slot at once
+        slow = app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password123'})
+        assert slow.status_code == 503 and slow.headers['Retry-After']
+        assert password_hasher.pending() == 1
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while password_hasher.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert password_hasher.pending() == 0
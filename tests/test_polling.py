@@ -0,0 +1,50 @@
+from flask import Flask
+
+from website import polling
+from website.polling import HEADER, PollAdvisor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _advisor(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(polling, 'time', clock)
+    app = Flask(__name__)
+    return PollAdvisor(app), app, clock
+
+
+def test_interval_grows_with_idle_time(monkeypatch):
+    advisor, app, clock = _advisor(monkeypatch)
+    advisor.touch('dm:1:2')
+    assert advisor.interval('dm:1:2') == app.config['POLL_MIN_INTERVAL']
+
+    clock.now += 100
+    assert advisor.interval('dm:1:2') == 10.0
+
+    clock.now += 10000
+    assert advisor.interval('dm:1:2') == app.config['POLL_MAX_INTERVAL']
+
+
+def test_interval_stretches_under_load(monkeypatch):
+    advisor, app, clock = _advisor(monkeypatch)
+    advisor.touch('class_chat:1')
+    clock.now += 40  # 4s when idle
+    app.extensions['load_shedder'] = type('Busy', (), {'pressure': lambda self: 1.0})()
+    assert advisor.interval('class_chat:1') == 8.0
+
+
+def test_feeds_send_a_poll_hint(app, make_user, login):
+    make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    client = login('alice@example.com')
+
+    client.post(f'/messages/{bob}/send', json={'content': 'hi'})
+    response = client.get(f'/messages/{bob}/feed?after=0')
+    assert float(response.headers[HEADER]) == app.config['POLL_MIN_INTERVAL']
+    assert HEADER in client.get('/messages/unread-summary').headers
@@ -0,0 +1,77 @@
+import marshal
+
+import pytest
+from flask import Flask
+
+from website.profiler import RequestProfiler, request_profiler
+
+
+@pytest.mark.parametrize('async_mode, modes', [
+    ('threading', ('sample', 'cprofile')),
+    ('eventlet', ('cprofile',)),
+    ('gevent', ('cprofile',)),
+])
+def test_sampling_is_disabled_under_green_threads(async_mode, modes, caplog):
+    app = Flask(__name__)
+    app.config['SOCKETIO_ASYNC_MODE'] = async_mode
+    profiler = RequestProfiler()
+    profiler.init_app(app)
+
+    assert profiler.modes == modes
+    assert ('sampling is unavailable' in caplog.text) == (async_mode != 'threading')
+    if 'sample' not in modes:
+        with pytest.raises(ValueError):
+            profiler.arm(1, mode='sample')
+    assert profiler.arm(1, mode='cprofile').mode == 'cprofile'
+
+
+@pytest.fixture
+def admin_client(app, make_user, login):
+    make_user('admin@example.com', is_admin=True)
+    yield login('admin@example.com')
+    request_profiler.cancel()
+
+
+def _profile(client, mode, count):
+    armed = client.post('/admin/profiler', json={'count': count, 'endpoint': 'views.my_notes',
+                                                 'mode': mode, 'interval_ms': 1})
+    assert armed.status_code == 201
+    for _ in range(count):
+        assert client.get('/my-notes').status_code == 200
+    client.get('/login')  # another endpoint: not profiled
+    return client.get('/admin/profiler').get_json()['current']
+
+
+def test_sample_session_finishes_with_collapsed_stacks(admin_client):
+    session = _profile(admin_client, 'sample', 5)
+    assert session['done'] and not session['cancelled']
+    assert [p['endpoint'] for p in session['profiled']] == ['views.my_notes'] * 5
+    assert session['samples'] > 0
+
+    collapsed = admin_client.get(f"/admin/profiler/{session['id']}/collapsed").get_data(as_text=True)
+    lines = collapsed.splitlines()
+    assert lines and all(line.startswith('views.my_notes;') for line in lines)
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+
+
+def test_cprofile_session_finishes_with_pstats(admin_client):
+    session = _profile(admin_client, 'cprofile', 3)
+    assert session['done'] and len(session['profiled']) == 3
+
+    prof = admin_client.get(f"/admin/profiler/{session['id']}/prof")
+    assert prof.status_code == 200 and prof.data
+    stats = marshal.loads(prof.data)
+    assert any(func[2] == 'my_notes' for func in stats)
+    assert admin_client.get(f"/admin/profiler/{session['id']}/collapsed").get_data(as_text=True)
+
+
+def test_admin_profiler_offers_only_the_available_modes(app, make_user, login, monkeypatch):
+    make_user('admin@example.com', is_admin=True)
+    client = login('admin@example.com')
+    monkeypatch.setattr(request_profiler, 'modes', ('cprofile',))
+
+    refused = client.post('/admin/profiler', json={'count': 1, 'mode': 'sample'})
+    assert refused.status_code == 400 and 'cprofile' in refused.get_json()['error']
+    armed = client.post('/admin/profiler', json={'count': 1})
+    assert armed.status_code == 201 and armed.get_json()['session']['mode'] == 'cprofile'
+    client.delete('/admin/profiler')
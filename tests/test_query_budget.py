@@ -0,0 +1,189 @@
+"""Per-route SQL statement budgets.
+
+Every route of the views, auth and admin blueprints is requested against a
+small seeded dataset and must not issue more statements than recorded in
+query_budget.json. Run with UPDATE_QUERY_BUDGET=1 to rewrite the file after
+an intentional change (and review the diff).
+"""
+
+import json
+import os
+
+import pytest
+from sqlalchemy import select
+
+from benchmark.dataset import Scale, generate, email_for
+from website import create_app, db, history
+from website.models import Note, NoteAttachment, classroom_students
+from website.membership import membership_cache
+from website.tags import tag_cache, tag_index
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'query_budget.json')
+UPDATE = os.environ.get('UPDATE_QUERY_BUDGET') == '1'
+
+SCALE = Scale(users=40, notes=300, messages=600, classrooms=4, class_size=25, tags=30,
+              posts_per_class=10, chat_per_class=40, comments=100, reactions=100)
+
+
+# (key, principal, method, path template, body, send body as form)
+CASES = [
+    ('views.home GET', 'student', 'GET', '/', None, False),
+    ('views.my_notes GET', 'student', 'GET', '/my-notes', None, False),
+    ('views.create_note GET', 'student', 'GET', '/create-note', None, False),
+    ('views.create_note POST', 'student', 'POST', '/create-note',
+     {'title': 'Budget', 'note': '<p>budget</p>', 'tags': 'alpha, beta, gamma'}, True),
+    ('views.view_note GET', 'student', 'GET', '/note/{note}', None, False),
+    ('views.edit_note_page GET', 'student', 'GET', '/edit-note/{note}', None, False),
+    ('views.edit_note_page POST', 'student', 'POST', '/edit-note/{note}',
+     {'title': 'Edited', 'note': '<p>edited</p>', 'tags': 'alpha, delta'}, True),
+    ('views.autosave_note POST', 'student', 'POST', '/note/{note}/autosave',
+     {'seq': 0, 'ops': [{'insert': 'autosaved\n'}], 'full': True}, False),
+    ('views.note_history GET', 'student', 'GET', '/note/{note}/history', None, False),
+    ('views.note_history_version GET', 'student', 'GET', '/note/{note}/history/1', None, False),
+    ('views.add_comment POST', 'student', 'POST', '/add-comment',
+     {'noteId': '{public_note}', 'content': 'budget comment'}, False),
+    ('views.add_reaction POST', 'student', 'POST', '/add-reaction', {'noteId': '{public_note}', 'type': 'like'}, False),
+    ('views.classes GET', 'student', 'GET', '/classes', None, False),
+    ('views.class_feed GET', 'student', 'GET', '/class/{big_class}', None, False),
+    ('views.class_chat GET', 'student', 'GET', '/class/{big_class}/chat', None, False),
+    ('views.class_chat_feed GET', 'student', 'GET', '/class/{big_class}/chat/feed', None, False),
+    ('views.class_chat_send POST', 'student', 'POST', '/class/{big_class}/chat/send', {'content': 'hi'}, False),
+    ('views.class_create_poll POST', 'teacher', 'POST', '/class/{big_class}/polls',
+     {'question': 'Budget?', 'options': ['yes', 'no']}, False),
+    ('views.class_poll_vote POST', 'student', 'POST', '/class/{big_class}/polls/1/vote', {'option_id': 1}, False),
+    ('views.create_class_post POST', 'teacher', 'POST', '/class/{big_class}/post', {'content': 'budget post'}, True),
+    ('views.join_class_by_code POST', 'student', 'POST', '/class/join', {'code': 'BENCH4'}, True),
+    ('views.remove_student POST', 'teacher', 'POST', '/class/{big_class}/remove-student/{classmate}', None, False),
+    ('views.messages_index GET', 'student', 'GET', '/messages', None, False),
+    ('views.messages GET', 'student', 'GET', '/messages/{partner}', None, False),
+    ('views.messages_send POST', 'student', 'POST', '/messages/{partner}/send', {'content': 'hi'}, False),
+    ('views.messages_feed GET', 'student', 'GET', '/messages/{partner}/feed', None, False),
+    ('views.messages_mark_read POST', 'student', 'POST', '/messages/{partner}/read', None, False),
+    ('views.messages_unread_summary GET', 'student', 'GET', '/messages/unread-summary', None, False),
+    ('views.event_stream GET', 'student', 'GET', '/events', None, False),
+    ('views.user_search GET', 'student', 'GET', '/user-search?q=Ada', None, False),
+    ('views.download_attachment GET', 'student', 'GET', '/attachments/{attachment}', None, False),
+    ('views.attachment_thumbnail GET', 'student', 'GET', '/attachments/{attachment}/thumbnail', None, False),
+    ('auth.signup GET', None, 'GET', '/signup', None, False),
+    ('auth.signup POST', None, 'POST', '/signup',
+     {'email': 'new@budget.test', 'firstName': 'New', 'password1': 'secret123', 'password2': 'secret123'}, True),
+    ('auth.login GET', None, 'GET', '/login', None, False),
+    ('auth.login POST', None, 'POST', '/login', {'email': '{student_email}', 'password': 'password123'}, True),
+    ('auth.logout GET', 'student', 'GET', '/logout', None, False),
+    ('admin.dashboard GET', 'admin', 'GET', '/admin/dashboard', None, False),
+    ('admin.delete_user POST', 'admin', 'POST', '/admin/delete-user/{doomed}', None, False),
+    ('admin.instrumentation GET', 'admin', 'GET', '/admin/instrumentation', None, False),
+    ('admin.profiler GET', 'admin', 'GET', '/admin/profiler', None, False),
+    ('admin.profiler POST', 'admin', 'POST', '/admin/profiler', {'count': 1, 'endpoint': 'views.home'}, False),
+    ('admin.profiler DELETE', 'admin', 'DELETE', '/admin/profiler', None, False),
+    ('admin.profiler_result GET', 'admin', 'GET', '/admin/profiler/unknown/collapsed', None, False),
+]
+
+_measured = {}
+
+
+def _fill(value, context):
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, dict):
+        return {k: _fill(v, context) for k, v in value.items()}
+    return value
+
+
+def _coerce(value):
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('budget')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp / 'budget.db'}",
+        'UPLOAD_FOLDER': str(tmp / 'uploads'),
+        'ATTACHMENT_PROCESS_INLINE': True,
+        'SSE_STREAM_SECONDS': 0,
+    })
+    tag_cache.forget()
+    tag_index.invalidate()
+    context = generate(app, SCALE, progress=lambda message: None)
+
+    os.makedirs(tmp / 'uploads')
+    (tmp / 'uploads' / 'notes.txt').write_text('attachment body')
+    with app.app_context():
+        note = db.session.get(Note, context['note'])
+        history.record_version(note)
+        attachment = NoteAttachment(note_id=note.id, filename='notes.txt', filepath='notes.txt',
+                                    mimetype='text/plain', size=15, processing_status='done')
+        db.session.add(attachment)
+        db.session.commit()
+        context['attachment'] = attachment.id
+        context['classmate'] = db.session.execute(
+            select(classroom_students.c.user_id).where(
+                classroom_students.c.classroom_id == context['big_class'],
+                classroom_students.c.user_id.not_in([context['student'], context['partner']])
+            ).limit(1)
+        ).scalar()
+    context['doomed'] = SCALE.users
+    context['student_email'] = email_for(context['student'])
+
+    yield app, context
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    tag_cache.forget()
+    tag_index.invalidate()
+    if UPDATE:
+        with open(BUDGET_FILE, 'w') as fh:
+            json.dump(dict(sorted(_measured.items())), fh, indent=2)
+            fh.write('\n')
+
+
+def _budget():
+    if not os.path.exists(BUDGET_FILE):
+        return {}
+    with open(BUDGET_FILE) as fh:
+        return json.load(fh)
+
+
+@pytest.mark.parametrize('key,role,method,path,body,form', CASES, ids=[c[0] for c in CASES])
+def test_route_within_query_budget(seeded, count_queries, key, role, method, path, body, form):
+    app, context = seeded
+    client = app.test_client()
+    if role:
+        client.post('/login', data={'email': email_for(context[role]), 'password': 'password123'})
+
+    path = _fill(path, context)
+    kwargs = {}
+    if body is not None:
+        body = {k: _coerce(v) for k, v in _fill(body, context).items()} if not form else _fill(body, context)
+        kwargs['data' if form else 'json'] = body
+
+    membership_cache.clear()  # budget the cold path; earlier cases would otherwise warm it
+    with count_queries(app) as counter:
+        response = client.open(path, method=method, **kwargs)
+    assert response.status_code < 500, response.data[:500]
+    _measured[key] = counter.count
+
+    if UPDATE:
+        return
+    budget = _budget()
+    assert key in budget, f"{key} has no entry in query_budget.json (run with UPDATE_QUERY_BUDGET=1)"
+    assert counter.count <= budget[key], (
+        f"{key} ran {counter.count} SQL statements (budget {budget[key]}) in {counter.elapsed * 1000:.1f} ms:\n"
+        + '\n'.join(counter.statements)
+    )
+
+
+def test_every_route_has_a_budget_case(seeded):
+    app, _ = seeded
+    covered = {case[0] for case in CASES}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] not in ('views', 'auth', 'admin'):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if f'{rule.endpoint} {method}' not in covered:
+                missing.append(f'{rule.endpoint} {method}')
+    assert not missing, f"Routes without a query budget case: {missing}"
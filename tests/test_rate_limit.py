@@ -0,0 +1,48 @@
+from website import socketio
+from website.rate_limit import SQLiteStorage
+
+
+def test_write_endpoint_returns_429_once_the_bucket_is_empty(app, make_user, login):
+    make_user('alice@example.com')
+    make_user('carol@example.com')
+    bob = make_user('bob@example.com')
+    app.config['RATELIMIT_BUDGETS'] = {'views.messages_send': (3, 0.01)}
+    alice = login('alice@example.com')
+
+    sent = [alice.post(f'/messages/{bob}/send', json={'content': f'm{i}'}).status_code for i in range(4)]
+    assert sent == [200, 200, 200, 429]
+    limited = alice.post(f'/messages/{bob}/send', json={'content': 'again'})
+    assert limited.status_code == 429
+    assert limited.get_json()['success'] is False
+    assert int(limited.headers['Retry-After']) >= 1
+
+    # Buckets are per user, and reads are never limited
+    carol = login('carol@example.com')
+    assert carol.post(f'/messages/{bob}/send', json={'content': 'hi'}).status_code == 200
+    assert alice.get(f'/messages/{bob}/feed?after=0').status_code == 200
+
+    app.config['RATELIMIT_ENABLED'] = False
+    assert alice.post(f'/messages/{bob}/send', json={'content': 'unlimited'}).status_code == 200
+
+
+def test_socket_events_share_the_limiter(app, make_user, login):
+    make_user('alice@example.com')
+    app.config['RATELIMIT_BUDGETS'] = {'collab_join': (1, 0.01)}
+    client = socketio.test_client(app, flask_test_client=login('alice@example.com'))
+
+    first = client.emit('collab_join', {'note_id': 999}, callback=True)
+    assert first == {'success': False, 'error': 'Not allowed'}
+    second = client.emit('collab_join', {'note_id': 999}, callback=True)
+    assert second['success'] is False and second['retry_after'] >= 1
+    client.disconnect()
+
+
+def test_sqlite_storage_is_shared_between_workers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'limits.db'}"
+    worker_a, worker_b = SQLiteStorage(url), SQLiteStorage(url)
+
+    assert worker_a.consume('k', 2, 1.0, now=100.0)[0]
+    assert worker_b.consume('k', 2, 1.0, now=100.0)[0]
+    allowed, _, wait = worker_a.consume('k', 2, 1.0, now=100.0)
+    assert not allowed and wait == 1.0
+    assert worker_b.consume('k', 2, 1.0, now=101.0)[0]
@@ -0,0 +1,28 @@
+import json
+
+from sqlalchemy import func, select, text
+
+import seed
+from benchmark import dataset
+from website import db
+
+
+def test_bulk_seed_replaces_the_data_with_a_consistent_dataset(app, make_user, tmp_path, capsys):
+    make_user('leftover@example.com')
+    context = seed.create_bulk_data(app, 'tiny', batch_size=100, users=40, notes=150, messages=300,
+                                    classrooms=3, class_size=10, tags=20, comments=50, reactions=50)
+    assert 'BULK SEEDING COMPLETE' in capsys.readouterr().out
+
+    with app.app_context():
+        for table, count in context['rows'].items():
+            assert db.session.scalar(select(func.count()).select_from(db.metadata.tables[table])) == count, table
+        assert context['rows']['user'] == 40 and context['rows']['note'] == 150
+        assert db.session.execute(text('PRAGMA foreign_key_check')).all() == []
+
+    with open(tmp_path / 'test.db.context.json') as fh:
+        assert json.load(fh)['rows'] == context['rows']
+
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'leftover@example.com', 'password': 'password123'}).status_code == 200
+    admin = client.post('/login', data={'email': dataset.email_for(context['admin']), 'password': dataset.PASSWORD})
+    assert admin.status_code == 302
@@ -0,0 +1,46 @@
+import http.client
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmark.capacity import ROOT, free_port, wait_ready
+
+
+def test_serve_drains_and_exits_on_sigterm(tmp_path):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--worker', 'threading', '--host', '127.0.0.1', '--port', str(port),
+         '--db', str(tmp_path / 'serve.db'), '--drain-timeout', '5'],
+        cwd=ROOT, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        wait_ready(port)
+
+        # A long-poll in flight when SIGTERM arrives gets the close packet, not a dropped connection
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('GET', '/socket.io/?EIO=4&transport=polling')
+        sid = conn.getresponse().read().decode().split('"sid":"')[1].split('"')[0]
+        conn.request('GET', f'/socket.io/?EIO=4&transport=polling&sid={sid}')
+        time.sleep(0.5)
+
+        process.send_signal(signal.SIGTERM)
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.read() == b'1'  # Engine.IO close packet
+        assert process.wait(10) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+    assert 'stopped' in process.stderr.read()
+
+
+def test_several_workers_need_shared_backends(monkeypatch):
+    import serve
+    monkeypatch.setenv('SOCKETIO_MESSAGE_QUEUE', 'redis://localhost:6379/0')
+    monkeypatch.delenv('RATELIMIT_STORAGE_URL', raising=False)
+    with pytest.raises(SystemExit) as exc:
+        serve.main(['--workers', '2', '--worker', 'threading'])
+    assert 'RATELIMIT_STORAGE_URL' in str(exc.value) and 'SOCKETIO_MESSAGE_QUEUE' not in str(exc.value)
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from website import db
+from website.models import User
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return tmp_path / 'slow.log'
+
+
+@pytest.fixture
+def app(make_app, log_file):
+    return make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_FILE=str(log_file))
+
+
+def entries(log_file):
+    return [json.loads(line) for line in log_file.read_text(encoding='utf-8').splitlines()]
+
+
+def test_statements_over_the_threshold_are_logged_with_their_plan(app, make_user, login, log_file, make_app):
+    make_user('ann@example.com')
+    login('ann@example.com').get('/my-notes')
+
+    logged = entries(log_file)
+    inserts = [e for e in logged if e['statement'].lstrip().upper().startswith('INSERT INTO USER')]
+    assert inserts and all(e['parameters'] == '<redacted>' for e in inserts)
+
+    notes = [e for e in logged if e['endpoint'] == 'views.my_notes' and 'FROM note' in e['statement']]
+    assert notes and notes[0]['method'] == 'GET' and notes[0]['path'] == '/my-notes'
+    assert isinstance(notes[0]['plan'], list) and notes[0]['plan']
+    assert notes[0]['duration_ms'] >= 0
+
+    # An app without a threshold stops logging, although the observer stays attached
+    quiet = make_app()
+    before = len(entries(log_file))
+    with quiet.app_context():
+        db.session.execute(db.select(User)).all()
+    assert len(entries(log_file)) == before
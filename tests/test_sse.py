@@ -0,0 +1,83 @@
+import threading
+import time
+
+from website import db
+from website.models import ClassRoom, User
+from website.sse import event_hub, user_topic
+
+
+def _classroom(app, teacher_id, student_ids):
+    with app.app_context():
+        classroom = ClassRoom(name='Maths', code='MATHS1', teacher_id=teacher_id)
+        classroom.students.extend(db.session.get(User, sid) for sid in student_ids)
+        db.session.add(classroom)
+        db.session.commit()
+        return classroom.id
+
+
+def test_stream_starts_with_unread_snapshot(app, make_user, login):
+    app.config['SSE_STREAM_SECONDS'] = 0
+    make_user('alice@example.com')
+    bob = make_user('bob@example.com')
+    login('alice@example.com').post(f'/messages/{bob}/send', json={'content': 'hi'})
+
+    body = login('bob@example.com').get('/events').get_data(as_text=True)
+    assert 'event: unread\ndata: {"total": 1}' in body
+
+
+def test_resume_replays_only_the_users_topics(app, make_user, login):
+    app.config['SSE_STREAM_SECONDS'] = 0
+    teacher = make_user('teacher@example.com', role='teacher')
+    student = make_user('student@example.com')
+    make_user('outsider@example.com')
+    class_id = _classroom(app, teacher, [student])
+
+    since = time.time_ns() // 1000
+    login('teacher@example.com').post(f'/class/{class_id}/post', data={'title': 'Quiz', 'content': 'Friday'})
+
+    body = login('student@example.com').get('/events', headers={'Last-Event-ID': str(since)}).get_data(as_text=True)
+    assert 'event: class_post' in body and '"title": "Quiz"' in body
+    assert 'event: unread' not in body  # resumed, no snapshot needed
+
+    body = login('outsider@example.com').get('/events', headers={'Last-Event-ID': str(since)}).get_data(as_text=True)
+    assert 'class_post' not in body
+
+
+def test_resume_past_the_buffer_sends_reset(app, make_user, login):
+    app.config['SSE_STREAM_SECONDS'] = 0
+    make_user('alice@example.com')
+    body = login('alice@example.com').get('/events', headers={'Last-Event-ID': '1'}).get_data(as_text=True)
+    assert 'event: reset' in body
+    assert 'event: unread' in body
+
+
+def test_live_events_reach_an_open_stream(app, make_user, login):
+    app.config['SSE_STREAM_SECONDS'] = 2
+    alice = make_user('alice@example.com')
+    client = login('alice@example.com')
+
+    body = {}
+    reader = threading.Thread(target=lambda: body.update(text=client.get('/events').get_data(as_text=True)))
+    reader.start()
+    time.sleep(0.3)
+    event_hub.publish(user_topic(alice), 'comment', {'note_id': 1, 'author': 'bob'})
+    event_hub.publish(user_topic(alice + 1), 'comment', {'note_id': 2, 'author': 'eve'})
+    reader.join(5)
+
+    assert '"author": "bob"' in body['text']
+    assert '"author": "eve"' not in body['text']
+
+
+def test_stream_that_falls_behind_the_buffer_sends_reset(make_app):
+    make_app(SSE_BUFFER_SIZE=3)
+    try:
+        cursor, _, _ = event_hub.resume(None)
+        stream = event_hub.stream({user_topic(1)}, cursor, [], [], 5.0, 5.0)
+        assert next(stream).startswith('retry:')
+        for n in range(5):
+            event_hub.publish(user_topic(1), 'comment', {'n': n})
+
+        assert next(stream) == 'event: reset\ndata: {}\n\n'
+        assert list(stream) == []
+    finally:
+        make_app()  # back to the default buffer size
@@ -0,0 +1,123 @@
+import pytest
+
+from website import db, message_queue
+from website.models import Note, Tag, UserTagCount, tags_notes_association
+from website.tags import tag_cache, tag_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_tag_state():
+    # The cache and index are process-wide; each test gets a new database
+    tag_cache.forget()
+    tag_index.invalidate()
+    yield
+    tag_cache.forget()
+    tag_index.invalidate()
+
+
+def create_note(client, tags, title='note'):
+    return client.post('/create-note', data={'note': '<p>body</p>', 'title': title, 'tags': tags})
+
+
+def user_counts(client):
+    return {row['name']: row['count'] for row in client.get('/api/tags/counts').get_json()}
+
+
+def test_create_note_resolves_tags_in_bulk(app, make_user, login):
+    make_user('ann@example.com')
+    client = login('ann@example.com')
+
+    create_note(client, 'python, flask, python , ')
+    create_note(client, 'flask, sql')
+
+    with app.app_context():
+        assert sorted(t.name for t in Tag.query.all()) == ['flask', 'python', 'sql']
+        counts = {t.name: t.note_count for t in Tag.query.all()}
+    assert counts == {'python': 1, 'flask': 2, 'sql': 1}
+
+
+def test_autocomplete_is_prefix_and_case_insensitive(app, make_user, login):
+    make_user('ann@example.com')
+    client = login('ann@example.com')
+    create_note(client, 'Python, pytest, flask')
+
+    assert client.get('/api/tags/autocomplete?q=py').get_json() == ['pytest', 'Python']
+    assert client.get('/api/tags/autocomplete?q=PY&limit=1').get_json() == ['pytest']
+    assert client.get('/api/tags/autocomplete?q=zzz').get_json() == []
+
+    # Tags created after the index was built show up without a rebuild
+    create_note(client, 'pygame')
+    assert 'pygame' in client.get('/api/tags/autocomplete?q=pyg').get_json()
+
+
+def test_counts_follow_edits(app, make_user, login):
+    make_user('ann@example.com')
+    make_user('ben@example.com')
+    ann, ben = login('ann@example.com'), login('ben@example.com')
+
+    create_note(ann, 'a, b')
+    create_note(ben, 'a')
+    with app.app_context():
+        note_id = Note.query.filter_by(title='note').first().id
+
+    assert user_counts(ann) == {'a': 1, 'b': 1}
+    assert user_counts(ben) == {'a': 1}
+    global_counts = {r['name']: r['count'] for r in ann.get('/api/tags/counts?scope=global').get_json()}
+    assert global_counts == {'a': 2, 'b': 1}
+
+    ann.post(f'/edit-note/{note_id}', data={'note': '<p>x</p>', 'title': 'note', 'tags': 'b, c'})
+    assert user_counts(ann) == {'b': 1, 'c': 1}
+    global_counts = {r['name']: r['count'] for r in ann.get('/api/tags/counts?scope=global').get_json()}
+    assert global_counts == {'a': 1, 'b': 1, 'c': 1}
+
+
+def test_retag_only_touches_own_notes(app, make_user, login):
+    make_user('ann@example.com')
+    make_user('ben@example.com')
+    ann, ben = login('ann@example.com'), login('ben@example.com')
+    create_note(ann, 'js, javascript')
+    create_note(ann, 'js')
+    create_note(ben, 'js')
+
+    resp = ann.post('/api/tags/retag', json={'from': ['js'], 'to': 'javascript'})
+    assert resp.get_json() == {'success': True, 'moved': 2}
+
+    assert user_counts(ann) == {'javascript': 2}
+    assert user_counts(ben) == {'js': 1}
+
+
+def test_merge_requires_admin_and_rewrites_rows(app, make_user, login, monkeypatch):
+    broadcasts = []
+    broadcast = message_queue.broadcast
+
+    def record(event, *args):
+        broadcasts.append((event, *args))
+        broadcast(event, *args)
+    monkeypatch.setattr(message_queue, 'broadcast', record)
+
+    make_user('ann@example.com')
+    make_user('root@example.com', is_admin=True)
+    ann, admin = login('ann@example.com'), login('root@example.com')
+    create_note(ann, 'js, JS')
+    create_note(ann, 'ecmascript')
+
+    assert ann.post('/api/tags/merge', json={'from': ['js'], 'to': 'javascript'}).status_code == 403
+
+    resp = admin.post('/api/tags/merge', json={'from': ['js', 'JS', 'ecmascript'], 'to': 'javascript'})
+    assert resp.get_json()['success']
+
+    with app.app_context():
+        assert [t.name for t in Tag.query.all()] == ['javascript']
+        assert Tag.query.one().note_count == 2
+        rows = db.session.execute(db.select(tags_notes_association)).all()
+        assert len(rows) == 2
+        assert [c.count for c in UserTagCount.query.all()] == [2]
+    assert admin.get('/api/tags/autocomplete?q=j').get_json() == ['javascript']
+
+    # Merged names are not served from the cache afterwards
+    create_note(ann, 'js')
+    with app.app_context():
+        assert Tag.query.filter_by(name='js').one().note_count == 1
+
+    # Other workers learn about the deleted tags through the message queue
+    assert ('tags_deleted', ['JS', 'ecmascript', 'js']) in broadcasts
@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import insert, select
+
+from website import db, message_queue
+from website.models import Note, Tag, tags_notes_association
+from website.tag_filter import _facet_cache, facet_counts, filter_user_notes
+from website.tags import GENERATION_EVENT, tag_cache, tag_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_tag_state():
+    # The caches are process-wide; each test gets a new database
+    tag_cache.forget()
+    tag_index.invalidate()
+    _facet_cache._entries.clear()
+    yield
+    tag_cache.forget()
+    tag_index.invalidate()
+    _facet_cache._entries.clear()
+
+
+def create_note(client, title, tags):
+    client.post('/create-note', data={'note': '<p>body</p>', 'title': title, 'tags': tags})
+
+
+def titles(app, user_id, tags, mode='and'):
+    with app.app_context():
+        pagination, _ = filter_user_notes(user_id, tags, mode)
+        return None if pagination is None else sorted(note.title for note in pagination.items)
+
+
+def test_and_filter_needs_every_tag(app, make_user, login):
+    ann = make_user('ann@example.com')
+    make_user('ben@example.com')
+    client = login('ann@example.com')
+    create_note(client, 'abc', 'a, b, c')
+    create_note(client, 'ab', 'a, b')
+    create_note(client, 'a', 'a')
+    create_note(client, 'bc', 'b, c')
+    create_note(login('ben@example.com'), 'ben ab', 'a, b')
+
+    assert titles(app, ann, 'a, b') == ['ab', 'abc']
+    assert titles(app, ann, 'c, b, a') == ['abc']
+    assert titles(app, ann, 'a, b', mode='or') == ['a', 'ab', 'abc', 'bc']
+    # A tag only someone else uses: nothing can match, without running the filter
+    create_note(login('ben@example.com'), 'ben d', 'd')
+    assert titles(app, ann, 'a, d') is None
+
+
+def test_facet_cache_follows_tag_changes(app, make_user, login, count_queries):
+    ann = make_user('ann@example.com')
+    client = login('ann@example.com')
+    create_note(client, 'one', 'a, b')
+    create_note(client, 'two', 'a')
+
+    with app.app_context():
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 1)]
+    with count_queries(app) as counter, app.app_context():
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 1)]
+    assert counter.count == 0
+
+    with app.app_context():
+        note_id = Note.query.filter_by(title='two').one().id
+    client.post(f'/edit-note/{note_id}', data={'note': '<p>body</p>', 'title': 'two', 'tags': 'a, c'})
+    with app.app_context():
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 1), ('c', 1)]
+        assert facet_counts(ann) == [('a', 2), ('b', 1), ('c', 1)]
+
+
+def test_facets_follow_the_search_text(app, make_user, login):
+    ann = make_user('ann@example.com')
+    client = login('ann@example.com')
+    create_note(client, 'maths homework', 'school, algebra')
+    create_note(client, 'maths exam', 'school')
+    create_note(client, 'history essay', 'school, essays')
+
+    with app.app_context():
+        assert facet_counts(ann, text='maths') == [('school', 2), ('algebra', 1)]
+        assert facet_counts(ann, ['school'], text='essay') == [('essays', 1), ('school', 1)]
+        assert facet_counts(ann, ['algebra'], text='exam') == []
+        assert facet_counts(ann) == [('school', 3), ('algebra', 1), ('essays', 1)]
+
+    page = client.get('/my-notes?q=maths').get_data(as_text=True)
+    assert 'algebra <span class="text-muted">1</span>' in page
+    assert 'essays <span' not in page
+
+
+def test_facets_are_invalidated_through_the_message_queue(app, make_user, login, monkeypatch):
+    ann = make_user('ann@example.com')
+    client = login('ann@example.com')
+    create_note(client, 'one', 'a')
+
+    sent = []
+    real_broadcast = message_queue.broadcast
+    monkeypatch.setattr(message_queue, 'broadcast', lambda event, *args: (sent.append((event, args)),
+                                                                         real_broadcast(event, *args)))
+    create_note(client, 'two', 'a, b')
+    assert (GENERATION_EVENT, ([ann], False)) in sent
+
+    with app.app_context():
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 1)]
+        # Another worker tags a note; only its broadcast reaches this one
+        note_id = Note.query.filter_by(title='one').one().id
+        tag_b = db.session.scalar(select(Tag.id).where(Tag.name == 'b'))
+        db.session.execute(insert(tags_notes_association).values(note_id=note_id, tag_id=tag_b))
+        db.session.commit()
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 1)]
+
+        message_queue._dispatch_server_event(GENERATION_EVENT, ([ann], False))
+        assert facet_counts(ann, ['a']) == [('a', 2), ('b', 2)]
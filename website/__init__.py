@@ -1,20 +1,20 @@
 # FILE: website/__init__.py (Corrected and Stable)
 
+import click
 from flask import Flask
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
 from os import path
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_socketio import SocketIO 
 
 db = SQLAlchemy()
-migrate = Migrate()
 socketio = SocketIO(cors_allowed_origins="*")
 
 DB_NAME = 'database.db'
 
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'aldskfhlsd_lakdshflk'
     app.config['UPLOAD_FOLDER'] = path.join(path.abspath(path.join(path.dirname(__file__), '..')), 'uploads')
@@ -24,28 +24,65 @@ def create_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
 
+    if test_config:
+        app.config.update(test_config)
+
     db.init_app(app)
-    migrate.init_app(app, db)
-    socketio.init_app(app)
+    init_migrations(app)
+    from . import message_queue
+    # Socket.IO handlers must be declared before init_app so every new server (one per app) gets them
+    from . import collab  # noqa: F401
+    # serve.py picks eventlet/gevent after monkey-patching; None auto-detects
+    socketio.init_app(app, async_mode=app.config.get('SOCKETIO_ASYNC_MODE'), **message_queue.init_app(app))
 
-    # Import ALL models BEFORE create_all()
-    from .models import (
-        User, Note, Tag, Comment, Reaction,
-        ClassRoom, ClassPost, Message, NoteHistory,
-        ClassChatMessage, Poll, PollOption, PollVote, NoteAttachment
-    )
+    from .attachments import attachment_processor
+    attachment_processor.init_app(app)
+    from .autosave import autosave_buffer
+    autosave_buffer.init_app(app)
+    from . import tags
+    tags.init_app(app)
+    from . import instrumentation
+    instrumentation.init_app(app)
+    from . import metrics
+    metrics.init_app(app)
+    from .slow_query import slow_query_log
+    slow_query_log.init_app(app)
+    from .profiler import request_profiler
+    request_profiler.init_app(app)
+    from .longpoll import feed_notifier
+    feed_notifier.init_app(app)
+    from .sse import event_hub
+    event_hub.init_app(app)
+    from .load_shedding import load_shedder
+    load_shedder.init_app(app)
+    from .passwords import password_hasher
+    password_hasher.init_app(app)
+    from .rate_limit import rate_limiter
+    rate_limiter.init_app(app)
+    from .login_guard import login_guard
+    login_guard.init_app(app)
+    from .membership import membership_cache
+    membership_cache.init_app(app)
+    from .polling import poll_advisor
+    poll_advisor.init_app(app)
 
     # Register Blueprints
     from .views import views
     from .auth import auth
     from .admin import admin
+    from .tag_api import tag_api
 
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
     app.register_blueprint(admin, url_prefix='/admin')
+    app.register_blueprint(tag_api, url_prefix='/api/tags')
+
+    from .history import compact_history_command
+    app.cli.add_command(compact_history_command)
+    app.cli.add_command(init_db_command)
 
-    # Create DB if missing
-    create_database(app)
+    # Schema is managed by Alembic (`flask --app main db upgrade`), not at startup
+    from .models import User
 
     # Login manager setup
     login_manager = LoginManager()
@@ -75,18 +112,31 @@ def create_app():
     return app
 
 
-def create_database(app):
-    """Create the database file + all tables if DB is missing."""
-    db_file = app.config['SQLALCHEMY_DATABASE_URI'].replace("sqlite:///", "")
+def init_migrations(app):
+    """Attach Flask-Migrate only where the `flask db` commands can run.
+
+    Importing Flask-Migrate pulls in Alembic, which web workers never use.
+    MIGRATIONS_ENABLED forces it on or off; by default it is enabled when
+    the app is being built by a click command (the flask CLI).
+    """
+    enabled = app.config.get('MIGRATIONS_ENABLED')
+    if enabled is None:
+        enabled = click.get_current_context(silent=True) is not None
+    if enabled:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
 
-    if not path.exists(db_file):
-        print(f"Database not found. Creating new database at: {db_file}")
-        with app.app_context():
-            db.create_all()
-            db.session.commit()
-            print("Database schema created successfully!")
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create every table on an empty database and stamp it at the latest migration."""
+    from flask_migrate import stamp
+    db.create_all()
+    stamp()
+    click.echo("Database created and stamped at the latest migration.")
 
 
-def run_socketio_app():
-    app = create_app()
+def run_socketio_app(app=None):
+    app = app or create_app()
     socketio.run(app, host="0.0.0.0", port=5001, debug=True)
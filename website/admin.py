@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, flash, redirect, url_for
+from flask import Blueprint, render_template, flash, redirect, url_for, jsonify, current_app, request, Response
 from flask_login import login_required, current_user
 from functools import wraps
 from .models import User, Note
 from . import db
+from .instrumentation import request_stats
+from .profiler import request_profiler
 
 admin = Blueprint('admin', __name__)
 
@@ -39,3 +41,76 @@ def delete_user(user_id):
     db.session.commit()
     flash(f'User {user_to_delete.email} successfully deleted.', category='success')
     return redirect(url_for('admin.dashboard'))
+
+
+# -------------------- REQUEST INSTRUMENTATION --------------------
+@admin.route('/instrumentation')
+@login_required
+@admin_required
+def instrumentation():
+    return jsonify(
+        enabled=current_app.config.get('INSTRUMENTATION_ENABLED', False),
+        window_seconds=request_stats.window,
+        endpoints=request_stats.snapshot()
+    )
+
+
+# -------------------- PROFILER --------------------
+@admin.route('/profiler', methods=['GET', 'POST', 'DELETE'])
+@login_required
+@admin_required
+def profiler():
+    """POST {"count", "endpoint", "mode", "interval_ms"} arms a session; DELETE cancels it."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        mode = data.get('mode', request_profiler.modes[0])
+        if mode not in request_profiler.modes:
+            return jsonify(success=False, error=f"mode must be one of {', '.join(request_profiler.modes)}"), 400
+        endpoint = data.get('endpoint') or None
+        if endpoint and endpoint not in current_app.view_functions:
+            return jsonify(success=False, error=f"Unknown endpoint '{endpoint}'"), 400
+        try:
+            count = int(data.get('count', 10))
+            interval = float(data.get('interval_ms', 5)) / 1000.0
+        except (TypeError, ValueError):
+            return jsonify(success=False, error="count and interval_ms must be numbers"), 400
+        count = max(1, min(count, current_app.config['PROFILER_MAX_REQUESTS']))
+        session = request_profiler.arm(
+            count, endpoint, mode,
+            interval=max(interval, 0.001),
+            max_seconds=current_app.config['PROFILER_MAX_SECONDS']
+        )
+        return jsonify(success=True, session=session.to_dict()), 201
+
+    if request.method == 'DELETE':
+        request_profiler.cancel()
+
+    current = request_profiler.current
+    return jsonify(
+        success=True,
+        current=current.to_dict() if current else None,
+        sessions=[s.to_dict() for s in reversed(list(request_profiler.sessions.values()))]
+    )
+
+
+@admin.route('/profiler/<session_id>/<fmt>')
+@login_required
+@admin_required
+def profiler_result(session_id, fmt):
+    """Download a session as collapsed stacks ('collapsed'), pstats ('prof') or a text summary."""
+    session = request_profiler.get(session_id)
+    if session is None:
+        return jsonify(success=False, error="Unknown profiling session"), 404
+
+    if fmt == 'collapsed':
+        body, mimetype, filename = session.collapsed(), 'text/plain', f'profile-{session.id}.collapsed'
+    elif fmt == 'prof' and session.mode == 'cprofile':
+        body, mimetype, filename = session.prof_bytes(), 'application/octet-stream', f'profile-{session.id}.prof'
+    elif fmt == 'summary' and session.mode == 'cprofile':
+        return Response(session.summary(), mimetype='text/plain')
+    else:
+        return jsonify(success=False, error=f"Format '{fmt}' is not available for this session"), 404
+
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,183 @@
+# FILE: website/attachments.py
+
+import os
+import queue
+import threading
+
+from flask import current_app
+from sqlalchemy import event
+
+from . import db
+
+THUMBNAIL_SIZE = (320, 320)
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+TEXT_EXTENSIONS = {'txt'}
+PDF_EXTENSIONS = {'pdf'}
+
+# Cap on how much extracted text we keep per attachment (chars).
+MAX_EXTRACTED_CHARS = 200_000
+
+
+def upload_dir(app=None):
+    app = app or current_app
+    return app.config.get('UPLOAD_FOLDER') or os.path.join(app.root_path, '..', 'uploads')
+
+
+class AttachmentProcessor:
+    """Small thread pool that generates thumbnails and extracts text for NoteAttachment rows.
+
+    Jobs are keyed by attachment id and only queued once the row is committed,
+    so uploads never wait on Pillow or PDF parsing.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ATTACHMENT_WORKERS', 2)
+        app.config.setdefault('ATTACHMENT_MAX_RETRIES', 3)
+        app.config.setdefault('ATTACHMENT_RETRY_DELAY', 2.0)
+        # Run jobs inline (tests / one-off scripts) instead of on worker threads.
+        app.config.setdefault('ATTACHMENT_PROCESS_INLINE', False)
+        self.app = app
+        app.extensions['attachment_processor'] = self
+
+    # ---------- queueing ----------
+
+    def schedule(self, attachment_id):
+        """Queue an attachment to be processed after the current transaction commits."""
+        pending = db.session.info.setdefault('pending_attachment_jobs', [])
+        pending.append(attachment_id)
+
+    def enqueue(self, attachment_id, attempt=1):
+        app = self.app or current_app._get_current_object()
+        if app.config.get('ATTACHMENT_PROCESS_INLINE'):
+            self._run(app, attachment_id, attempt)
+            return
+        self._ensure_workers(app)
+        self._queue.put((app, attachment_id, attempt))
+
+    def _ensure_workers(self, app):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), app.config['ATTACHMENT_WORKERS']):
+                t = threading.Thread(target=self._worker, name=f'attachment-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            app, attachment_id, attempt = self._queue.get()
+            try:
+                self._run(app, attachment_id, attempt)
+            finally:
+                self._queue.task_done()
+
+    def _retry_later(self, app, attachment_id, attempt):
+        delay = app.config['ATTACHMENT_RETRY_DELAY'] * (2 ** (attempt - 1))
+        timer = threading.Timer(delay, self.enqueue, args=(attachment_id, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    # ---------- processing ----------
+
+    def _run(self, app, attachment_id, attempt):
+        from .models import NoteAttachment
+
+        with app.app_context():
+            att = db.session.get(NoteAttachment, attachment_id)
+            if att is None:
+                db.session.remove()
+                return
+            try:
+                process_attachment(att, upload_dir(app))
+                att.processing_status = 'done'
+                att.processing_error = None
+            except Exception as exc:
+                db.session.rollback()
+                att = db.session.get(NoteAttachment, attachment_id)
+                att.processing_error = str(exc)[:255]
+                if attempt < app.config['ATTACHMENT_MAX_RETRIES'] and not app.config.get('ATTACHMENT_PROCESS_INLINE'):
+                    att.processing_status = 'retrying'
+                    self._retry_later(app, attachment_id, attempt)
+                else:
+                    att.processing_status = 'failed'
+                    app.logger.warning('Attachment %s failed after %s attempts: %s', attachment_id, attempt, exc)
+            att.processing_attempts = attempt
+            db.session.commit()
+            db.session.remove()
+
+    def join(self):
+        """Block until every queued job has been picked up and finished."""
+        self._queue.join()
+
+
+def process_attachment(att, folder):
+    """Generate a thumbnail and/or extract text for a single attachment."""
+    ext = att.filename.rsplit('.', 1)[-1].lower() if '.' in att.filename else ''
+    src = os.path.join(folder, att.filepath)
+
+    if ext in IMAGE_EXTENSIONS:
+        att.thumbnail_path = make_thumbnail(src, folder, att.filepath)
+    elif ext in TEXT_EXTENSIONS:
+        att.extracted_text = extract_txt(src)
+    elif ext in PDF_EXTENSIONS:
+        att.extracted_text = extract_pdf(src)
+
+
+def make_thumbnail(src, folder, filepath):
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    thumb_dir = os.path.join(folder, 'thumbnails')
+    os.makedirs(thumb_dir, exist_ok=True)
+    thumb_name = os.path.splitext(filepath)[0] + '.png'
+    with Image.open(src) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        img.save(os.path.join(thumb_dir, thumb_name), 'PNG')
+    return f'thumbnails/{thumb_name}'
+
+
+def extract_txt(src):
+    with open(src, 'rb') as fh:
+        raw = fh.read(MAX_EXTRACTED_CHARS * 4)
+    return raw.decode('utf-8', errors='replace')[:MAX_EXTRACTED_CHARS]
+
+
+def extract_pdf(src):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+
+    reader = PdfReader(src)
+    parts, total = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        total += len(text)
+        if total >= MAX_EXTRACTED_CHARS:
+            break
+    return '\n'.join(parts)[:MAX_EXTRACTED_CHARS]
+
+
+attachment_processor = AttachmentProcessor()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _enqueue_committed_attachments(session):
+    jobs = session.info.pop('pending_attachment_jobs', None)
+    for attachment_id in jobs or ():
+        attachment_processor.enqueue(attachment_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_rolled_back_attachments(session):
+    session.info.pop('pending_attachment_jobs', None)
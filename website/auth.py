@@ -1,12 +1,20 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User, Note, Tag
 from . import db
+from .passwords import password_hasher, HashPoolBusy
+from .login_guard import login_guard
+import math
 import uuid
 
 auth = Blueprint('auth', __name__)
 
+
+def _hash_pool_busy(template):
+    flash('Too many sign-ins right now, please try again in a moment.', category='error')
+    return render_template(template), 503, {'Retry-After': '2'}
+
+
 # -------------------- SIGNUP --------------------
 @auth.route('/signup', methods=['GET', 'POST'])
 def signup():
@@ -25,10 +33,14 @@ def signup():
         elif len(password1) < 6:
             flash('Password must be at least 6 characters.', category='error')
         else:
+            try:
+                hashed = password_hasher.hash(password1)
+            except HashPoolBusy:
+                return _hash_pool_busy('signup.html')
             new_user = User(
                 email=email,
                 first_name=first_name,
-                password=generate_password_hash(password1, method='sha256'),
+                password=hashed,
                 role=role,
                 is_admin=(role=='admin')
             )
@@ -46,10 +58,27 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
 
+        # Before the lookup and the hash: throttled attempts must stay cheap
+        wait = login_guard.check(request.remote_addr, email)
+        if wait > 0:
+            seconds = math.ceil(wait)
+            flash(f'Too many failed sign-in attempts. Try again in {seconds} seconds.', category='error')
+            return render_template('login.html'), 429, {'Retry-After': str(seconds)}
+
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password, password)
+            if valid and password_hasher.needs_rehash(user.password):
+                # Upgrade to the current method/work factor while we have the plain password
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+        except HashPoolBusy:
+            return _hash_pool_busy('login.html')
+        if not valid:
+            login_guard.failed(request.remote_addr, email)
             flash('Invalid email or password', category='error')
         else:
+            login_guard.succeeded(email)
             login_user(user)
             return redirect(url_for('views.home'))
 
@@ -0,0 +1,223 @@
+# FILE: website/autosave.py
+"""Write-behind buffer for editor autosaves.
+
+Clients post Quill deltas as they type; the buffer composes them in memory and
+writes each note to the database at most once every AUTOSAVE_INTERVAL seconds.
+The buffer is bounded: once AUTOSAVE_MAX_PENDING notes are held, the oldest
+clean entries are dropped and the oldest dirty ones are written synchronously
+(and dropped once clean) before a new one is admitted. Entries in the middle
+of a flush are never evicted, so the bound is soft while flushes run.
+
+Flushes snapshot an entry under the lock and write it after releasing it, so
+a slow commit never blocks other submits. Notes that have a live collab
+document are not written: the op log owns their content, and the buffered
+state is dropped (the client's next autosave gets a 409 and resyncs).
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+from . import db
+from . import delta as ot
+
+
+class AutosaveConflict(Exception):
+    """The client's delta was made against a different version than the buffer holds."""
+
+
+class _Entry:
+    __slots__ = ('note_id', 'content', 'seq', 'dirty', 'flushing', 'last_flush')
+
+    def __init__(self, note_id, content):
+        self.note_id = note_id
+        self.content = content
+        self.seq = 0
+        self.dirty = False
+        self.flushing = False
+        self.last_flush = 0.0
+
+
+class AutosaveBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOSAVE_INTERVAL', 5.0)
+        app.config.setdefault('AUTOSAVE_MAX_PENDING', 1000)
+        self.app = app
+        with self._lock:
+            self._entries.clear()
+        app.extensions['autosave'] = self
+        if not self._atexit_registered:
+            atexit.register(self.flush_all)
+            self._atexit_registered = True
+
+    # ---------- client side ----------
+
+    def submit(self, note, seq, ops, full, length):
+        """Apply a delta (or a full document when `full`) and return the new sequence number."""
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(note.id)
+            if entry is None:
+                evicted = self._make_room()
+                entry = self._entries[note.id] = _Entry(note.id, ot.html_to_delta(note.content))
+            else:
+                self._entries.move_to_end(note.id)
+
+            if full:
+                if any('insert' not in op for op in ops):
+                    raise AutosaveConflict('full save must be a document')
+                content = ops
+            else:
+                if seq != entry.seq or ot.base_length(ops) > ot.doc_length(entry.content):
+                    raise AutosaveConflict('stale sequence')
+                content = ot.compose(entry.content, ops)
+            if length is not None and ot.doc_length(content) != length:
+                raise AutosaveConflict('length mismatch')
+
+            entry.content = content
+            entry.seq += 1
+            entry.dirty = True
+            new_seq = entry.seq
+            due = time.monotonic() - entry.last_flush >= self.app.config['AUTOSAVE_INTERVAL']
+
+        # The edit is buffered either way: a failed write leaves the entry dirty for the
+        # flusher to retry rather than failing this request
+        for snapshot in evicted:
+            try:
+                self._write(*snapshot)
+            except Exception:
+                self.app.logger.exception('Autosave eviction flush failed for note %s', snapshot[0].note_id)
+                continue
+            self._forget_if_clean(snapshot[0])
+        if due:
+            try:
+                self.flush(note.id)
+            except Exception:
+                self.app.logger.exception('Autosave flush failed for note %s', note.id)
+        self._ensure_flusher()
+        return new_seq
+
+    def discard(self, note_id):
+        """Forget buffered state, e.g. after the edit form saved the note."""
+        with self._lock:
+            self._entries.pop(note_id, None)
+
+    # ---------- flushing ----------
+
+    def _make_room(self):
+        # Called with the lock held. Drops the oldest clean entries and returns snapshots of
+        # the oldest dirty ones, to write after releasing the lock; those stay buffered until
+        # they are clean, so edits that arrive meanwhile are not lost.
+        excess = len(self._entries) - self.app.config['AUTOSAVE_MAX_PENDING'] + 1
+        snapshots = []
+        for note_id, entry in list(self._entries.items()):
+            if excess <= 0:
+                break
+            if entry.flushing:
+                continue
+            if entry.dirty:
+                snapshots.append(self._take(entry))
+            else:
+                del self._entries[note_id]
+            excess -= 1
+        return snapshots
+
+    def _forget_if_clean(self, entry):
+        with self._lock:
+            if self._entries.get(entry.note_id) is entry and not entry.dirty and not entry.flushing:
+                del self._entries[entry.note_id]
+
+    def _take(self, entry):
+        # Called with the lock held
+        if not entry.dirty or entry.flushing:
+            return None
+        entry.flushing = True
+        return entry, entry.content, entry.seq
+
+    def _write(self, entry, content, seq):
+        """Persist a snapshot from _take(); runs without the lock held."""
+        from .models import Note
+        from . import history, collab
+
+        live = False
+        try:
+            note = db.session.get(Note, entry.note_id)
+            if note is not None:
+                live = collab.has_document(note.id)
+                if not live:
+                    note.content = ot.delta_to_html(content)
+                    history.record_version(note)
+                    collab.mark_saved(note)
+                    db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                entry.flushing = False
+            raise
+        with self._lock:
+            entry.flushing = False
+            if live:
+                if self._entries.get(entry.note_id) is entry:
+                    del self._entries[entry.note_id]
+                entry.dirty = False
+            elif entry.seq == seq:
+                entry.dirty = False
+            entry.last_flush = time.monotonic()
+
+    def flush(self, note_id):
+        with self._lock:
+            entry = self._entries.get(note_id)
+            snapshot = self._take(entry) if entry is not None else None
+        if snapshot is not None:
+            self._write(*snapshot)
+
+    def flush_due(self):
+        interval = self.app.config['AUTOSAVE_INTERVAL']
+        now = time.monotonic()
+        with self._lock:
+            due = [e for e in self._entries.values() if e.dirty and now - e.last_flush >= interval]
+            snapshots = [s for s in map(self._take, due) if s is not None]
+            # Idle, clean entries don't need to hold memory
+            for note_id in [k for k, e in self._entries.items() if not e.dirty and now - e.last_flush > 10 * interval]:
+                del self._entries[note_id]
+        for snapshot in snapshots:
+            self._write(*snapshot)
+        return len(snapshots)
+
+    def flush_all(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            with self._lock:
+                snapshots = [s for s in map(self._take, list(self._entries.values())) if s is not None]
+            for snapshot in snapshots:
+                self._write(*snapshot)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='autosave-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(1.0)
+            try:
+                with self.app.app_context():
+                    self.flush_due()
+                    db.session.remove()
+            except Exception:
+                self.app.logger.exception('Autosave flush failed')
+
+
+autosave_buffer = AutosaveBuffer()
@@ -0,0 +1,253 @@
+# FILE: website/collab.py
+"""Collaborative note editing over Socket.IO.
+
+The server is the single authority for each note being edited: clients send
+Quill deltas tagged with the revision they were made against, the server
+transforms them over anything that landed in between, appends the result to
+the NoteOp log and broadcasts only that delta to the other editors.
+Note.content is refreshed from the in-memory document every
+COLLAB_SNAPSHOT_INTERVAL ops and when the last editor leaves.
+
+The in-memory document is only advanced once its op has committed. The
+unique (note_id, rev) constraint on NoteOp is what keeps it honest: if
+another writer (e.g. a second serve.py worker, which has its own
+_documents) already took that revision, the commit fails, the stale copy
+is dropped and the editors on this worker resync from the database.
+Editors of one note spread over several workers therefore keep
+resyncing; collaborative editing expects every editor of a note on one
+worker (a single worker, or sticky routing by note).
+"""
+
+import json
+import threading
+from collections import deque
+
+from flask import current_app, request
+from sqlalchemy.exc import SQLAlchemyError
+from flask_login import current_user
+from flask_socketio import join_room, leave_room, emit
+
+from . import db, socketio
+from . import delta as ot
+from . import history
+from .models import Note, NoteOp
+from .rate_limit import rate_limiter
+
+# Ops kept in memory per note for transforming late submissions
+RECENT_OPS = 200
+MAX_OP_CHARS = 100_000
+
+
+class CollabDocument:
+    def __init__(self, note_id, content, rev, snapshot_rev):
+        self.note_id = note_id
+        self.content = content
+        self.rev = rev
+        self.snapshot_rev = snapshot_rev
+        self.recent = deque(maxlen=RECENT_OPS)   # (rev, ops)
+        self.editors = set()                      # socket ids
+        self.lock = threading.Lock()
+
+    def ops_since(self, rev):
+        """Ops with revision > rev, oldest first, or None if they are no longer available."""
+        if rev == self.rev:
+            return []
+        if self.recent and self.recent[0][0] <= rev + 1:
+            return [ops for r, ops in self.recent if r > rev]
+        rows = NoteOp.query.filter(NoteOp.note_id == self.note_id, NoteOp.rev > rev)\
+            .order_by(NoteOp.rev.asc()).all()
+        if len(rows) != self.rev - rev:
+            return None
+        return [json.loads(row.delta) for row in rows]
+
+
+_documents = {}
+_documents_lock = threading.Lock()
+_sid_notes = {}
+
+
+def room_name(note_id):
+    return f"note_{note_id}"
+
+
+def _load(note):
+    content = ot.html_to_delta(note.content)
+    snapshot_rev = note.collab_rev or 0
+    rows = NoteOp.query.filter(NoteOp.note_id == note.id, NoteOp.rev > snapshot_rev)\
+        .order_by(NoteOp.rev.asc()).all()
+    doc = CollabDocument(note.id, content, snapshot_rev, snapshot_rev)
+    for row in rows:
+        ops = json.loads(row.delta)
+        doc.content = ot.compose(doc.content, ops)
+        doc.rev = row.rev
+        doc.recent.append((row.rev, ops))
+    return doc
+
+
+def get_document(note):
+    with _documents_lock:
+        doc = _documents.get(note.id)
+        if doc is None:
+            doc = _documents[note.id] = _load(note)
+        return doc
+
+
+def reset_document(note):
+    """Fold a whole-document save (the edit form) into the op log.
+
+    Called with the note's new content already set; live editors are told to
+    reload so they continue from the saved version.
+    """
+    with _documents_lock:
+        doc = _documents.pop(note.id, None)
+    mark_saved(note)
+    if doc is not None and doc.editors:
+        socketio.emit('collab_reset', {'note_id': note.id}, to=room_name(note.id))
+
+
+def has_document(note_id):
+    """True while this process holds a live document for the note."""
+    with _documents_lock:
+        return note_id in _documents
+
+
+def mark_saved(note):
+    """Make Note.content the snapshot of every logged op (after a whole-document save)."""
+    latest = db.session.query(db.func.max(NoteOp.rev)).filter(NoteOp.note_id == note.id).scalar() or 0
+    note.collab_rev = latest
+
+
+def _snapshot(note, content, rev):
+    """Fold the document at `rev` into Note.content (caller commits)."""
+    note.content = ot.delta_to_html(content)
+    note.collab_rev = rev
+    history.record_version(note)
+
+
+def _discard(doc):
+    """Forget a document whose state no longer matches the op log; its editors reload."""
+    with _documents_lock:
+        if _documents.get(doc.note_id) is doc:
+            del _documents[doc.note_id]
+    socketio.emit('collab_reset', {'note_id': doc.note_id}, to=room_name(doc.note_id))
+
+
+def _can_view(note):
+    return note.user_id == current_user.id or note.is_public
+
+
+def _can_edit(note):
+    return note.user_id == current_user.id
+
+
+# --------- Socket.IO events ---------
+
+@socketio.on('collab_join')
+@rate_limiter.limit_event
+def collab_join(data):
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Login required'}
+    note = db.session.get(Note, (data or {}).get('note_id'))
+    if not note or not _can_view(note):
+        return {'success': False, 'error': 'Not allowed'}
+
+    doc = get_document(note)
+    with doc.lock:
+        doc.editors.add(request.sid)
+        _sid_notes.setdefault(request.sid, set()).add(note.id)
+        join_room(room_name(note.id))
+        return {'success': True, 'rev': doc.rev, 'content': doc.content, 'can_edit': _can_edit(note)}
+
+
+@socketio.on('collab_submit')
+@rate_limiter.limit_event
+def collab_submit(data):
+    data = data or {}
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Login required'}
+    note = db.session.get(Note, data.get('note_id'))
+    if not note or not _can_edit(note):
+        return {'success': False, 'error': 'Not allowed'}
+
+    ops = ot.validate(data.get('ops'))
+    base_rev = data.get('rev')
+    if ops is None or not isinstance(base_rev, int) or len(json.dumps(ops)) > MAX_OP_CHARS:
+        return {'success': False, 'error': 'Malformed delta'}
+
+    doc = get_document(note)
+    with doc.lock:
+        if base_rev > doc.rev:
+            return {'success': False, 'error': 'Unknown revision', 'resync': True}
+        concurrent = doc.ops_since(base_rev)
+        if concurrent is None:
+            return {'success': False, 'error': 'Revision too old', 'resync': True}
+        for server_ops in concurrent:
+            ops = ot.transform(server_ops, ops, priority=True)
+        if ot.base_length(ops) > ot.doc_length(doc.content):
+            return {'success': False, 'error': 'Delta does not fit document', 'resync': True}
+
+        # Build the next state aside; `doc` only moves once the op is committed
+        note_id, user_id = note.id, current_user.id
+        content = ot.compose(doc.content, ops)
+        rev = doc.rev + 1
+        db.session.add(NoteOp(note_id=note_id, rev=rev, user_id=user_id,
+                              delta=json.dumps(ops, separators=(',', ':'))))
+        snapshot = rev - doc.snapshot_rev >= current_app.config.get('COLLAB_SNAPSHOT_INTERVAL', 50)
+        if snapshot:
+            _snapshot(note, content, rev)
+        try:
+            db.session.commit()
+        except SQLAlchemyError:
+            # Most likely uq_note_op_rev: someone else already wrote this revision
+            db.session.rollback()
+            _discard(doc)
+            return {'success': False, 'error': 'Document changed elsewhere', 'resync': True}
+
+        doc.content = content
+        doc.rev = rev
+        doc.recent.append((rev, ops))
+        if snapshot:
+            doc.snapshot_rev = rev
+
+        # Broadcast while holding the lock so every client sees ops in rev order
+        emit('collab_op', {'note_id': note_id, 'rev': rev, 'ops': ops, 'user_id': user_id},
+             to=room_name(note_id), include_self=False)
+        return {'success': True, 'rev': rev}
+
+
+def _leave(sid, note_id):
+    with _documents_lock:
+        doc = _documents.get(note_id)
+    if doc is None:
+        return
+    with doc.lock:
+        doc.editors.discard(sid)
+        if doc.editors:
+            return
+        if doc.rev != doc.snapshot_rev:
+            note = db.session.get(Note, note_id)
+            if note is not None:
+                _snapshot(note, doc.content, doc.rev)
+                try:
+                    db.session.commit()
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    current_app.logger.warning('Could not snapshot note %s on leave', note_id, exc_info=True)
+        with _documents_lock:
+            if _documents.get(note_id) is doc:
+                del _documents[note_id]
+
+
+@socketio.on('collab_leave')
+def collab_leave(data):
+    note_id = (data or {}).get('note_id')
+    if note_id in _sid_notes.get(request.sid, ()):
+        _sid_notes[request.sid].discard(note_id)
+        leave_room(room_name(note_id))
+        _leave(request.sid, note_id)
+
+
+@socketio.on('disconnect')
+def collab_disconnect():
+    for note_id in _sid_notes.pop(request.sid, set()):
+        _leave(request.sid, note_id)
@@ -0,0 +1,392 @@
+# FILE: website/delta.py
+"""Server-side Quill Delta operations.
+
+A small port of the quill-delta compose/transform algorithms so the server can
+be the authority for collaborative edits. Lengths are counted in UTF-16 code
+units to match JavaScript strings on the client.
+"""
+
+import html
+from html.parser import HTMLParser
+
+INF = float('inf')
+
+
+# ---------- UTF-16 helpers ----------
+
+def u16len(text):
+    return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+def u16slice(text, start, end=None):
+    raw = text.encode('utf-16-le', 'surrogatepass')
+    end = len(raw) if end is None else end * 2
+    return raw[start * 2:end].decode('utf-16-le', 'surrogatepass')
+
+
+def _join(a, b):
+    # Re-pair surrogates that an edit may have split across two inserts
+    return (a + b).encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'surrogatepass')
+
+
+def op_length(op):
+    if 'delete' in op:
+        return op['delete']
+    if 'retain' in op:
+        return op['retain']
+    return u16len(op['insert']) if isinstance(op['insert'], str) else 1
+
+
+def doc_length(ops):
+    return sum(op_length(op) for op in ops if 'insert' in op)
+
+
+def base_length(ops):
+    """Length of the document an op list can be applied to (at minimum)."""
+    return sum(op_length(op) for op in ops if 'insert' not in op)
+
+
+# ---------- building ----------
+
+def _push(ops, new):
+    if not new:
+        return
+    if new.get('attributes') == {}:
+        new = {k: v for k, v in new.items() if k != 'attributes'}
+    if op_length(new) == 0:
+        return
+
+    index = len(ops)
+    if ops:
+        last = ops[-1]
+        if 'delete' in new and 'delete' in last:
+            last['delete'] += new['delete']
+            return
+        # Inserts always go before a trailing delete
+        if 'delete' in last and 'insert' in new:
+            index -= 1
+            if index == 0:
+                ops.insert(0, dict(new))
+                return
+            last = ops[index - 1]
+        if new.get('attributes') == last.get('attributes'):
+            if isinstance(new.get('insert'), str) and isinstance(last.get('insert'), str):
+                last['insert'] = _join(last['insert'], new['insert'])
+                return
+            if 'retain' in new and 'retain' in last:
+                last['retain'] += new['retain']
+                return
+    ops.insert(index, dict(new))
+
+
+def _chop(ops):
+    if ops and 'retain' in ops[-1] and not ops[-1].get('attributes'):
+        ops.pop()
+    return ops
+
+
+def normalize(ops):
+    out = []
+    for op in ops:
+        _push(out, op)
+    return out
+
+
+class _OpIterator:
+    def __init__(self, ops):
+        self.ops = ops
+        self.index = 0
+        self.offset = 0
+
+    def peek(self):
+        return self.ops[self.index] if self.index < len(self.ops) else None
+
+    def peek_length(self):
+        op = self.peek()
+        return op_length(op) - self.offset if op else INF
+
+    def peek_type(self):
+        op = self.peek()
+        if op is None:
+            return 'retain'
+        if 'delete' in op:
+            return 'delete'
+        if 'retain' in op:
+            return 'retain'
+        return 'insert'
+
+    def has_next(self):
+        return self.peek_length() < INF
+
+    def next(self, length=INF):
+        op = self.peek()
+        if op is None:
+            return {'retain': INF}
+        offset = self.offset
+        op_len = op_length(op)
+        if length >= op_len - offset:
+            length = op_len - offset
+            self.index += 1
+            self.offset = 0
+        else:
+            self.offset += length
+
+        if 'delete' in op:
+            return {'delete': length}
+        result = {}
+        if 'retain' in op:
+            result['retain'] = length
+        elif isinstance(op['insert'], str):
+            result['insert'] = u16slice(op['insert'], offset, offset + length)
+        else:
+            result['insert'] = op['insert']
+        if op.get('attributes'):
+            result['attributes'] = op['attributes']
+        return result
+
+
+# ---------- attributes ----------
+
+def _compose_attributes(a, b, keep_null):
+    a, b = a or {}, b or {}
+    attrs = dict(b) if keep_null else {k: v for k, v in b.items() if v is not None}
+    for key, value in a.items():
+        if value is not None and key not in b:
+            attrs[key] = value
+    return attrs or None
+
+
+def _transform_attributes(a, b, priority):
+    if not a:
+        return b
+    if not b:
+        return None
+    if not priority:
+        return b
+    return {k: v for k, v in b.items() if k not in a} or None
+
+
+# ---------- compose / transform ----------
+
+def compose(a, b):
+    """Return the single delta equivalent to applying `a` then `b`."""
+    a_iter, b_iter = _OpIterator(a), _OpIterator(b)
+    out = []
+    while a_iter.has_next() or b_iter.has_next():
+        if b_iter.peek_type() == 'insert':
+            _push(out, b_iter.next())
+        elif a_iter.peek_type() == 'delete':
+            _push(out, a_iter.next())
+        else:
+            length = min(a_iter.peek_length(), b_iter.peek_length())
+            a_op, b_op = a_iter.next(length), b_iter.next(length)
+            if 'retain' in b_op:
+                new = {'retain': length} if 'retain' in a_op else {'insert': a_op['insert']}
+                attrs = _compose_attributes(a_op.get('attributes'), b_op.get('attributes'), 'retain' in a_op)
+                if attrs:
+                    new['attributes'] = attrs
+                _push(out, new)
+            elif 'delete' in b_op and 'retain' in a_op:
+                _push(out, b_op)
+            # insert followed by delete cancels out
+    return _chop(out)
+
+
+def transform(a, b, priority=False):
+    """Transform `b` so it applies after `a`; `priority` means `a` happened first."""
+    a_iter, b_iter = _OpIterator(a), _OpIterator(b)
+    out = []
+    while a_iter.has_next() or b_iter.has_next():
+        if a_iter.peek_type() == 'insert' and (priority or b_iter.peek_type() != 'insert'):
+            _push(out, {'retain': op_length(a_iter.next())})
+        elif b_iter.peek_type() == 'insert':
+            _push(out, b_iter.next())
+        else:
+            length = min(a_iter.peek_length(), b_iter.peek_length())
+            a_op, b_op = a_iter.next(length), b_iter.next(length)
+            if 'delete' in a_op:
+                continue
+            if 'delete' in b_op:
+                _push(out, b_op)
+            else:
+                new = {'retain': length}
+                attrs = _transform_attributes(a_op.get('attributes'), b_op.get('attributes'), priority)
+                if attrs:
+                    new['attributes'] = attrs
+                _push(out, new)
+    return _chop(out)
+
+
+def validate(ops):
+    """Return a normalized copy of client-supplied ops, or None if malformed."""
+    if not isinstance(ops, list):
+        return None
+    clean = []
+    for op in ops:
+        if not isinstance(op, dict):
+            return None
+        attrs = op.get('attributes')
+        if attrs is not None and not isinstance(attrs, dict):
+            return None
+        if 'insert' in op:
+            if not isinstance(op['insert'], (str, dict)):
+                return None
+            new = {'insert': op['insert']}
+        elif isinstance(op.get('retain'), int) and op['retain'] > 0:
+            new = {'retain': op['retain']}
+        elif isinstance(op.get('delete'), int) and op['delete'] > 0:
+            new = {'delete': op['delete']}
+        else:
+            return None
+        if attrs and 'delete' not in new:
+            new['attributes'] = attrs
+        clean.append(new)
+    return normalize(clean)
+
+
+# ---------- HTML <-> Delta (the formats our Quill toolbars produce) ----------
+
+_INLINE_TAGS = {
+    'strong': 'bold', 'b': 'bold',
+    'em': 'italic', 'i': 'italic',
+    'u': 'underline',
+    's': 'strike',
+}
+_BLOCK_TAGS = {'p', 'div', 'li', 'h1', 'h2', 'h3', 'blockquote', 'pre'}
+
+
+class _QuillHTMLParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.ops = []
+        self.inline = []      # stack of (tag, attr-name, value)
+        self.lists = []       # stack of 'ordered' / 'bullet'
+        self.block = None
+        self.pending_text = False
+
+    def _attrs(self):
+        attrs = {}
+        for _, name, value in self.inline:
+            attrs[name] = value
+        return attrs
+
+    def _newline(self, block_attrs=None):
+        op = {'insert': '\n'}
+        if block_attrs:
+            op['attributes'] = block_attrs
+        _push(self.ops, op)
+        self.pending_text = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ('ol', 'ul'):
+            if self.pending_text:
+                self._newline()
+            self.lists.append('ordered' if tag == 'ol' else 'bullet')
+        elif tag in _BLOCK_TAGS:
+            if self.pending_text:
+                self._newline()
+            self.block = tag
+        elif tag in _INLINE_TAGS:
+            self.inline.append((tag, _INLINE_TAGS[tag], True))
+        elif tag == 'a':
+            self.inline.append((tag, 'link', attrs.get('href') or ''))
+        elif tag == 'br' and self.block is None:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in ('ol', 'ul'):
+            if self.lists:
+                self.lists.pop()
+        elif tag in _BLOCK_TAGS:
+            block_attrs = {}
+            if tag == 'li' and self.lists:
+                block_attrs['list'] = self.lists[-1]
+            elif tag in ('h1', 'h2', 'h3'):
+                block_attrs['header'] = int(tag[1])
+            elif tag in ('blockquote', 'pre'):
+                block_attrs['blockquote' if tag == 'blockquote' else 'code-block'] = True
+            self._newline(block_attrs)
+            self.block = None
+        else:
+            for i in range(len(self.inline) - 1, -1, -1):
+                if self.inline[i][0] == tag:
+                    del self.inline[i]
+                    break
+
+    def handle_data(self, data):
+        if self.block is None and not data.strip():
+            return
+        op = {'insert': data}
+        attrs = self._attrs()
+        if attrs:
+            op['attributes'] = attrs
+        _push(self.ops, op)
+        self.pending_text = True
+
+
+def html_to_delta(source):
+    parser = _QuillHTMLParser()
+    parser.feed(source or '')
+    parser.close()
+    if parser.pending_text or not parser.ops:
+        parser._newline()
+    return parser.ops
+
+
+def _render_inline(text, attrs):
+    out = html.escape(text, quote=False)
+    if attrs.get('bold'):
+        out = f'<strong>{out}</strong>'
+    if attrs.get('italic'):
+        out = f'<em>{out}</em>'
+    if attrs.get('underline'):
+        out = f'<u>{out}</u>'
+    if attrs.get('strike'):
+        out = f'<s>{out}</s>'
+    if attrs.get('link'):
+        out = f'<a href="{html.escape(str(attrs["link"]))}" target="_blank">{out}</a>'
+    return out
+
+
+def delta_to_html(ops):
+    """Render a document delta the way Quill's root.innerHTML would look."""
+    lines, current = [], []
+    for op in ops:
+        insert = op.get('insert')
+        attrs = op.get('attributes') or {}
+        if not isinstance(insert, str):
+            continue
+        parts = insert.split('\n')
+        for i, part in enumerate(parts):
+            if part:
+                current.append(_render_inline(part, attrs))
+            if i < len(parts) - 1:
+                lines.append((''.join(current) or '<br>', attrs))
+                current = []
+    if current:
+        lines.append((''.join(current), {}))
+
+    out, open_list = [], None
+    for inner, attrs in lines:
+        list_type = attrs.get('list')
+        if list_type != open_list:
+            if open_list:
+                out.append('</ol>' if open_list == 'ordered' else '</ul>')
+            if list_type:
+                out.append('<ol>' if list_type == 'ordered' else '<ul>')
+            open_list = list_type
+        if list_type:
+            out.append(f'<li>{inner}</li>')
+        elif attrs.get('header'):
+            level = int(attrs['header'])
+            out.append(f'<h{level}>{inner}</h{level}>')
+        elif attrs.get('blockquote'):
+            out.append(f'<blockquote>{inner}</blockquote>')
+        elif attrs.get('code-block'):
+            out.append(f'<pre>{inner}</pre>')
+        else:
+            out.append(f'<p>{inner}</p>')
+    if open_list:
+        out.append('</ol>' if open_list == 'ordered' else '</ul>')
+    return ''.join(out)
@@ -0,0 +1,249 @@
+# FILE: website/history.py
+
+import difflib
+import json
+import re
+import zlib
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import NoteHistory
+
+# Diff on tags / words / whitespace runs rather than characters: Quill HTML is
+# usually a single long line, and character-level SequenceMatcher is quadratic.
+# The trailing `<` alternative catches an unclosed tag: every character must
+# land in some token, or the rebuilt version silently loses it.
+_TOKEN_RE = re.compile(r'<[^>]*>|\s+|[^<\s]+|<')
+
+VERSION_RETRIES = 3
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text or '')
+
+
+def make_delta(old, new):
+    """Encode `new` as a list of ops against `old`.
+
+    Ops are [n] (copy n chars), [-n] (skip n chars) and "text" (insert).
+    """
+    a, b = _tokens(old), _tokens(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append([sum(len(t) for t in a[i1:i2])])
+            continue
+        if i2 > i1:
+            ops.append([-sum(len(t) for t in a[i1:i2])])
+        if j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(old, ops):
+    old = old or ''
+    out, pos = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op[0] >= 0:
+            out.append(old[pos:pos + op[0]])
+            pos += op[0]
+        else:
+            pos -= op[0]
+    return ''.join(out)
+
+
+# ---------- row encoding ----------
+
+def _store(row, payload):
+    """Put `payload` on the row, zlib-compressing it when enabled and worthwhile."""
+    row.content_snapshot = payload
+    row.compressed_blob = None
+    if current_app.config.get('NOTE_HISTORY_COMPRESS', False):
+        blob = zlib.compress(payload.encode('utf-8'), 6)
+        if len(blob) < len(payload):
+            row.content_snapshot = None
+            row.compressed_blob = blob
+
+
+def _payload(row):
+    if row.compressed_blob is not None:
+        return zlib.decompress(row.compressed_blob).decode('utf-8')
+    return row.content_snapshot or ''
+
+
+def _content_from(row, previous):
+    payload = _payload(row)
+    if row.is_keyframe:
+        return payload
+    return apply_delta(previous, json.loads(payload))
+
+
+def _encode(row, content, previous, since_keyframe):
+    interval = current_app.config.get('NOTE_HISTORY_KEYFRAME_INTERVAL', 20)
+    if previous is None or since_keyframe + 1 >= interval:
+        row.is_keyframe = True
+        _store(row, content or '')
+        return
+    delta = json.dumps(make_delta(previous, content), separators=(',', ':'))
+    # A diff bigger than the document itself is worse than a keyframe
+    if len(delta) >= len(content or ''):
+        row.is_keyframe = True
+        _store(row, content or '')
+    else:
+        row.is_keyframe = False
+        _store(row, delta)
+
+
+# ---------- public API ----------
+
+def _rows(note_id):
+    return NoteHistory.query.filter_by(note_id=note_id).order_by(NoteHistory.version.asc())
+
+
+def _last_row(note_id):
+    return _rows(note_id).order_by(None).order_by(NoteHistory.version.desc()).first()
+
+
+def record_version(note, previous_content=None):
+    """Append the note's current content as a new history version.
+
+    `previous_content` seeds a keyframe for notes that predate versioning.
+    Caller is responsible for committing. Two saves of one note can race for
+    the next version number; the loser's insert hits the unique
+    (note_id, version) index inside a savepoint and is retried on top of the
+    winner's version.
+    """
+    # Flush the caller's changes first: rolling back the savepoint would expire them
+    db.session.flush()
+    for attempt in range(VERSION_RETRIES):
+        try:
+            with db.session.begin_nested():
+                return _append_version(note, previous_content)
+        except IntegrityError:
+            if attempt == VERSION_RETRIES - 1:
+                raise
+
+
+def _append_version(note, previous_content):
+    last = _last_row(note.id)
+    if last is None:
+        if previous_content is not None and previous_content != note.content:
+            base = NoteHistory(note_id=note.id, version=1)
+            _encode(base, previous_content, None, 0)
+            db.session.add(base)
+            last_version, previous, since_keyframe = 1, previous_content, 0
+        else:
+            last_version, previous, since_keyframe = 0, None, 0
+    else:
+        last_version = last.version
+        previous = get_version_content(note.id, last.version)
+        if previous == note.content:
+            return last
+        since_keyframe = last.version - (
+            db.session.query(db.func.max(NoteHistory.version))
+            .filter(NoteHistory.note_id == note.id, NoteHistory.is_keyframe.is_(True))
+            .scalar() or 0
+        )
+
+    row = NoteHistory(note_id=note.id, version=last_version + 1)
+    _encode(row, note.content, previous, since_keyframe)
+    db.session.add(row)
+    db.session.flush()
+    return row
+
+
+def get_version_content(note_id, version):
+    """Rebuild the content of `version` from the nearest keyframe at or before it."""
+    keyframe_version = (
+        db.session.query(db.func.max(NoteHistory.version))
+        .filter(
+            NoteHistory.note_id == note_id,
+            NoteHistory.is_keyframe.is_(True),
+            NoteHistory.version <= version
+        )
+        .scalar()
+    )
+    if keyframe_version is None:
+        return None
+
+    rows = _rows(note_id).filter(
+        NoteHistory.version >= keyframe_version,
+        NoteHistory.version <= version
+    ).all()
+    if not rows or rows[-1].version != version:
+        return None
+
+    content = None
+    for row in rows:
+        content = _content_from(row, content)
+    return content
+
+
+def list_versions(note_id):
+    return [
+        {
+            'version': row.version,
+            'timestamp': row.timestamp.strftime('%Y-%m-%d %H:%M') if row.timestamp else None,
+            'keyframe': bool(row.is_keyframe),
+        }
+        for row in _rows(note_id).all()
+    ]
+
+
+def compact_history(note_id, keep_recent=50, keep_every=10):
+    """Thin out old versions of a note.
+
+    The newest `keep_recent` versions are untouched; older ones are kept only
+    when their version number is a multiple of `keep_every` (version 1 is
+    always kept). Surviving rows are re-encoded against their new predecessor.
+    Returns the number of rows removed. Caller commits.
+    """
+    rows = _rows(note_id).all()
+    if len(rows) <= keep_recent:
+        return 0
+
+    contents, content = [], None
+    for row in rows:
+        content = _content_from(row, content)
+        contents.append(content)
+
+    cutoff = len(rows) - keep_recent
+    removed, previous, since_keyframe = 0, None, 0
+    for idx, (row, text) in enumerate(zip(rows, contents)):
+        if idx < cutoff and row.version != 1 and row.version % keep_every:
+            db.session.delete(row)
+            removed += 1
+            continue
+        _encode(row, text, previous, since_keyframe)
+        since_keyframe = 0 if row.is_keyframe else since_keyframe + 1
+        previous = text
+    return removed
+
+
+def compact_all_history(keep_recent=50, keep_every=10):
+    note_ids = [
+        nid for (nid,) in db.session.query(NoteHistory.note_id)
+        .group_by(NoteHistory.note_id)
+        .having(db.func.count(NoteHistory.id) > keep_recent)
+    ]
+    removed = 0
+    for note_id in note_ids:
+        removed += compact_history(note_id, keep_recent, keep_every)
+        db.session.commit()
+    return removed
+
+
+@click.command('compact-history')
+@click.option('--keep-recent', default=50, show_default=True, help='Newest versions per note left untouched.')
+@click.option('--keep-every', default=10, show_default=True, help='Keep every Nth older version.')
+@with_appcontext
+def compact_history_command(keep_recent, keep_every):
+    """Thin out old NoteHistory versions."""
+    removed = compact_all_history(keep_recent, keep_every)
+    click.echo(f'Removed {removed} history rows.')
@@ -0,0 +1,173 @@
+# FILE: website/instrumentation.py
+"""Opt-in per-request timing and SQL instrumentation.
+
+Enable with INSTRUMENTATION_ENABLED = True. Each response then carries a
+Server-Timing header (total time, DB time and statement count) and the
+numbers are folded into a rolling per-endpoint window readable from
+/admin/instrumentation.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RollingStats:
+    """Per-endpoint samples from the last `window` seconds (at most `max_samples` each)."""
+
+    def __init__(self, window=300.0, max_samples=2000):
+        self.window = window
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, duration, sql_count, sql_time, status):
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.max_samples)
+            samples.append((now, duration, sql_count, sql_time, status))
+
+    def _trim(self, samples, now):
+        while samples and now - samples[0][0] > self.window:
+            samples.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        out = {}
+        with self._lock:
+            for endpoint, samples in list(self._samples.items()):
+                self._trim(samples, now)
+                if not samples:
+                    del self._samples[endpoint]
+                    continue
+                durations = sorted(s[1] for s in samples)
+                n = len(samples)
+                out[endpoint] = {
+                    'count': n,
+                    'errors': sum(1 for s in samples if s[4] >= 500),
+                    'avg_ms': round(sum(durations) / n * 1000, 2),
+                    'p50_ms': round(percentile(durations, 50) * 1000, 2),
+                    'p95_ms': round(percentile(durations, 95) * 1000, 2),
+                    'p99_ms': round(percentile(durations, 99) * 1000, 2),
+                    'max_ms': round(durations[-1] * 1000, 2),
+                    'avg_queries': round(sum(s[2] for s in samples) / n, 2),
+                    'max_queries': max(s[2] for s in samples),
+                    'avg_db_ms': round(sum(s[3] for s in samples) / n * 1000, 2),
+                }
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+request_stats = RollingStats()
+
+
+# ---------- SQLAlchemy hooks ----------
+
+_engine_hooks_installed = False
+_query_observers = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_app_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+    for observer in _query_observers:
+        observer(conn, cursor, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so the next statement on this connection is not timed against it.
+    conn = exception_context.connection
+    if conn is not None and exception_context.execution_context is not None:
+        starts = conn.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def install_engine_hooks():
+    """Attach the cursor timing hooks to every Engine (once per process)."""
+    global _engine_hooks_installed
+    if _engine_hooks_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _engine_hooks_installed = True
+
+
+def add_query_observer(fn):
+    """Call fn(conn, cursor, statement, parameters, executemany, elapsed) after every statement."""
+    install_engine_hooks()
+    if fn not in _query_observers:
+        _query_observers.append(fn)
+
+
+# ---------- Flask hooks ----------
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+
+
+def request_timings():
+    """(total seconds, sql statement count, sql seconds) for the current request so far."""
+    if 'request_start' not in g:
+        return None
+    return time.perf_counter() - g.request_start, g.sql_count, g.sql_time
+
+
+def init_app(app):
+    app.config.setdefault('INSTRUMENTATION_ENABLED', False)
+    app.config.setdefault('INSTRUMENTATION_WINDOW', 300.0)
+    if not app.config['INSTRUMENTATION_ENABLED']:
+        return
+
+    request_stats.window = app.config['INSTRUMENTATION_WINDOW']
+    install_engine_hooks()
+
+    @app.before_request
+    def _start_timer():
+        start_request_timer()
+
+    @app.after_request
+    def _record_timings(response):
+        timings = request_timings()
+        if timings is None:
+            return response
+        total, sql_count, sql_time = timings
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={total * 1000:.1f}, db;dur={sql_time * 1000:.1f};desc="{sql_count} queries"'
+        )
+        request_stats.record(request.endpoint or 'unmatched', total, sql_count, sql_time, response.status_code)
+        return response
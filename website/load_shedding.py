@@ -0,0 +1,185 @@
+# FILE: website/load_shedding.py
+"""Load shedding for low-priority polling endpoints.
+
+Two signals describe how busy this worker is:
+
+- DB latency: a decaying average of SQL statement time (SQLite lock waits
+  show up here first), against SHED_DB_LATENCY_MS.
+- Requests in flight, against SHED_MAX_IN_FLIGHT. Long-polls parked on a
+  wakeup do not count (here or against SHED_MAX_POLLERS); they hold
+  neither a thread's DB work nor a connection.
+
+pressure() is the larger ratio; 1.0 means at capacity. While it is >= 1,
+or while SHED_MAX_POLLERS low-priority requests are already running,
+SHED_ENDPOINTS get the last good response for the same user and URL (if
+it is at most SHED_STALE_SECONDS old) or a 503, both with Retry-After.
+Writes such as class_chat_send are never shed, so they get the DB
+connections the pollers give up.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import g, jsonify, request, current_app
+from flask_login import current_user
+
+from . import instrumentation
+from .metrics import registry
+
+DEFAULT_ENDPOINTS = (
+    'views.messages_unread_summary',
+    'views.class_chat_feed',
+    'views.messages_feed',
+)
+
+
+class LoadShedder:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._pollers = 0
+        self._latency = 0.0          # decaying average of statement time, seconds
+        self._latency_at = time.monotonic()
+        self._stale = OrderedDict()  # (user id, full path) -> (stored at, body, status, mimetype, headers)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHED_ENABLED', True)
+        app.config.setdefault('SHED_ENDPOINTS', DEFAULT_ENDPOINTS)
+        app.config.setdefault('SHED_DB_LATENCY_MS', 250.0)
+        app.config.setdefault('SHED_MAX_IN_FLIGHT', 64)
+        app.config.setdefault('SHED_MAX_POLLERS', 32)
+        app.config.setdefault('SHED_STALE_SECONDS', 30.0)
+        app.config.setdefault('SHED_STALE_MAX_ENTRIES', 5000)
+        app.config.setdefault('SHED_RETRY_AFTER', 2)
+        app.config.setdefault('SHED_MAX_RETRY_AFTER', 30)
+        self.app = app
+        app.extensions['load_shedder'] = self
+        with self._lock:
+            self._stale.clear()
+        instrumentation.add_query_observer(self._observe_query)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    # ---------- signals ----------
+
+    def _observe_query(self, conn, cursor, statement, parameters, executemany, elapsed):
+        with self._lock:
+            self._latency = self._decayed(time.monotonic()) * 0.8 + elapsed * 0.2
+            self._latency_at = time.monotonic()
+
+    def _decayed(self, now):
+        # Without fresh statements the signal fades (5s time constant) instead of sticking high
+        return self._latency * math.exp(-(now - self._latency_at) / 5.0)
+
+    def db_latency(self):
+        with self._lock:
+            return self._decayed(time.monotonic())
+
+    def in_flight(self):
+        with self._lock:
+            return self._in_flight
+
+    def pressure(self):
+        """Load relative to capacity: max(DB latency / threshold, in-flight / limit)."""
+        config = self.app.config
+        with self._lock:
+            latency = self._decayed(time.monotonic())
+            in_flight = self._in_flight
+        return max(latency * 1000 / config['SHED_DB_LATENCY_MS'], in_flight / config['SHED_MAX_IN_FLIGHT'])
+
+    @contextmanager
+    def parked(self):
+        """Don't count the current request as in flight or as a poller while it waits (e.g. a long-poll)."""
+        counted = g.get('_shed_counted', False)
+        poller = counted and g.get('_shed_low_priority', False)
+        if counted:
+            with self._lock:
+                self._in_flight -= 1
+                self._pollers -= poller
+        try:
+            yield
+        finally:
+            if counted:
+                with self._lock:
+                    self._in_flight += 1
+                    self._pollers += poller
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        low_priority = request.endpoint in self.app.config['SHED_ENDPOINTS']
+        with self._lock:
+            self._in_flight += 1
+            if low_priority:
+                self._pollers += 1
+        g._shed_counted = True
+        g._shed_low_priority = low_priority
+        if not low_priority or not self.app.config['SHED_ENABLED']:
+            return None
+
+        pressure = self.pressure()
+        with self._lock:
+            pollers = self._pollers
+        if pressure < 1.0 and pollers <= self.app.config['SHED_MAX_POLLERS']:
+            return None
+        return self._shed(max(pressure, 1.0))
+
+    def _after_request(self, response):
+        if g.get('_shed_low_priority') and not g.get('_shed_served') and response.status_code == 200 \
+                and self.app.config['SHED_ENABLED'] and not response.is_streamed:
+            self._remember(response)
+        return response
+
+    def _teardown_request(self, exc=None):
+        if g.pop('_shed_counted', False):
+            with self._lock:
+                self._in_flight -= 1
+                if g.pop('_shed_low_priority', False):
+                    self._pollers -= 1
+
+    # ---------- shedding ----------
+
+    def _stale_key(self):
+        return current_user.get_id() if current_user.is_authenticated else None, request.full_path
+
+    def _remember(self, response):
+        entry = (time.monotonic(), response.get_data(), response.status_code, response.mimetype,
+                 {k: v for k, v in response.headers.items() if k.startswith('X-')})
+        limit = self.app.config['SHED_STALE_MAX_ENTRIES']
+        key = self._stale_key()  # outside the lock: loading current_user runs a query, which _observe_query times
+        with self._lock:
+            self._stale[key] = entry
+            self._stale.move_to_end(key)
+            while len(self._stale) > limit:
+                self._stale.popitem(last=False)
+
+    def _shed(self, pressure):
+        config = self.app.config
+        retry_after = min(config['SHED_MAX_RETRY_AFTER'], math.ceil(config['SHED_RETRY_AFTER'] * pressure))
+        g._shed_served = True
+        key = self._stale_key()
+        with self._lock:
+            entry = self._stale.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= config['SHED_STALE_SECONDS']:
+            _, body, status, mimetype, headers = entry
+            response = current_app.response_class(body, status=status, mimetype=mimetype, headers=headers)
+            response.headers['Warning'] = '110 - "Response is Stale"'
+            action = 'stale'
+        else:
+            response = jsonify(success=False, error="Server busy, retry shortly")
+            response.status_code = 503
+            action = 'rejected'
+        response.headers['Retry-After'] = str(retry_after)
+        response.headers['X-Poll-Interval'] = f'{float(retry_after):.1f}'
+        registry.inc('load_shed_total', {'endpoint': request.endpoint, 'action': action})
+        return response
+
+
+load_shedder = LoadShedder()
@@ -0,0 +1,302 @@
+# FILE: website/login_guard.py
+"""Brute-force protection for auth.login.
+
+Failed logins are recorded against the client address and the submitted
+email. For each of the two, the failures inside the last
+LOGIN_GUARD_WINDOW seconds decide what happens next:
+
+- up to *_FREE failures: nothing;
+- past that, each further attempt must wait a progressive delay after
+  the previous failure (LOGIN_GUARD_BASE_DELAY doubling per failure,
+  capped at LOGIN_GUARD_MAX_DELAY);
+- at *_LOCKOUT failures: locked for LOGIN_GUARD_LOCKOUT_SECONDS after the
+  last failure.
+
+check() runs before the user lookup and the password hash, so throttled
+attempts cost neither a query nor a key derivation. An attempt it lets
+through is recorded as a failure in the same atomic step that counted the
+earlier ones, so a burst of parallel guesses can't all pass before the
+first failure lands: failed() keeps that record, a successful login takes
+back the address's and clears the email's failures (not the address's: one
+shared NAT should not unlock an attacker), and a request that ends without
+either (e.g. the hash pool was busy) releases it. Storage follows the rate limiter:
+LOGIN_GUARD_STORAGE_URL (defaulting to RATELIMIT_STORAGE_URL) is empty for
+this process only, sqlite:///path or redis://host for every worker.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryFailureLog:
+    """Failure timestamps per key, in a dict of deques."""
+
+    def __init__(self, max_keys=100_000, max_per_key=1000):
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._failures = {}
+
+    def _trim(self, key, since):
+        times = self._failures.get(key)
+        while times and times[0] < since:
+            times.popleft()
+        if times is not None and not times:
+            del self._failures[key]
+            return None
+        return times
+
+    def failures(self, key, since):
+        """(failures at or after `since`, time of the latest one or None)."""
+        with self._lock:
+            times = self._trim(key, since)
+            return (len(times), times[-1]) if times else (0, None)
+
+    def record(self, key, now, since):
+        self.reserve(key, now, since)
+
+    def reserve(self, key, now, since):
+        """Record a failure at `now`; returns (failures before it, latest before it, handle for release())."""
+        with self._lock:
+            times = self._trim(key, since)
+            count, last = (len(times), times[-1]) if times else (0, None)
+            if times is None:
+                times = self._failures[key] = deque(maxlen=self.max_per_key)
+            times.append(now)
+            if len(self._failures) > self.max_keys:
+                del self._failures[next(iter(self._failures))]
+            return count, last, now
+
+    def release(self, key, handle):
+        with self._lock:
+            times = self._failures.get(key)
+            if times is not None and handle in times:
+                times.remove(handle)
+                if not times:
+                    del self._failures[key]
+
+    def clear(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+class SQLiteFailureLog:
+    """Failure timestamps in a shared SQLite file."""
+
+    def __init__(self, url):
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self._local = threading.local()
+        self._recorded = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS login_failures (key TEXT NOT NULL, at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_login_failures_key_at ON login_failures (key, at)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def failures(self, key, since):
+        count, last = self._connection().execute(
+            'SELECT COUNT(*), MAX(at) FROM login_failures WHERE key = ? AND at >= ?', (key, since)
+        ).fetchone()
+        return count, last
+
+    def record(self, key, now, since):
+        conn = self._connection()
+        conn.execute('INSERT INTO login_failures (key, at) VALUES (?, ?)', (key, now))
+        self._recorded += 1
+        if self._recorded % 500 == 0:
+            conn.execute('DELETE FROM login_failures WHERE at < ?', (since,))
+
+    def reserve(self, key, now, since):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')  # the count and the insert are one step for every worker
+        try:
+            count, last = self.failures(key, since)
+            self.record(key, now, since)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count, last, now
+
+    def release(self, key, handle):
+        self._connection().execute(
+            'DELETE FROM login_failures WHERE rowid = '
+            '(SELECT rowid FROM login_failures WHERE key = ? AND at = ? LIMIT 1)', (key, handle)
+        )
+
+    def clear(self, key):
+        self._connection().execute('DELETE FROM login_failures WHERE key = ?', (key,))
+
+
+class RedisFailureLog:
+    """Failure timestamps in one Redis sorted set per key."""
+
+    def __init__(self, url, prefix='loginfail:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("LOGIN_GUARD_STORAGE_URL uses Redis but the 'redis' package is not installed")
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def failures(self, key, since):
+        name = self.prefix + key
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(name, '-inf', f'({since}')
+        pipe.zcard(name)
+        pipe.zrange(name, -1, -1, withscores=True)
+        _, count, latest = pipe.execute()
+        return count, (latest[0][1] if latest else None)
+
+    def record(self, key, now, since):
+        self.reserve(key, now, since)
+
+    def reserve(self, key, now, since):
+        name = self.prefix + key
+        member = f'{now}:{os.getpid()}:{threading.get_ident()}'
+        pipe = self._redis.pipeline()  # MULTI/EXEC: the count and the insert are one step
+        pipe.zremrangebyscore(name, '-inf', f'({since}')
+        pipe.zcard(name)
+        pipe.zrange(name, -1, -1, withscores=True)
+        pipe.zadd(name, {member: now})
+        pipe.expire(name, max(1, int(now - since) + 1))
+        _, count, latest, _, _ = pipe.execute()
+        return count, (latest[0][1] if latest else None), member
+
+    def release(self, key, handle):
+        self._redis.zrem(self.prefix + key, handle)
+
+    def clear(self, key):
+        self._redis.delete(self.prefix + key)
+
+
+def make_failure_log(url):
+    if not url:
+        return MemoryFailureLog()
+    if url.startswith('sqlite:///'):
+        return SQLiteFailureLog(url)
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisFailureLog(url)
+    raise ValueError(f"Unsupported LOGIN_GUARD_STORAGE_URL: {url}")
+
+
+class LoginGuard:
+    def __init__(self, app=None):
+        self.app = None
+        self.storage = MemoryFailureLog()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOGIN_GUARD_ENABLED', True)
+        app.config.setdefault('LOGIN_GUARD_STORAGE_URL', app.config.get('RATELIMIT_STORAGE_URL')
+                              or os.environ.get('RATELIMIT_STORAGE_URL'))
+        app.config.setdefault('LOGIN_GUARD_WINDOW', 900.0)
+        app.config.setdefault('LOGIN_GUARD_EMAIL_FREE', 5)
+        app.config.setdefault('LOGIN_GUARD_EMAIL_LOCKOUT', 15)
+        app.config.setdefault('LOGIN_GUARD_IP_FREE', 20)
+        app.config.setdefault('LOGIN_GUARD_IP_LOCKOUT', 100)
+        app.config.setdefault('LOGIN_GUARD_BASE_DELAY', 1.0)
+        app.config.setdefault('LOGIN_GUARD_MAX_DELAY', 60.0)
+        app.config.setdefault('LOGIN_GUARD_LOCKOUT_SECONDS', 900.0)
+        self.app = app
+        self.storage = make_failure_log(app.config['LOGIN_GUARD_STORAGE_URL'])
+        app.teardown_request(lambda exc: self._release(g.pop('login_guard_reserved', ())))
+        app.extensions['login_guard'] = self
+
+    def _keys(self, ip, email):
+        keys = [('ip', f'ip:{ip}')]
+        if email:
+            keys.append(('email', f'email:{email.strip().lower()}'))
+        return keys
+
+    def _wait(self, scope, count, last, now):
+        config = self.app.config
+        free = config[f'LOGIN_GUARD_{scope.upper()}_FREE']
+        if last is None or count < free:
+            return 0.0
+        if count >= config[f'LOGIN_GUARD_{scope.upper()}_LOCKOUT']:
+            return last + config['LOGIN_GUARD_LOCKOUT_SECONDS'] - now
+        delay = min(config['LOGIN_GUARD_MAX_DELAY'], config['LOGIN_GUARD_BASE_DELAY'] * 2 ** (count - free))
+        return last + delay - now
+
+    def check(self, ip, email):
+        """Seconds this attempt must still wait (0 when it may go ahead).
+
+        An attempt that may go ahead is already counted as a failure until
+        succeeded() or the end of the request; outside a request check()
+        only reports.
+        """
+        if not self.app.config['LOGIN_GUARD_ENABLED']:
+            return 0.0
+        now = time.time()
+        since = now - self.app.config['LOGIN_GUARD_WINDOW']
+        wait, reserved = 0.0, []
+        try:
+            for scope, key in self._keys(ip, email):
+                count, last, handle = self.storage.reserve(key, now, since)
+                reserved.append((key, handle))
+                scope_wait = self._wait(scope, count, last, now)
+                if scope_wait > 0:
+                    registry.inc('login_throttled_total', {'scope': scope})
+                wait = max(wait, scope_wait)
+        except Exception:
+            logger.warning("Login guard storage failed; allowing the attempt", exc_info=True)
+            self._release(reserved)
+            return 0.0
+        if wait > 0 or not has_request_context():
+            self._release(reserved)  # throttled attempts don't count as failures
+        else:
+            self._release(g.pop('login_guard_reserved', ()))
+            g.login_guard_reserved = reserved
+        return wait
+
+    def _release(self, reserved):
+        try:
+            for key, handle in reserved:
+                self.storage.release(key, handle)
+        except Exception:
+            logger.warning("Login guard storage failed; attempt not released", exc_info=True)
+
+    def failed(self, ip, email):
+        if has_request_context() and g.pop('login_guard_reserved', None) is not None:
+            return  # check() already recorded it
+        now = time.time()
+        since = now - self.app.config['LOGIN_GUARD_WINDOW']
+        try:
+            for _, key in self._keys(ip, email):
+                self.storage.record(key, now, since)
+        except Exception:
+            logger.warning("Login guard storage failed; failure not recorded", exc_info=True)
+
+    def succeeded(self, email):
+        if has_request_context():
+            self._release(g.pop('login_guard_reserved', ()))
+        try:
+            for scope, key in self._keys(None, email):
+                if scope == 'email':
+                    self.storage.clear(key)
+        except Exception:
+            logger.warning("Login guard storage failed; failures not cleared", exc_info=True)
+
+
+login_guard = LoginGuard()
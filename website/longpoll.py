@@ -0,0 +1,117 @@
+# FILE: website/longpoll.py
+"""Server-side wakeups for long-polling feeds.
+
+A feed request with ?wait=N that finds nothing new parks on its topic
+(one DM conversation or one classroom chat) instead of returning an empty
+list, and re-queries only when a writer calls notify() for that topic or
+the wait times out. Idle conversations therefore cost one query per
+FEED_LONGPOLL_MAX_WAIT seconds instead of one every poll interval.
+
+notify() goes through message_queue.broadcast(), so with
+SOCKETIO_MESSAGE_QUEUE set a message sent on one worker wakes the
+long-polls parked on every other worker.
+
+Only the FEED_NOTIFY_TOPICS most recently notified topics keep a version
+(topics with parked waiters are never dropped). Versions come from one
+process-wide sequence and a dropped topic reads as the highest version
+dropped so far, so a waiter can never miss a bump because its topic was
+forgotten; at worst it wakes once early and re-queries.
+"""
+
+import threading
+from collections import OrderedDict
+
+from . import message_queue
+
+NOTIFY_EVENT = 'feed_notify'
+
+
+def dm_topic(user_a, user_b):
+    low, high = sorted((user_a, user_b))
+    return f'dm:{low}:{high}'
+
+
+def class_chat_topic(class_id):
+    return f'class_chat:{class_id}'
+
+
+class FeedNotifier:
+    """Per-topic versions; waiters sleep on a condition until their topic moves."""
+
+    def __init__(self, app=None, max_topics=10000):
+        self._lock = threading.Lock()
+        self.max_topics = max_topics
+        self._versions = OrderedDict()    # least recently notified first
+        self._seq = 0
+        self._floor = 0                   # highest version dropped from _versions
+        self._conditions = {}
+        self._waiters = {}
+        self._closed = False
+        message_queue.on_server_event(NOTIFY_EVENT, self._bump)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEED_LONGPOLL_MAX_WAIT', 25.0)
+        app.config.setdefault('FEED_NOTIFY_TOPICS', 10000)
+        self.max_topics = app.config['FEED_NOTIFY_TOPICS']
+        app.extensions['feed_notifier'] = self
+        self._closed = False
+
+    def version(self, topic):
+        with self._lock:
+            return self._versions.get(topic, self._floor)
+
+    def notify(self, topic):
+        """Call after committing a row for `topic`; wakes its waiters on every worker."""
+        message_queue.broadcast(NOTIFY_EVENT, topic)
+
+    def wait(self, topic, seen_version, timeout):
+        """Block until `topic` moves past `seen_version` or `timeout` passes; True if it moved."""
+        with self._lock:
+            condition = self._conditions.get(topic)
+            if condition is None:
+                condition = self._conditions[topic] = threading.Condition(self._lock)
+            self._waiters[topic] = self._waiters.get(topic, 0) + 1
+            try:
+                return condition.wait_for(
+                    lambda: self._closed or self._versions.get(topic, self._floor) != seen_version, timeout
+                ) and not self._closed
+            finally:
+                self._waiters[topic] -= 1
+                if not self._waiters[topic]:
+                    del self._waiters[topic]
+                    del self._conditions[topic]
+
+    def wake_all(self):
+        """Release every waiter (used when a worker drains)."""
+        with self._lock:
+            self._closed = True
+            for condition in self._conditions.values():
+                condition.notify_all()
+
+    def _bump(self, topic):
+        with self._lock:
+            self._seq += 1
+            self._versions[topic] = self._seq
+            self._versions.move_to_end(topic)
+            self._trim()
+            condition = self._conditions.get(topic)
+            if condition is not None:
+                condition.notify_all()
+
+    def _trim(self):
+        while len(self._versions) > self.max_topics:
+            idle = next((t for t in self._versions if t not in self._waiters), None)
+            if idle is None:
+                return
+            self._floor = max(self._floor, self._versions.pop(idle))
+
+
+feed_notifier = FeedNotifier()
+
+
+def wait_seconds(request, app):
+    """The ?wait= of a feed request, clamped to [0, FEED_LONGPOLL_MAX_WAIT]."""
+    wait = request.args.get('wait', type=float) or 0.0
+    return max(0.0, min(wait, app.config['FEED_LONGPOLL_MAX_WAIT']))
@@ -0,0 +1,102 @@
+# FILE: website/membership.py
+"""Classroom membership checks that never load a roster.
+
+`current_user in classroom.students` loaded every student of the class to
+authorise one request. Access checks now ask membership_cache for the set
+of class ids the user has joined: one indexed SELECT on classroom_students
+(its primary key leads with user_id) per user per MEMBERSHIP_CACHE_TTL,
+then a set lookup. Writes use is_enrolled(), a single EXISTS, and call
+invalidate() after committing; that goes through message_queue.broadcast so
+every worker drops its copy.
+
+Without SOCKETIO_MESSAGE_QUEUE the broadcast only reaches this process, and
+other workers would keep authorising a removed student for the whole TTL,
+so the TTL is then capped at MEMBERSHIP_CACHE_LOCAL_TTL (2s by default).
+"""
+
+import threading
+import time
+
+from sqlalchemy import select, exists
+
+from . import db, message_queue
+from .metrics import registry
+from .models import classroom_students
+
+INVALIDATE_EVENT = 'membership_invalidate'
+
+
+def is_enrolled(user_id, class_id):
+    """EXISTS lookup on classroom_students, bypassing the cache (for writes)."""
+    return db.session.scalar(select(exists().where(
+        classroom_students.c.user_id == user_id,
+        classroom_students.c.classroom_id == class_id,
+    )))
+
+
+class MembershipCache:
+    def __init__(self, app=None, ttl=300.0, max_users=50_000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._class_ids = {}   # user id -> (loaded at, frozenset of class ids)
+        self._epoch = 0        # bumped by every invalidation; loads that straddle one are not stored
+        message_queue.on_server_event(INVALIDATE_EVENT, self._forget)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MEMBERSHIP_CACHE_TTL', 300.0)
+        app.config.setdefault('MEMBERSHIP_CACHE_LOCAL_TTL', 2.0)
+        self.ttl = app.config['MEMBERSHIP_CACHE_TTL']
+        if not app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+            self.ttl = min(self.ttl, app.config['MEMBERSHIP_CACHE_LOCAL_TTL'])
+        self.clear()
+        app.extensions['membership_cache'] = self
+
+    def class_ids(self, user_id):
+        """frozenset of the classroom ids `user_id` has joined as a student."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._class_ids.get(user_id)
+            epoch = self._epoch
+        if entry is not None and now - entry[0] < self.ttl:
+            registry.inc('cache_requests_total', {'cache': 'class_membership', 'result': 'hit'})
+            return entry[1]
+
+        registry.inc('cache_requests_total', {'cache': 'class_membership', 'result': 'miss'})
+        ids = frozenset(db.session.scalars(
+            select(classroom_students.c.classroom_id).where(classroom_students.c.user_id == user_id)
+        ))
+        with self._lock:
+            if self._epoch == epoch:
+                self._class_ids[user_id] = (now, ids)
+                if len(self._class_ids) > self.max_users:
+                    del self._class_ids[next(iter(self._class_ids))]
+        return ids
+
+    def is_member(self, user_id, class_id):
+        return class_id in self.class_ids(user_id)
+
+    def invalidate(self, user_id):
+        """Call after committing a join/removal for `user_id`; clears it on every worker."""
+        message_queue.broadcast(INVALIDATE_EVENT, user_id)
+
+    def _forget(self, user_id):
+        with self._lock:
+            self._epoch += 1
+            self._class_ids.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._class_ids.clear()
+
+
+membership_cache = MembershipCache()
+
+
+def can_access_classroom(user, classroom):
+    """Teacher, admin or enrolled student."""
+    return (user.id == classroom.teacher_id or user.is_admin
+            or membership_cache.is_member(user.id, classroom.id))
@@ -0,0 +1,153 @@
+# FILE: website/message_queue.py
+"""Cross-worker Socket.IO message queue.
+
+With more than one worker every emit must go through a shared bus so it
+reaches clients connected to the other workers. SOCKETIO_MESSAGE_QUEUE
+selects the backend:
+
+    None / ''                  single process (default)
+    redis://host:6379/0        Redis pub/sub (needs the `redis` package)
+    sqlite:///path/bus.db      dependency-free SQLite bus for one host / tests
+
+Any process can emit to connected clients through a write-only manager:
+make_client_manager(url, write_only=True).emit('event', data, room=...).
+
+Emits to SERVER_ROOM never reach clients: every worker runs the listeners
+registered with on_server_event() instead (see broadcast()).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import socketio as python_socketio
+
+SERVER_ROOM = '__server__'
+
+_server_listeners = {}
+
+
+def on_server_event(event, listener):
+    """Call `listener(*args)` in this worker whenever any worker broadcasts `event`."""
+    _server_listeners.setdefault(event, []).append(listener)
+
+
+def _dispatch_server_event(event, args):
+    for listener in _server_listeners.get(event, ()):
+        listener(*args)
+
+
+def broadcast(event, *args):
+    """Run the `event` listeners on every worker (only this one without a message queue)."""
+    from . import socketio
+    manager = socketio.server.manager if socketio.server is not None else None
+    if isinstance(manager, python_socketio.PubSubManager):
+        manager.emit(event, args, room=SERVER_ROOM, namespace='/')
+    else:
+        _dispatch_server_event(event, args)
+
+
+class _ServerEvents:
+    """Manager mixin: SERVER_ROOM emits (local or from the bus) go to server listeners, not clients."""
+
+    def _handle_emit(self, message):
+        if message.get('room') == SERVER_ROOM:
+            _dispatch_server_event(message['event'], message['data'])
+            return
+        super()._handle_emit(message)
+
+
+class RedisManager(_ServerEvents, python_socketio.RedisManager):
+    pass
+
+
+class SQLiteManager(_ServerEvents, python_socketio.PubSubManager):
+    """Pub/sub over a shared SQLite file: publishers insert rows, listeners poll for new ids."""
+
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio-bus.db', channel='flask-socketio', write_only=False,
+                 logger=None, poll_interval=0.05, retention=60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._published = 0
+        self._start_id = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_bus ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' channel TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' payload TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_socketio_bus_channel_id ON socketio_bus (channel, id)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every publish is immediately visible to the other workers
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _publish(self, data):
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO socketio_bus (channel, created, payload) VALUES (?, ?, ?)',
+            (self.channel, time.time(), self.json.dumps(data))
+        )
+        self._published += 1
+        if self._published % 500 == 0:
+            conn.execute('DELETE FROM socketio_bus WHERE created < ?', (time.time() - self.retention,))
+
+    def initialize(self):
+        # Start from the current end of the bus, before the listener thread runs
+        self._start_id = self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM socketio_bus').fetchone()[0]
+        super().initialize()
+
+    def _listen(self):
+        conn = self._connection()
+        last_id = self._start_id
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_bus WHERE channel = ? AND id > ? ORDER BY id',
+                (self.channel, last_id)
+            ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                self.server.sleep(self.poll_interval)
+
+
+def make_client_manager(url, channel='flask-socketio', write_only=False):
+    """Return a python-socketio client manager for `url`, or None for single-process mode."""
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteManager(url, channel=channel, write_only=write_only)
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            import redis  # noqa: F401
+        except ImportError:
+            raise RuntimeError("SOCKETIO_MESSAGE_QUEUE uses Redis but the 'redis' package is not installed")
+        return RedisManager(url, channel=channel, write_only=write_only)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE url: {url}")
+
+
+def init_app(app):
+    """Keyword arguments for socketio.init_app()."""
+    app.config.setdefault('SOCKETIO_MESSAGE_QUEUE', os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
+    app.config.setdefault('SOCKETIO_CHANNEL', 'flask-socketio')
+    # Always pass client_manager: SocketIO keeps options between init_app calls
+    return {
+        'client_manager': make_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL'])
+    }
@@ -0,0 +1,320 @@
+# FILE: website/metrics.py
+"""Prometheus text-format metrics.
+
+A minimal, dependency-free registry of counters, histograms and
+callback gauges. With METRICS_MULTIPROC_DIR set (e.g. under gunicorn)
+every worker periodically dumps its values to <dir>/metrics_<pid>.json and
+/metrics merges all of them: counters and histograms are summed (including
+those of workers that have exited), gauges only over live workers.
+/metrics requires METRICS_TOKEN as a bearer token and is not served at all
+without one.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, request, abort
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'flask_http_requests_total': ('counter', 'HTTP requests by endpoint and status.'),
+    'flask_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.'),
+    'flask_http_request_db_seconds_total': ('counter', 'Time spent in SQL per endpoint.'),
+    'flask_http_request_db_queries_total': ('counter', 'SQL statements executed per endpoint.'),
+    'socketio_connections': ('gauge', 'Connected Socket.IO clients.'),
+    'socketio_rooms': ('gauge', 'Socket.IO rooms with at least one member (excluding per-sid rooms).'),
+    'sqlalchemy_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'sqlalchemy_pool_checked_out': ('gauge', 'Connections currently checked out.'),
+    'sqlalchemy_pool_overflow': ('gauge', 'Connections open beyond the pool size.'),
+    'sqlalchemy_pool_size': ('gauge', 'Configured pool size.'),
+    'upload_bytes_total': ('counter', 'Bytes received in file uploads.'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss).'),
+    'rate_limited_total': ('counter', 'Requests and Socket.IO events refused by the rate limiter, by name.'),
+    'login_throttled_total': ('counter', 'Login attempts refused by the brute-force guard, by scope (ip/email).'),
+    'load_shed_total': ('counter', 'Low-priority requests shed, by endpoint and action (stale/rejected).'),
+}
+
+
+def _key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters = {}
+        self._histograms = {}
+        self._gauge_callbacks = []
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's values as its own
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name, labels=None, value=1):
+        with self._lock:
+            self._check_fork()
+            key = (name, _key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            self._check_fork()
+            key = (name, _key(labels))
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def gauge_callback(self, fn):
+        """Register fn() -> iterable of (name, labels, value), evaluated at collection time."""
+        self._gauge_callbacks.append(fn)
+        return fn
+
+    def collect(self):
+        gauges = []
+        for fn in self._gauge_callbacks:
+            try:
+                gauges.extend([name, _key(labels), value] for name, labels, value in fn())
+            except Exception:
+                continue
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'counters': [[name, list(labels), v] for (name, labels), v in self._counters.items()],
+                'histograms': [[name, list(labels), dict(h, counts=list(h['counts']))] for (name, labels), h in self._histograms.items()],
+                'gauges': [[name, list(labels), v] for name, labels, v in gauges],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+
+registry = Registry()
+
+
+# ---------- multi-process ----------
+
+class _SnapshotWriter:
+    def __init__(self):
+        self.directory = None
+        self.interval = 1.0
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_write(self, force=False):
+        if not self.directory:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last < self.interval:
+                return
+            self._last = now
+        data = registry.collect()
+        path = os.path.join(self.directory, f"metrics_{data['pid']}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+
+snapshot_writer = _SnapshotWriter()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _gather():
+    if not snapshot_writer.directory:
+        return [registry.collect()]
+    snapshot_writer.maybe_write(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(snapshot_writer.directory, 'metrics_*.json')):
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if not _pid_alive(data.get('pid', 0)):
+            data['gauges'] = []
+        snapshots.append(data)
+    return snapshots
+
+
+def _merge(snapshots):
+    counters, gauges, histograms = {}, {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snap['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, hist in snap['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(hist, counts=list(hist['counts']))
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+                merged['sum'] += hist['sum']
+                merged['count'] += hist['count']
+    return counters, gauges, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, gauges, histograms = _merge(_gather())
+    by_name = {}
+    for (name, labels), value in sorted(counters.items()) + sorted(gauges.items()):
+        by_name.setdefault(name, []).append(f'{name}{_labels(labels)} {_fmt(value)}')
+    for (name, labels), hist in sorted(histograms.items(), key=lambda item: item[0]):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(hist['buckets'], hist['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, [("le", _fmt(float(bound)))])} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {hist["count"]}')
+        lines.append(f'{name}_sum{_labels(labels)} {_fmt(hist["sum"])}')
+        lines.append(f'{name}_count{_labels(labels)} {hist["count"]}')
+
+    out = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ('untyped', ''))
+        out.append(f'# HELP {name} {help_text}')
+        out.append(f'# TYPE {name} {kind}')
+        out.extend(by_name[name])
+    return '\n'.join(out) + '\n'
+
+
+# ---------- collectors ----------
+
+_pool_hooks_installed = False
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    registry.inc('sqlalchemy_pool_checkouts_total')
+
+
+def _pool_gauges():
+    from . import db
+    pool = db.engine.pool
+    yield 'sqlalchemy_pool_checked_out', None, pool.checkedout() if hasattr(pool, 'checkedout') else 0
+    if hasattr(pool, 'overflow'):
+        yield 'sqlalchemy_pool_overflow', None, max(pool.overflow(), 0)
+    if hasattr(pool, 'size'):
+        yield 'sqlalchemy_pool_size', None, pool.size()
+
+
+def _socketio_gauges():
+    from . import socketio
+    server = getattr(socketio, 'server', None)
+    if server is None:
+        return
+    rooms = server.manager.rooms.get('/', {})
+    connected = rooms.get(None, {})
+    # Every client is also in a room named after its own sid
+    named = [r for r in rooms if r is not None and r not in connected]
+    yield 'socketio_connections', None, len(connected)
+    yield 'socketio_rooms', None, len(named)
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        # Closed unless a scrape token is configured: endpoint names, traffic
+        # and pool sizes are not for anonymous visitors
+        abort(404)
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    global _pool_hooks_installed
+    app.config.setdefault('METRICS_ENABLED', False)
+    app.config.setdefault('METRICS_MULTIPROC_DIR', os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+    app.config.setdefault('METRICS_TOKEN', None)
+    if not app.config['METRICS_ENABLED']:
+        return
+    if not app.config['METRICS_TOKEN']:
+        app.logger.warning("Metrics: METRICS_TOKEN is not set; /metrics will answer 404")
+
+    from . import instrumentation
+
+    directory = app.config['METRICS_MULTIPROC_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        snapshot_writer.directory = directory
+
+    instrumentation.install_engine_hooks()
+    if not _pool_hooks_installed:
+        event.listen(Pool, 'checkout', _on_checkout)
+        registry.gauge_callback(_pool_gauges)
+        registry.gauge_callback(_socketio_gauges)
+        _pool_hooks_installed = True
+
+    app.register_blueprint(metrics_bp)
+
+    @app.before_request
+    def _metrics_start():
+        if 'request_start' not in instrumentation.g:
+            instrumentation.start_request_timer()
+
+    @app.after_request
+    def _metrics_record(response):
+        timings = instrumentation.request_timings()
+        if timings is None or request.endpoint == 'metrics.metrics':
+            return response
+        total, sql_count, sql_time = timings
+        labels = {'blueprint': request.blueprint or '', 'endpoint': request.endpoint or 'unmatched'}
+        registry.observe('flask_http_request_duration_seconds', total, labels)
+        registry.inc('flask_http_requests_total', dict(labels, method=request.method, status=str(response.status_code)))
+        registry.inc('flask_http_request_db_seconds_total', labels, sql_time)
+        registry.inc('flask_http_request_db_queries_total', labels, sql_count)
+        snapshot_writer.maybe_write()
+        return response
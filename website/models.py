@@ -9,7 +9,9 @@ from sqlalchemy.sql import func
 tags_notes_association = db.Table(
     'tags_notes',
     db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    # The primary key leads with note_id; tag filtering needs the reverse
+    db.Index('ix_tags_notes_tag_note', 'tag_id', 'note_id')
 )
 
 classroom_students = db.Table(
@@ -60,6 +62,8 @@ class Note(db.Model):
     pinned = db.Column(db.Boolean, default=False)
     is_public = db.Column(db.Boolean, default=False)
     share_link = db.Column(db.String(255), unique=True, nullable=True)
+    # Last NoteOp revision folded into `content` (see website/collab.py)
+    collab_rev = db.Column(db.Integer, default=0)
 
     # Replace date with timestamp for consistency
     timestamp = db.Column(db.DateTime(timezone=True), server_default=func.now())
@@ -75,9 +79,33 @@ class Note(db.Model):
 
 
 class NoteHistory(db.Model):
+    __table_args__ = (
+        db.Index('ix_note_history_note_version', 'note_id', 'version', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, db.ForeignKey('note.id'))
-    content_snapshot = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    # Keyframes hold the full content; other rows hold a JSON delta against the
+    # previous version (see website/history.py)
+    is_keyframe = db.Column(db.Boolean, default=True)
+    content_snapshot = db.Column(db.Text, nullable=True)
+    # zlib-compressed payload, used instead of content_snapshot when NOTE_HISTORY_COMPRESS is on
+    compressed_blob = db.Column(db.LargeBinary, nullable=True)
+    timestamp = db.Column(db.DateTime(timezone=True), default=func.now())
+
+
+class NoteOp(db.Model):
+    """Append-only log of collaborative edits (Quill deltas) applied to a note."""
+    __table_args__ = (
+        db.UniqueConstraint('note_id', 'rev', name='uq_note_op_rev'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
+    rev = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    delta = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime(timezone=True), default=func.now())
 
 
@@ -89,16 +117,32 @@ class NoteAttachment(db.Model):
     mimetype = db.Column(db.String(100))
     size = db.Column(db.Integer)
 
+    # Filled in by the background attachment processor (website/attachments.py)
+    thumbnail_path = db.Column(db.String(255), nullable=True)
+    extracted_text = db.Column(db.Text, nullable=True)
+    processing_status = db.Column(db.String(20), default='pending', index=True)
+    processing_attempts = db.Column(db.Integer, default=0)
+    processing_error = db.Column(db.String(255), nullable=True)
+
     note = db.relationship('Note', back_populates='attachments')
 
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    # Maintained incrementally by website/tags.py
+    note_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
 
     notes = db.relationship('Note', secondary=tags_notes_association, back_populates='tags')
 
 
+class UserTagCount(db.Model):
+    """How many of a user's notes carry a tag (maintained by website/tags.py)."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, db.ForeignKey('note.id'))
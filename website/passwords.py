@@ -0,0 +1,118 @@
+# FILE: website/passwords.py
+"""Password hashing off the request thread.
+
+Key derivation is deliberately slow, and a burst of logins at the start of
+a class used to run it inline, holding up every other request on the
+worker. PasswordHasher runs hash/verify on a small pool of real OS threads
+instead (hashlib's PBKDF2 releases the GIL; under eventlet or gevent the
+hub's own thread pool is used so the event loop keeps serving). At most
+PASSWORD_HASH_WORKERS run at once and PASSWORD_HASH_MAX_QUEUE more may
+wait; beyond that HashPoolBusy is raised so the caller can answer 503
+instead of piling up requests. A job still unfinished after
+PASSWORD_HASH_TIMEOUT also raises HashPoolBusy, but keeps its slot until
+it actually completes.
+
+PASSWORD_HASH_METHOD is the werkzeug method for new hashes; spell out the
+work factor (e.g. 'pbkdf2:sha256:600000') so that stored hashes made with
+anything else are recognised as outdated and rehashed on the next login.
+"""
+
+import concurrent.futures
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashPoolBusy(Exception):
+    """Every hashing slot and queue position is taken."""
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._workers = 0
+        self._pending = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        app.config.setdefault('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))
+        app.config.setdefault('PASSWORD_HASH_MAX_QUEUE', 32)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 30.0)
+        self.app = app
+        app.extensions['password_hasher'] = self
+
+    # ---------- public API ----------
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, stored, password):
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """True when `stored` was made with a different method or work factor than PASSWORD_HASH_METHOD."""
+        method = self.app.config['PASSWORD_HASH_METHOD']
+        prefix = stored.split('$', 1)[0]
+        return not (prefix == method or prefix.startswith(method + ':'))
+
+    def pending(self):
+        """Hash jobs running or waiting for a slot."""
+        with self._lock:
+            return self._pending
+
+    # ---------- pool ----------
+
+    def _run(self, fn, *args):
+        config = self.app.config
+        with self._lock:
+            if self._pending >= config['PASSWORD_HASH_WORKERS'] + config['PASSWORD_HASH_MAX_QUEUE']:
+                raise HashPoolBusy()
+            self._pending += 1
+        mode = config.get('SOCKETIO_ASYNC_MODE')
+        if mode in ('eventlet', 'gevent'):
+            try:
+                return self._offload_green(mode, fn, args)
+            finally:
+                self._release()
+
+        try:
+            future = self._pool(config['PASSWORD_HASH_WORKERS']).submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the job itself finishes, not just until this caller gives up on it
+        future.add_done_callback(self._release)
+        try:
+            return future.result(config['PASSWORD_HASH_TIMEOUT'])
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # frees the slot now if the job was still queued
+            raise HashPoolBusy()
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _offload_green(self, mode, fn, args):
+        if mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args)
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+
+    def _pool(self, workers):
+        with self._lock:
+            if self._executor is None or self._workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                self._workers = workers
+            return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,70 @@
+# FILE: website/polling.py
+"""Next-poll hints for the polling/long-polling endpoints.
+
+Feed responses carry X-Poll-Interval (seconds): how long the client should
+wait before asking again. It grows with how long the conversation or
+classroom has been quiet (POLL_IDLE_DIVISOR seconds of silence per second
+of interval, clamped to [POLL_MIN_INTERVAL, POLL_MAX_INTERVAL]) and is
+stretched by this worker's load (load_shedder.pressure(): DB latency and
+requests in flight against their limits). Activity is learned from the same broadcasts that
+wake long-polls and SSE streams, so every worker sees it without a query.
+The browser side (adaptivePoll in static/index.js) also backs off on its
+own while responses come back empty and pauses while the tab is hidden.
+"""
+
+import threading
+import time
+
+from . import message_queue
+from .longpoll import NOTIFY_EVENT
+from .sse import PUBLISH_EVENT
+
+HEADER = 'X-Poll-Interval'
+
+
+class PollAdvisor:
+    def __init__(self, app=None, max_topics=10000):
+        self.app = None
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._activity = {}
+        self._started = time.monotonic()  # topics not seen since start count as active then
+        message_queue.on_server_event(NOTIFY_EVENT, self.touch)
+        message_queue.on_server_event(PUBLISH_EVENT, lambda record: self.touch(record['topic']))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('POLL_MIN_INTERVAL', 2.0)
+        app.config.setdefault('POLL_MAX_INTERVAL', 30.0)
+        app.config.setdefault('POLL_IDLE_DIVISOR', 10.0)
+        self.app = app
+        app.extensions['poll_advisor'] = self
+
+    def touch(self, topic):
+        """Record activity on `topic` (called for every feed wakeup and SSE event)."""
+        now = time.monotonic()
+        with self._lock:
+            self._activity[topic] = now
+            if len(self._activity) > self.max_topics:
+                cutoff = now - self.app.config['POLL_MAX_INTERVAL'] * self.app.config['POLL_IDLE_DIVISOR']
+                self._activity = {t: ts for t, ts in self._activity.items() if ts >= cutoff}
+
+    def interval(self, topic):
+        """Recommended seconds until the next poll of `topic`."""
+        config = self.app.config
+        low, high = config['POLL_MIN_INTERVAL'], config['POLL_MAX_INTERVAL']
+        with self._lock:
+            last = self._activity.get(topic, self._started)
+        idle = time.monotonic() - last
+        base = min(max(idle / config['POLL_IDLE_DIVISOR'], low), high)
+        shedder = self.app.extensions.get('load_shedder')
+        pressure = shedder.pressure() if shedder is not None else 0.0
+        return min(base * (1 + pressure), high)
+
+    def hint(self, response, topic):
+        response.headers[HEADER] = f'{self.interval(topic):.1f}'
+        return response
+
+
+poll_advisor = PollAdvisor()
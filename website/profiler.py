@@ -0,0 +1,251 @@
+# FILE: website/profiler.py
+"""On-demand request profiling, armed from /admin/profiler.
+
+A session profiles the next N requests (optionally only those for one
+endpoint) in the worker process that armed it, either with a statistical
+sampler (default; low overhead, yields collapsed stacks for flamegraph.pl or
+speedscope) or with cProfile (exact call counts, downloadable as a .prof
+file for snakeviz / pstats).
+
+The sampler reads sys._current_frames(), which holds one frame per OS
+thread. Under eventlet/gevent every request is a greenlet on the same OS
+thread, so samples could not be told apart; there only cProfile is offered
+(RequestProfiler.modes) and a warning is logged at startup.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+MODES = ('sample', 'cprofile')
+GREEN_ASYNC_MODES = ('eventlet', 'gevent')
+MAX_SESSIONS = 10
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ',')
+
+
+def _func_label(func):
+    filename, lineno, name = func
+    return f'{name} ({os.path.basename(filename)}:{lineno})'.replace(';', ',')
+
+
+class ProfileSession:
+    def __init__(self, count, endpoint=None, mode='sample', interval=0.005, max_seconds=300.0):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.endpoint = endpoint
+        self.requested = count
+        self.remaining = count
+        self.interval = interval
+        self.deadline = time.monotonic() + max_seconds
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.profiled = []
+        self.stacks = Counter()
+        self.stats = None
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+        if mode == 'sample':
+            self._sampler = threading.Thread(target=self._sample_loop, name=f'profiler-{self.id}', daemon=True)
+            self._sampler.start()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+    def claim(self, endpoint):
+        """Reserve a slot for a request to `endpoint`; True if it should be profiled."""
+        with self._lock:
+            if self.done or self.remaining <= 0:
+                return False
+            if self.endpoint and endpoint != self.endpoint:
+                return False
+            self.remaining -= 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.remaining += 1
+
+    def begin(self, endpoint):
+        with self._lock:
+            self._active[threading.get_ident()] = endpoint
+
+    def end(self, endpoint, duration, profile=None):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            self.profiled.append({'endpoint': endpoint, 'ms': round(duration * 1000, 2)})
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            if self.remaining <= 0 and not self._active:
+                self.finished_at = time.time()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            self.remaining = 0
+            if self.finished_at is None:
+                self.finished_at = time.time()
+
+    def _sample_loop(self):
+        while not self.done:
+            if self.expired():
+                self.cancel()
+                break
+            with self._lock:
+                active = dict(self._active)
+            if active:
+                frames = sys._current_frames()
+                for ident, endpoint in active.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if stack:
+                        stack.append(endpoint)
+                        with self._lock:
+                            self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format: 'root;child;leaf count' per line."""
+        if self.mode == 'sample':
+            with self._lock:
+                return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+        # cProfile only records caller/callee pairs: emit each edge as a two-frame
+        # stack weighted by the callee's own time (microseconds) under that caller
+        if self.stats is None:
+            return ''
+        weights = Counter()
+        for func, (cc, nc, tt, ct, callers) in self.stats.stats.items():
+            label = _func_label(func)
+            if not callers:
+                weights[label] += int(tt * 1_000_000)
+            for caller, caller_stats in callers.items():
+                weights[f'{_func_label(caller)};{label}'] += int(caller_stats[2] * 1_000_000)
+        return ''.join(f'{stack} {weight}\n' for stack, weight in sorted(weights.items()) if weight)
+
+    def prof_bytes(self):
+        """Marshalled pstats data (the format cProfile.Profile.dump_stats writes)."""
+        if self.stats is None:
+            return b''
+        return marshal.dumps(self.stats.stats)
+
+    def summary(self, limit=30):
+        if self.stats is None:
+            return ''
+        out = io.StringIO()
+        with self._lock:
+            self.stats.stream = out
+            self.stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'endpoint': self.endpoint,
+            'requested': self.requested,
+            'profiled': list(self.profiled),
+            'done': self.done,
+            'cancelled': self.cancelled,
+            'samples': sum(self.stacks.values()),
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.current = None
+        self.sessions = {}
+        self.modes = MODES
+        self._lock = threading.Lock()
+
+    def arm(self, count, endpoint=None, mode='sample', interval=0.005, max_seconds=300.0):
+        if mode not in self.modes:
+            raise ValueError(f"profiler mode '{mode}' is not available here")
+        with self._lock:
+            if self.current is not None and not self.current.done:
+                self.current.cancel()
+            session = ProfileSession(count, endpoint, mode, interval, max_seconds)
+            self.current = session
+            self.sessions[session.id] = session
+            while len(self.sessions) > MAX_SESSIONS:
+                del self.sessions[next(iter(self.sessions))]
+            return session
+
+    def cancel(self):
+        with self._lock:
+            if self.current is not None:
+                self.current.cancel()
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def _before_request(self):
+        session = self.current
+        if session is None or session.done:
+            return
+        if session.expired():
+            session.cancel()
+            return
+        endpoint = request.endpoint or 'unmatched'
+        # Never profile the profiler's own control routes
+        if endpoint.startswith('admin.profiler') or not session.claim(endpoint):
+            return
+        profile = None
+        if session.mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active in this interpreter (Python 3.12+)
+                session.release()
+                return
+        session.begin(endpoint)
+        g.profile_session = (session, profile, endpoint, time.perf_counter())
+
+    def _teardown_request(self, exc):
+        state = g.pop('profile_session', None)
+        if state is None:
+            return
+        session, profile, endpoint, started = state
+        if profile is not None:
+            profile.disable()
+        session.end(endpoint, time.perf_counter() - started, profile)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_MAX_REQUESTS', 1000)
+        app.config.setdefault('PROFILER_MAX_SECONDS', 300.0)
+        self.modes = MODES
+        if app.config.get('SOCKETIO_ASYNC_MODE') in GREEN_ASYNC_MODES:
+            self.modes = tuple(mode for mode in MODES if mode != 'sample')
+            app.logger.warning("Profiler: sampling is unavailable under %s (green threads share one OS thread); "
+                               "only cProfile sessions can be armed", app.config['SOCKETIO_ASYNC_MODE'])
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,232 @@
+# FILE: website/rate_limit.py
+"""Per-user token buckets for write endpoints and Socket.IO events.
+
+Every budgeted name (a view endpoint such as 'views.class_chat_send', or a
+Socket.IO event such as 'collab_submit') has a bucket per user of
+`capacity` tokens that refills at `rate` tokens per second. Each request
+or event takes one token; an empty bucket means HTTP 429 with Retry-After,
+or an ack of {'success': False, 'error': ..., 'retry_after': n} for events.
+Anonymous callers are bucketed by remote address.
+
+RATELIMIT_STORAGE_URL selects where buckets live:
+
+    None / ''                  this process only (default)
+    sqlite:///path/limits.db   shared by every worker on one host
+    redis://host:6379/0        shared across hosts (needs the `redis` package)
+
+If shared storage fails the request is let through; losing the limiter
+must not take the write path down with it.
+"""
+
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import jsonify, request
+from flask_login import current_user
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# name -> (capacity, refill per second)
+DEFAULT_BUDGETS = {
+    'views.class_chat_send': (10, 1.0),
+    'views.messages_send': (10, 1.0),
+    'views.add_comment': (5, 0.2),
+    'views.add_reaction': (20, 2.0),
+    'views.class_poll_vote': (5, 0.5),
+    'collab_join': (10, 1.0),
+    'collab_submit': (60, 20.0),  # one per flushed batch of keystrokes
+}
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryStorage:
+    """Buckets in a dict; the oldest are dropped past `max_keys`."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated)
+
+    def consume(self, key, capacity, rate, now):
+        """Take one token; (allowed, tokens left, seconds until the next token)."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)  # re-inserted, so dict order is least recently used first
+            if len(self._buckets) > self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+        return allowed, tokens, 0.0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteStorage:
+    """Buckets in a shared SQLite file, updated under BEGIN IMMEDIATE."""
+
+    def __init__(self, url):
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+            ' key TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' updated REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, rate, now):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*(row or (capacity, now)), now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                'INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens, 0.0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        self._connection().execute('DELETE FROM rate_limit_buckets')
+
+
+class RedisStorage:
+    """Buckets as Redis hashes, updated atomically by a Lua script."""
+
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATELIMIT_STORAGE_URL uses Redis but the 'redis' package is not installed")
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, rate, now):
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate, now])
+        tokens = float(tokens)
+        return bool(allowed), tokens, 0.0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+
+def make_storage(url):
+    if not url:
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url)
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStorage(url)
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL: {url}")
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.app = None
+        self.storage = MemoryStorage()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE_URL', os.environ.get('RATELIMIT_STORAGE_URL'))
+        app.config.setdefault('RATELIMIT_BUDGETS', dict(DEFAULT_BUDGETS))
+        self.app = app
+        self.storage = make_storage(app.config['RATELIMIT_STORAGE_URL'])
+        app.extensions['rate_limiter'] = self
+        app.before_request(self._before_request)
+
+    def _caller(self):
+        if current_user.is_authenticated:
+            return f'user:{current_user.get_id()}'
+        return f'ip:{request.remote_addr}'
+
+    def hit(self, name):
+        """Take a token from the caller's `name` bucket; None if allowed, else seconds to wait."""
+        config = self.app.config
+        budget = config['RATELIMIT_BUDGETS'].get(name)
+        if budget is None or not config['RATELIMIT_ENABLED']:
+            return None
+        capacity, rate = budget
+        try:
+            allowed, _, wait = self.storage.consume(f'{name}:{self._caller()}', capacity, rate, time.time())
+        except Exception:
+            logger.warning("Rate limit storage failed; allowing %s", name, exc_info=True)
+            return None
+        if allowed:
+            return None
+        registry.inc('rate_limited_total', {'name': name})
+        return wait
+
+    def _before_request(self):
+        wait = self.hit(request.endpoint)
+        if wait is None:
+            return None
+        response = jsonify(success=False, error="Too many requests, slow down")
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(wait + 0.999)))
+        return response
+
+    def limit_event(self, fn):
+        """Decorator for Socket.IO handlers: budgeted under the handler's event name."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            wait = self.hit(request.event['message'])
+            if wait is not None:
+                return {'success': False, 'error': "Too many requests, slow down",
+                        'retry_after': max(1, int(wait + 0.999))}
+            return fn(*args, **kwargs)
+        return wrapper
+
+
+rate_limiter = RateLimiter()
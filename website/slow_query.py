@@ -0,0 +1,138 @@
+# FILE: website/slow_query.py
+"""Slow SQL statement log.
+
+Set SLOW_QUERY_THRESHOLD_MS to log every statement slower than that as one
+JSON line in a rotating file (SLOW_QUERY_LOG_FILE, default
+instance/slow_queries.log): duration, statement, bound parameters, the Flask
+endpoint (or thread name outside requests) and the database's query plan.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+from . import instrumentation
+
+logger = logging.getLogger('website.slow_query')
+
+MAX_PARAM_LENGTH = 200
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with')
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        data = dict(getattr(record, 'payload', {}))
+        data.setdefault('message', record.getMessage())
+        return json.dumps(data, default=str)
+
+
+def _short(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + '…'
+    return value
+
+
+def _format_params(parameters):
+    if isinstance(parameters, dict):
+        return {k: _short(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_format_params(p) if isinstance(p, (dict, list, tuple)) else _short(p) for p in parameters]
+    return parameters
+
+
+def _origin():
+    if has_request_context():
+        return {'endpoint': request.endpoint, 'method': request.method, 'path': request.path}
+    return {'endpoint': None, 'thread': threading.current_thread().name}
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.threshold = None
+        self.explain = True
+        self.log_params = True
+        self._handler = None
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', None)
+        app.config.setdefault('SLOW_QUERY_LOG_FILE', os.path.join(app.instance_path, 'slow_queries.log'))
+        app.config.setdefault('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('SLOW_QUERY_LOG_BACKUPS', 5)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+        app.config.setdefault('SLOW_QUERY_LOG_PARAMS', True)
+
+        threshold = app.config['SLOW_QUERY_THRESHOLD_MS']
+        if threshold is None:
+            self.threshold = None  # the observer stays attached to the engine; keep it quiet
+            return
+        self.threshold = float(threshold) / 1000.0
+        self.explain = app.config['SLOW_QUERY_EXPLAIN']
+        self.log_params = app.config['SLOW_QUERY_LOG_PARAMS']
+
+        log_file = app.config['SLOW_QUERY_LOG_FILE']
+        if self._handler is None or self._handler.baseFilename != os.path.abspath(log_file):
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            if self._handler is not None:
+                logger.removeHandler(self._handler)
+                self._handler.close()
+            self._handler = RotatingFileHandler(
+                log_file,
+                maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'],
+                encoding='utf-8'
+            )
+            self._handler.setFormatter(JsonLineFormatter())
+            logger.addHandler(self._handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        instrumentation.add_query_observer(self._observe)
+
+    def _plan(self, conn, statement, parameters, executemany):
+        if not statement.lstrip().lower().startswith(EXPLAINABLE):
+            return None
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        # Raw DBAPI cursor: keeps the EXPLAIN out of the engine events
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            return [list(row) for row in cursor.fetchall()]
+        except Exception as exc:
+            return f'unavailable: {exc}'
+        finally:
+            cursor.close()
+
+    def _observe(self, conn, cursor, statement, parameters, executemany, elapsed):
+        if self.threshold is None or elapsed < self.threshold:
+            return
+        payload = {
+            'ts': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement,
+            'executemany': executemany,
+            **_origin(),
+        }
+        if self.log_params:
+            lowered = statement.lower()
+            if 'password' in lowered and not lowered.lstrip().startswith('select'):
+                payload['parameters'] = '<redacted>'
+            else:
+                payload['parameters'] = _format_params(parameters)
+        if self.explain:
+            started = time.perf_counter()
+            payload['plan'] = self._plan(conn, statement, parameters, executemany)
+            payload['explain_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info('slow query', extra={'payload': payload})
+
+
+slow_query_log = SlowQueryLog()
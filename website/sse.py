@@ -0,0 +1,151 @@
+# FILE: website/sse.py
+"""Server-Sent Events for read-only notifications.
+
+Writers publish small events to a topic (user:<id> for unread totals and
+comments on that user's notes, class:<id> for new class posts). Every
+worker appends them (via message_queue.broadcast) to an in-memory ring
+buffer of the last SSE_BUFFER_SIZE events, and each open /events stream
+forwards the ones for its user's topics.
+
+Event ids are microsecond timestamps taken by the publisher, so a browser
+reconnecting with Last-Event-ID (to any worker) resumes from the buffer.
+If the buffer no longer reaches back that far the stream sends `reset`
+and fresh snapshots instead; an open stream that falls more than a buffer
+behind sends `reset` and ends, so its reconnect does the same. Streams end after SSE_STREAM_SECONDS; the
+EventSource reconnects and resumes, which keeps a thread-per-connection
+server from pinning workers forever.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+from . import message_queue
+
+PUBLISH_EVENT = 'sse_publish'
+
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+
+def class_topic(class_id):
+    return f'class:{class_id}'
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _now_id():
+    return time.time_ns() // 1000
+
+
+class EventHub:
+    """Ring buffer of recent events plus a condition variable for the streams waiting on it."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events = deque(maxlen=1000)
+        self._seq = 0                 # local arrival counter; streams follow this, not ids
+        self._floor = _now_id()       # events with ids up to here may be missing from the buffer
+        self._last_issued = 0
+        self._closed = False
+        message_queue.on_server_event(PUBLISH_EVENT, self._append)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SSE_BUFFER_SIZE', 1000)
+        app.config.setdefault('SSE_STREAM_SECONDS', 300.0)
+        app.config.setdefault('SSE_HEARTBEAT_SECONDS', 15.0)
+        with self._lock:
+            self._events = deque(self._events, maxlen=app.config['SSE_BUFFER_SIZE'])
+            self._closed = False
+        app.extensions['event_hub'] = self
+
+    # ---------- publishing ----------
+
+    def publish(self, topic, event, data):
+        """Send `event` to every stream subscribed to `topic`, on every worker."""
+        with self._lock:
+            event_id = self._last_issued = max(self._last_issued + 1, _now_id())
+        message_queue.broadcast(PUBLISH_EVENT, {'id': event_id, 'topic': topic, 'event': event, 'data': data})
+
+    def _append(self, record):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._floor = max(self._floor, self._events[0][1]['id'])
+            self._seq += 1
+            self._events.append((self._seq, record))
+            self._changed.notify_all()
+
+    # ---------- streaming ----------
+
+    def resume(self, last_event_id):
+        """(cursor, backlog records, gap) for a stream starting after `last_event_id` (None: from now)."""
+        with self._lock:
+            if last_event_id is None:
+                return self._seq, [], False
+            backlog = [record for _, record in self._events if record['id'] > last_event_id]
+            return self._seq, backlog, last_event_id < self._floor
+
+    def wait(self, cursor, timeout):
+        """(records after `cursor`, new cursor, gap), blocking up to `timeout` for new records.
+
+        `gap` is true when the buffer wrapped past `cursor`, i.e. some records
+        after it were dropped before this stream read them.
+        """
+        with self._lock:
+            self._changed.wait_for(lambda: self._closed or self._seq > cursor, timeout)
+            if self._closed:
+                return None, cursor, False
+            gap = bool(self._events) and self._events[0][0] > cursor + 1
+            return [record for seq, record in self._events if seq > cursor], self._seq, gap
+
+    def wake_all(self):
+        """End every stream (used when a worker drains); browsers reconnect elsewhere."""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+
+    def stream(self, topics, cursor, backlog, snapshots, duration, heartbeat):
+        """Generator of SSE text: snapshots, then the backlog, then live events until `duration` passes."""
+        yield 'retry: 3000\n\n'
+        for event, data in snapshots:
+            yield format_event(event, data)
+        for record in backlog:
+            if record['topic'] in topics:
+                yield format_event(record['event'], record['data'], record['id'])
+
+        last_write = time.monotonic()
+        deadline = last_write + duration
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if now - last_write >= heartbeat:
+                yield ': keep-alive\n\n'
+                last_write = now
+            records, cursor, gap = self.wait(cursor, min(heartbeat - (now - last_write), deadline - now))
+            if records is None:
+                return
+            if gap:
+                # Events were lost while this client lagged; have it refetch and
+                # end the stream so the reconnect starts from fresh snapshots
+                yield format_event('reset', {})
+                return
+            for record in records:
+                if record['topic'] in topics:
+                    last_write = time.monotonic()
+                    yield format_event(record['event'], record['data'], record['id'])
+
+
+event_hub = EventHub()
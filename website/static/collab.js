@@ -0,0 +1,83 @@
+// -------------------- COLLABORATIVE EDITING --------------------
+// Sends Quill deltas to the server over Socket.IO and applies other editors'
+// deltas. Keeps at most one delta in flight; edits made while waiting for the
+// ack are buffered and composed, and incoming ops are transformed over both.
+(function () {
+  var noteId = window.COLLAB_NOTE_ID;
+  if (!noteId || typeof io === 'undefined' || typeof quill === 'undefined') return;
+
+  var Delta = Quill.import('delta');
+  var socket = io();
+  var rev = null;
+  var inflight = null;
+  var buffer = null;
+
+  function join() {
+    inflight = null;
+    buffer = null;
+    socket.emit('collab_join', { note_id: noteId }, function (res) {
+      if (!res || !res.success) return;
+      rev = res.rev;
+      window.collabConnected = true;
+      quill.setContents(new Delta(res.content), 'silent');
+      quill.enable(res.can_edit);
+    });
+  }
+
+  function flush() {
+    if (inflight || !buffer || rev === null) return;
+    inflight = buffer;
+    buffer = null;
+    socket.emit('collab_submit', { note_id: noteId, rev: rev, ops: inflight.ops }, function (res) {
+      if (res && res.retry_after) {
+        // Rate limited: put the delta back in front of newer edits and resend later
+        buffer = buffer ? inflight.compose(buffer) : inflight;
+        inflight = null;
+        setTimeout(flush, res.retry_after * 1000);
+        return;
+      }
+      if (!res || !res.success) {
+        // Rejected: our copy no longer matches the server's, so reload it (join() also
+        // clears inflight, without which every later flush() would bail out)
+        inflight = null;
+        if (!res || !res.resync) alert((res && res.error) || 'Your last edit could not be saved; reloading the note.');
+        join();
+        return;
+      }
+      rev = res.rev;
+      inflight = null;
+      flush();
+    });
+  }
+
+  quill.on('text-change', function (delta, oldDelta, source) {
+    if (source !== 'user') return;
+    buffer = buffer ? buffer.compose(delta) : delta;
+    flush();
+  });
+
+  socket.on('collab_op', function (msg) {
+    if (msg.note_id !== noteId || rev === null) return;
+    // Server ordered its op first, so our pending edits yield to it
+    var incoming = new Delta(msg.ops);
+    if (inflight) {
+      var next = inflight.transform(incoming, false);
+      inflight = incoming.transform(inflight, true);
+      incoming = next;
+    }
+    if (buffer) {
+      var nextBuffered = buffer.transform(incoming, false);
+      buffer = incoming.transform(buffer, true);
+      incoming = nextBuffered;
+    }
+    rev = msg.rev;
+    quill.updateContents(incoming, 'silent');
+  });
+
+  socket.on('collab_reset', function (msg) {
+    if (msg.note_id === noteId) join();
+  });
+
+  socket.on('connect', join);
+  socket.on('disconnect', function () { window.collabConnected = false; });
+})();
@@ -44,3 +44,193 @@ function react(noteId, type) {
     headers: { 'Content-Type': 'application/json' }
   }).then(() => { location.reload(); });
 }
+
+// -------------------- AUTOSAVE --------------------
+// Posts composed Quill deltas to the autosave endpoint after a short pause in
+// typing. The first save of a page load sends the whole document so the server
+// buffer starts from exactly what the editor holds. Skipped while the
+// collaborative socket (collab.js) is carrying the edits.
+(function () {
+  var form = document.getElementById('edit-note-form');
+  var url = form && form.getAttribute('data-autosave-url');
+  if (!url || typeof Quill === 'undefined') return;
+
+  var DEBOUNCE_MS = 1500;
+  var editor = null;
+  var pending = null;
+  var seq = null;
+  var timer = null;
+  var saving = false;
+
+  function payload() {
+    var body = seq === null
+      ? { full: true, ops: editor.getContents().ops }
+      : { seq: seq, ops: pending.ops };
+    body.length = editor.getLength();
+    return body;
+  }
+
+  function save() {
+    timer = null;
+    if (!pending || saving || window.collabConnected) return;
+    var body = payload();
+    var sent = pending;
+    pending = null;
+    saving = true;
+    fetch(url, {
+      method: 'POST',
+      body: JSON.stringify(body),
+      headers: { 'Content-Type': 'application/json' }
+    }).then(function (r) {
+      return r.json().then(function (data) { return { status: r.status, data: data }; });
+    }).then(function (res) {
+      saving = false;
+      if (res.data.success) {
+        seq = res.data.seq;
+      } else if (res.data.resync) {
+        seq = null;
+        pending = pending ? sent.compose(pending) : sent;
+      }
+      if (pending) schedule();
+    }).catch(function () {
+      saving = false;
+      pending = pending ? sent.compose(pending) : sent;
+      schedule();
+    });
+  }
+
+  function schedule() {
+    if (timer) clearTimeout(timer);
+    timer = setTimeout(save, DEBOUNCE_MS);
+  }
+
+  // Wait for the page's editor instance to be created
+  window.addEventListener('load', function () {
+    editor = Quill.find(document.getElementById('editor-container'));
+    if (!editor || !editor.on) return;
+    editor.on('text-change', function (delta, oldDelta, source) {
+      if (source !== 'user' || window.collabConnected) return;
+      pending = pending ? pending.compose(delta) : delta;
+      schedule();
+    });
+  });
+
+  window.addEventListener('beforeunload', function () {
+    if (!pending || window.collabConnected || !navigator.sendBeacon) return;
+    navigator.sendBeacon(url, new Blob([JSON.stringify(payload())], { type: 'application/json' }));
+  });
+
+  if (form) {
+    form.addEventListener('submit', function () { pending = null; });
+  }
+})();
+
+// -------------------- TAG AUTOCOMPLETE --------------------
+// Suggests existing tags for the last comma separated entry of a tags field.
+(function () {
+  var inputs = document.querySelectorAll('input[name="tags"]');
+  Array.prototype.forEach.call(inputs, function (input, i) {
+    var list = document.createElement('datalist');
+    list.id = 'tag-suggestions-' + i;
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.parentNode.appendChild(list);
+
+    var timer = null;
+    input.addEventListener('input', function () {
+      if (timer) clearTimeout(timer);
+      timer = setTimeout(function () {
+        var parts = input.value.split(',');
+        var prefix = parts.pop().trim();
+        if (!prefix) { list.innerHTML = ''; return; }
+        var head = parts.map(function (p) { return p.trim(); }).filter(Boolean);
+        fetch('/api/tags/autocomplete?q=' + encodeURIComponent(prefix))
+          .then(function (r) { return r.json(); })
+          .then(function (names) {
+            list.innerHTML = '';
+            names.forEach(function (name) {
+              var opt = document.createElement('option');
+              opt.value = head.concat([name]).join(', ');
+              list.appendChild(opt);
+            });
+          })
+          .catch(function () {});
+      }, 150);
+    });
+  });
+})();
+
+// -------------------- ADAPTIVE POLLING --------------------
+// load(wait) must return a Promise of {fresh: <got new data>, hint: <X-Poll-Interval seconds>}.
+// Polls again right away (long-poll) or after the hint when there was news, backs off
+// exponentially while responses stay empty, and pauses while the tab is hidden.
+// A long-poll that sat out its wait and came back empty re-issues after a short jitter;
+// only one that returned early (shed or not parked) falls back to the hint and backoff.
+function adaptivePoll(load, options) {
+  var opts = Object.assign({ wait: 0, min: 2, max: 30 }, options || {});
+  var backoff = 0, timer = null, running = false;
+
+  function schedule(seconds) {
+    clearTimeout(timer);
+    timer = setTimeout(tick, seconds * 1000);
+  }
+
+  function tick() {
+    timer = null;
+    if (document.hidden) return;  // resumed by visibilitychange
+    running = true;
+    var started = Date.now();
+    load(opts.wait).then(function (res) {
+      running = false;
+      if (res.fresh) {
+        backoff = 0;
+        schedule(opts.wait ? 0 : (res.hint || opts.min));
+        return;
+      }
+      if (opts.wait && Date.now() - started >= opts.wait * 500) {
+        backoff = 0;
+        schedule(Math.random());
+        return;
+      }
+      backoff = Math.min(backoff ? backoff * 2 : opts.min, opts.max);
+      schedule(Math.max(res.hint || 0, backoff));
+    }, function (err) {
+      running = false;
+      console.error('poll error', err);
+      backoff = Math.min(Math.max(backoff * 2, 4), opts.max);
+      schedule(backoff);
+    });
+  }
+
+  document.addEventListener('visibilitychange', function () {
+    if (!document.hidden && !running) {
+      backoff = 0;
+      schedule(0);
+    }
+  });
+  tick();
+
+  return {
+    // call after local activity (e.g. sending) to poll promptly again
+    kick: function () {
+      backoff = 0;
+      if (!running) schedule(0);
+    }
+  };
+}
+
+function pollHint(response) {
+  return parseFloat(response.headers.get('X-Poll-Interval')) ||
+         parseFloat(response.headers.get('Retry-After')) || 0;
+}
+
+// fetch() for pollers: resolves to {data, hint}; data is null when the server shed the
+// request (503/429 with Retry-After), which adaptivePoll treats like an empty poll.
+function pollFetch(url) {
+  return fetch(url).then(function (r) {
+    var hint = pollHint(r);
+    if (r.status === 503 || r.status === 429) return { data: null, hint: hint };
+    if (!r.ok) throw new Error('HTTP ' + r.status);
+    return r.json().then(function (data) { return { data: data, hint: hint }; });
+  });
+}
@@ -0,0 +1,85 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy import select
+
+from .models import Tag, UserTagCount
+from .tags import tag_index, retag_user_notes, merge_tags, normalize_tag_names
+from . import db
+
+tag_api = Blueprint('tag_api', __name__)
+
+MAX_AUTOCOMPLETE = 25
+MAX_COUNTS = 200
+
+
+# -------------------- AUTOCOMPLETE --------------------
+@tag_api.route('/autocomplete')
+@login_required
+def autocomplete():
+    prefix = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int) or 10, MAX_AUTOCOMPLETE)
+    if not prefix:
+        return jsonify([])
+    return jsonify(tag_index.search(prefix, limit))
+
+
+# -------------------- COUNTS --------------------
+@tag_api.route('/counts')
+@login_required
+def counts():
+    """Tag usage counts, for the current user (default) or across all notes (?scope=global)."""
+    scope = request.args.get('scope', 'user')
+    limit = min(request.args.get('limit', 50, type=int) or 50, MAX_COUNTS)
+
+    if scope == 'global':
+        rows = db.session.execute(
+            select(Tag.name, Tag.note_count)
+            .where(Tag.note_count > 0)
+            .order_by(Tag.note_count.desc(), Tag.name.asc())
+            .limit(limit)
+        ).all()
+    else:
+        rows = db.session.execute(
+            select(Tag.name, UserTagCount.count)
+            .join(UserTagCount, UserTagCount.tag_id == Tag.id)
+            .where(UserTagCount.user_id == current_user.id, UserTagCount.count > 0)
+            .order_by(UserTagCount.count.desc(), Tag.name.asc())
+            .limit(limit)
+        ).all()
+    return jsonify([{'name': name, 'count': count} for name, count in rows])
+
+
+# -------------------- BULK RETAG / MERGE --------------------
+def _retag_args():
+    data = request.get_json() or {}
+    sources = normalize_tag_names(data.get('from') or [])
+    target = (data.get('to') or '').strip()
+    return sources, target
+
+
+@tag_api.route('/retag', methods=['POST'])
+@login_required
+def retag():
+    """Replace tags on the current user's notes: {"from": [...], "to": "name"}."""
+    sources, target = _retag_args()
+    if not sources or not target:
+        return jsonify(success=False, error="'from' and 'to' are required"), 400
+
+    moved = retag_user_notes(current_user.id, sources, target)
+    db.session.commit()
+    return jsonify(success=True, moved=moved)
+
+
+@tag_api.route('/merge', methods=['POST'])
+@login_required
+def merge():
+    """Merge tags globally and delete the sources (admins only)."""
+    if not current_user.is_admin:
+        return jsonify(success=False, error="Administrators only"), 403
+    sources, target = _retag_args()
+    if not sources or not target:
+        return jsonify(success=False, error="'from' and 'to' are required"), 400
+
+    moved = merge_tags(sources, target)
+    db.session.commit()
+    return jsonify(success=True, moved=moved)
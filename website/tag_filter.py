@@ -0,0 +1,160 @@
+# FILE: website/tag_filter.py
+"""Tag filtering for a user's notes.
+
+AND filters are driven from the user's rarest requested tag (per-user counts
+in UserTagCount) through the (tag_id, note_id) index on tags_notes; every
+other tag becomes an indexed EXISTS probe on those candidates only. OR
+filters are a single IN over the same index.
+
+A free-text query (?q=) additionally matches the title, the body or the
+text extracted from an attachment (NoteAttachment.extracted_text, filled
+in by website/attachments.py). It is a LIKE scan over the rows the tag
+filter leaves, which is fine for one user's notes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select, func, exists, or_
+from sqlalchemy.orm import selectinload
+
+from . import db
+from .metrics import registry
+from .models import Note, NoteAttachment, Tag, UserTagCount, tags_notes_association
+from .tags import normalize_tag_names, tag_generation
+
+FACET_TTL = 60.0
+FACET_CACHE_SIZE = 1024
+
+
+def _user_tag_counts(user_id, names):
+    """{name: (tag_id, count)} for tags the user actually has."""
+    rows = db.session.execute(
+        select(Tag.name, Tag.id, UserTagCount.count)
+        .join(UserTagCount, UserTagCount.tag_id == Tag.id)
+        .where(UserTagCount.user_id == user_id, Tag.name.in_(names), UserTagCount.count > 0)
+    ).all()
+    return {name: (tag_id, count) for name, tag_id, count in rows}
+
+
+def filtered_notes_query(user_id, names, mode='and'):
+    """Return a Note query for the user's notes matching `names`, or None if nothing can match."""
+    assoc = tags_notes_association
+    query = Note.query.filter(Note.user_id == user_id)
+    if not names:
+        return query
+
+    counts = _user_tag_counts(user_id, names)
+    if mode == 'or':
+        tag_ids = [tag_id for tag_id, _ in counts.values()]
+        if not tag_ids:
+            return None
+        return query.filter(Note.id.in_(select(assoc.c.note_id).where(assoc.c.tag_id.in_(tag_ids))))
+
+    if len(counts) < len(names):
+        # A tag the user never used: the intersection is empty
+        return None
+    ordered = sorted(counts.values(), key=lambda pair: pair[1])
+    rarest_id = ordered[0][0]
+    query = query.join(assoc, (assoc.c.note_id == Note.id) & (assoc.c.tag_id == rarest_id))
+    for tag_id, _ in ordered[1:]:
+        probe = assoc.alias()
+        query = query.filter(exists().where(probe.c.tag_id == tag_id, probe.c.note_id == Note.id))
+    return query
+
+
+def text_condition(text):
+    """Notes whose title, content or attachment text contains `text` (case-insensitive)."""
+    pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return or_(
+        Note.title.ilike(pattern, escape='\\'),
+        Note.content.ilike(pattern, escape='\\'),
+        exists().where(NoteAttachment.note_id == Note.id,
+                       NoteAttachment.extracted_text.ilike(pattern, escape='\\')),
+    )
+
+
+def filter_user_notes(user_id, raw_tags, mode='and', page=1, per_page=24, text=''):
+    """Paginated notes for `user_id` filtered by tags and text; returns (pagination or None, names)."""
+    names = normalize_tag_names(raw_tags)
+    mode = 'or' if mode == 'or' else 'and'
+    query = filtered_notes_query(user_id, names, mode)
+    if query is None:
+        return None, names
+    if text:
+        query = query.filter(text_condition(text))
+    query = query.options(selectinload(Note.tags)).order_by(Note.pinned.desc(), Note.date.desc())
+    return query.paginate(page=page, per_page=per_page, error_out=False), names
+
+
+# ---------- facets ----------
+
+class _FacetCache:
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                registry.inc('cache_requests_total', {'cache': 'facets', 'result': 'hit'})
+                return hit[0]
+        registry.inc('cache_requests_total', {'cache': 'facets', 'result': 'miss'})
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + FACET_TTL)
+            self._entries.move_to_end(key)
+            while len(self._entries) > FACET_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+
+_facet_cache = _FacetCache()
+
+
+def facet_counts(user_id, names=(), mode='and', limit=30, text=''):
+    """[(tag name, count)] over the user's notes that match the current filter and search."""
+    # Search matches also depend on titles and bodies, which tag generations
+    # don't follow, so only tag-filtered facets are cached
+    key = None if text else (user_id, tag_generation(user_id), tuple(sorted(names)), mode, limit)
+    if key is not None:
+        cached = _facet_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if not names and not text:
+        # Unfiltered facets are exactly the incrementally maintained per-user counts
+        rows = db.session.execute(
+            select(Tag.name, UserTagCount.count)
+            .join(UserTagCount, UserTagCount.tag_id == Tag.id)
+            .where(UserTagCount.user_id == user_id, UserTagCount.count > 0)
+            .order_by(UserTagCount.count.desc(), Tag.name.asc())
+            .limit(limit)
+        ).all()
+    else:
+        query = filtered_notes_query(user_id, list(names), mode)
+        if query is not None and text:
+            query = query.filter(text_condition(text))
+        if query is None:
+            rows = []
+        else:
+            assoc = tags_notes_association
+            matching = query.with_entities(Note.id).subquery()
+            rows = db.session.execute(
+                select(Tag.name, func.count())
+                .select_from(assoc)
+                .join(Tag, Tag.id == assoc.c.tag_id)
+                .where(assoc.c.note_id.in_(select(matching.c.id)))
+                .group_by(Tag.name)
+                .order_by(func.count().desc(), Tag.name.asc())
+                .limit(limit)
+            ).all()
+
+    result = [(name, count) for name, count in rows]
+    if key is not None:
+        _facet_cache.put(key, result)
+    return result
@@ -0,0 +1,410 @@
+# FILE: website/tags.py
+"""Bulk tag resolution, incremental tag counts and an in-memory name index.
+
+Resolving a note's tags costs at most one SELECT ... IN and one
+INSERT ... ON CONFLICT DO NOTHING, regardless of how many tags it has;
+when every name is cached it costs nothing. New ids only enter the cache
+once their transaction commits, so a rollback can't leave stale ids behind.
+Deleted (merged) tags are dropped from every worker's cache and index
+through message_queue.broadcast, since their ids no longer exist; tag
+generation bumps travel the same way once their transaction commits.
+"""
+
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, select, insert, delete, update, func
+from sqlalchemy.exc import IntegrityError
+
+from . import db, message_queue
+from .metrics import registry
+from .models import Note, Tag, UserTagCount, tags_notes_association
+
+MAX_TAG_LENGTH = 50
+MAX_TAGS_PER_NOTE = 50
+DELETED_EVENT = 'tags_deleted'
+GENERATION_EVENT = 'tag_generations'
+
+
+class TagCache:
+    def __init__(self, ttl=300.0, max_size=200_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for name in names:
+                hit = self._ids.get(name)
+                if hit and hit[1] > now:
+                    found[name] = hit[0]
+        if names:
+            registry.inc('cache_requests_total', {'cache': 'tag_ids', 'result': 'hit'}, len(found))
+            registry.inc('cache_requests_total', {'cache': 'tag_ids', 'result': 'miss'}, len(names) - len(found))
+        return found
+
+    def put_many(self, mapping):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if len(self._ids) + len(mapping) > self.max_size:
+                self._ids.clear()
+            for name, tag_id in mapping.items():
+                self._ids[name] = (tag_id, expires)
+
+    def forget(self, names=None):
+        with self._lock:
+            if names is None:
+                self._ids.clear()
+            else:
+                for name in names:
+                    self._ids.pop(name, None)
+
+
+class TagIndex:
+    """Sorted, case-insensitive list of every tag name for prefix lookups.
+
+    Built from the database on first use and rebuilt after `ttl` seconds so
+    tags created by other workers show up; tags created in this process are
+    added as soon as they commit.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._entries = []      # sorted (casefolded name, name)
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_built(self):
+        now = time.monotonic()
+        if self._built_at is not None and now - self._built_at < self.ttl:
+            return
+        names = db.session.execute(select(Tag.name)).scalars().all()
+        entries = sorted((n.casefold(), n) for n in names)
+        with self._lock:
+            self._entries = entries
+            self._built_at = now
+
+    def search(self, prefix, limit=10):
+        self._ensure_built()
+        key = prefix.casefold()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (key,))
+            out = []
+            while i < len(self._entries) and len(out) < limit and self._entries[i][0].startswith(key):
+                out.append(self._entries[i][1])
+                i += 1
+        return out
+
+    def add(self, names):
+        with self._lock:
+            if self._built_at is None:
+                return
+            for name in names:
+                entry = (name.casefold(), name)
+                i = bisect.bisect_left(self._entries, entry)
+                if i == len(self._entries) or self._entries[i] != entry:
+                    self._entries.insert(i, entry)
+
+    def remove(self, names):
+        with self._lock:
+            for name in names:
+                entry = (name.casefold(), name)
+                i = bisect.bisect_left(self._entries, entry)
+                if i < len(self._entries) and self._entries[i] == entry:
+                    del self._entries[i]
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+
+tag_cache = TagCache()
+tag_index = TagIndex()
+
+# Bumped on every worker whenever a user's note/tag associations change, so
+# derived caches (e.g. facet counts in website/tag_filter.py) can tell they
+# are stale.
+_user_generations = {}
+_global_generation = [0]
+
+
+def tag_generation(user_id):
+    return (_global_generation[0], _user_generations.get(user_id, 0))
+
+
+def _bump_generation(user_id=None):
+    """Mark `user_id`'s (None: everyone's) derived caches stale once this transaction commits."""
+    db.session.info.setdefault('stale_tag_generations', set()).add(user_id)
+
+
+def _advance_generations(user_ids, everyone):
+    if everyone:
+        _global_generation[0] += 1
+    for user_id in user_ids:
+        _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+
+
+message_queue.on_server_event(GENERATION_EVENT, _advance_generations)
+
+
+def normalize_tag_names(raw):
+    """Split/strip/dedupe tag input (a comma separated string or an iterable)."""
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    names, seen = [], set()
+    for name in raw or ():
+        name = (name or '').strip()[:MAX_TAG_LENGTH]
+        if name and name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names[:MAX_TAGS_PER_NOTE]
+
+
+def _dialect_insert():
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+    return dialect_insert
+
+
+def _insert_ignore(rows):
+    dialect_insert = _dialect_insert()
+    if dialect_insert is not None:
+        stmt = dialect_insert(Tag.__table__).values(rows).on_conflict_do_nothing(index_elements=['name'])
+        db.session.execute(stmt)
+        return
+
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Tag.__table__).values(row))
+        except IntegrityError:
+            pass  # another transaction created it first
+
+
+def resolve_tag_ids(names):
+    """Return {name: tag_id} for `names`, creating missing tags. Caller commits."""
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+
+    ids = tag_cache.get_many(names)
+    missing = [n for n in names if n not in ids]
+    if missing:
+        rows = db.session.execute(
+            select(Tag.id, Tag.name).where(Tag.name.in_(missing))
+        ).all()
+        loaded = {name: tag_id for tag_id, name in rows}
+        tag_cache.put_many(loaded)
+        ids.update(loaded)
+
+        to_create = [n for n in missing if n not in loaded]
+        if to_create:
+            _insert_ignore([{'name': n} for n in to_create])
+            rows = db.session.execute(
+                select(Tag.id, Tag.name).where(Tag.name.in_(to_create))
+            ).all()
+            created = {name: tag_id for tag_id, name in rows}
+            ids.update(created)
+            db.session.info.setdefault('pending_tag_ids', {}).update(created)
+
+    return {n: ids[n] for n in names if n in ids}
+
+
+# ---------- counts ----------
+
+def _adjust_counts(user_id, tag_ids, delta):
+    """Add `delta` to the global and per-user counts of `tag_ids`."""
+    tag_ids = list(tag_ids)
+    db.session.execute(
+        update(Tag).where(Tag.id.in_(tag_ids)).values(note_count=Tag.note_count + delta)
+    )
+    if user_id is None:
+        return
+    _bump_generation(user_id)
+
+    dialect_insert = _dialect_insert()
+    if delta > 0 and dialect_insert is not None:
+        stmt = dialect_insert(UserTagCount.__table__).values(
+            [{'user_id': user_id, 'tag_id': t, 'count': delta} for t in tag_ids]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'tag_id'],
+            set_={'count': UserTagCount.__table__.c.count + stmt.excluded['count']}
+        )
+        db.session.execute(stmt)
+        return
+
+    existing = set(db.session.execute(
+        select(UserTagCount.tag_id).where(UserTagCount.user_id == user_id, UserTagCount.tag_id.in_(tag_ids))
+    ).scalars())
+    if existing:
+        db.session.execute(
+            update(UserTagCount)
+            .where(UserTagCount.user_id == user_id, UserTagCount.tag_id.in_(existing))
+            .values(count=UserTagCount.count + delta)
+        )
+    new = [t for t in tag_ids if t not in existing]
+    if new and delta > 0:
+        db.session.execute(insert(UserTagCount), [{'user_id': user_id, 'tag_id': t, 'count': delta} for t in new])
+
+
+def recount_tags(tag_ids):
+    """Recompute global and per-user counts for `tag_ids` from tags_notes (set-based)."""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    _bump_generation()
+    assoc = tags_notes_association
+    db.session.execute(
+        update(Tag).where(Tag.id.in_(tag_ids)).values(
+            note_count=select(func.count()).select_from(assoc).where(assoc.c.tag_id == Tag.id).scalar_subquery()
+        )
+    )
+    db.session.execute(delete(UserTagCount).where(UserTagCount.tag_id.in_(tag_ids)))
+    db.session.execute(
+        insert(UserTagCount).from_select(
+            ['user_id', 'tag_id', 'count'],
+            select(Note.user_id, assoc.c.tag_id, func.count())
+            .join(Note, Note.id == assoc.c.note_id)
+            .where(assoc.c.tag_id.in_(tag_ids), Note.user_id.is_not(None))
+            .group_by(Note.user_id, assoc.c.tag_id)
+        )
+    )
+
+
+# ---------- note tagging ----------
+
+def set_note_tags(note, names, existing=True):
+    """Replace a (flushed) note's tags using set-based association writes. Caller commits.
+
+    Pass existing=False for a note created in this transaction to skip reading its
+    current tags.
+    """
+    wanted = set(resolve_tag_ids(names).values())
+    assoc = tags_notes_association
+    current = set()
+    if existing:
+        current = set(db.session.execute(
+            select(assoc.c.tag_id).where(assoc.c.note_id == note.id)
+        ).scalars())
+
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        db.session.execute(
+            delete(assoc).where(assoc.c.note_id == note.id, assoc.c.tag_id.in_(removed))
+        )
+        _adjust_counts(note.user_id, removed, -1)
+    if added:
+        db.session.execute(insert(assoc), [{'note_id': note.id, 'tag_id': t} for t in added])
+        _adjust_counts(note.user_id, added, 1)
+    if removed or added:
+        # The ORM collection no longer matches the table
+        db.session.expire(note, ['tags'])
+    return wanted
+
+
+def _move_associations(source_ids, target_id, user_id=None):
+    """Point tags_notes rows from `source_ids` at `target_id` (optionally only one user's notes)."""
+    assoc = tags_notes_association
+    note_filter = []
+    if user_id is not None:
+        note_filter.append(assoc.c.note_id.in_(select(Note.id).where(Note.user_id == user_id)))
+
+    moving = (
+        select(assoc.c.note_id, db.literal(target_id))
+        .where(assoc.c.tag_id.in_(source_ids), *note_filter)
+        .distinct()
+    )
+    dialect_insert = _dialect_insert()
+    if dialect_insert is not None:
+        stmt = dialect_insert(assoc).from_select(['note_id', 'tag_id'], moving).on_conflict_do_nothing()
+    else:
+        already = select(assoc.c.note_id).where(assoc.c.tag_id == target_id)
+        stmt = insert(assoc).from_select(['note_id', 'tag_id'], moving.where(assoc.c.note_id.not_in(already)))
+    db.session.execute(stmt)
+    result = db.session.execute(delete(assoc).where(assoc.c.tag_id.in_(source_ids), *note_filter))
+    return result.rowcount
+
+
+def retag_user_notes(user_id, source_names, target_name):
+    """Replace `source_names` with `target_name` on one user's notes. Returns rows moved."""
+    target_name = (target_name or '').strip()[:MAX_TAG_LENGTH]
+    target_id = resolve_tag_ids([target_name]).get(target_name)
+    sources = {n: i for n, i in resolve_existing_tag_ids(source_names).items() if i != target_id}
+    if not sources or target_id is None:
+        return 0
+    moved = _move_associations(list(sources.values()), target_id, user_id=user_id)
+    recount_tags(list(sources.values()) + [target_id])
+    return moved
+
+
+def merge_tags(source_names, target_name):
+    """Fold `source_names` into `target_name` everywhere and delete the source tags."""
+    target_name = (target_name or '').strip()[:MAX_TAG_LENGTH]
+    target_id = resolve_tag_ids([target_name]).get(target_name)
+    sources = {n: i for n, i in resolve_existing_tag_ids(source_names).items() if i != target_id}
+    if not sources or target_id is None:
+        return 0
+    source_ids = list(sources.values())
+    moved = _move_associations(source_ids, target_id)
+    db.session.execute(delete(UserTagCount).where(UserTagCount.tag_id.in_(source_ids)))
+    db.session.execute(delete(Tag).where(Tag.id.in_(source_ids)))
+    recount_tags([target_id])
+    db.session.info.setdefault('deleted_tag_names', set()).update(sources)
+    return moved
+
+
+def resolve_existing_tag_ids(names):
+    """Like resolve_tag_ids, but never creates tags."""
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+    rows = db.session.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names))).all()
+    return {name: tag_id for tag_id, name in rows}
+
+
+# ---------- session hooks ----------
+
+@event.listens_for(db.session, 'after_commit')
+def _cache_committed_tags(session):
+    created = session.info.pop('pending_tag_ids', None)
+    if created:
+        tag_cache.put_many(created)
+        tag_index.add(created)
+    deleted = session.info.pop('deleted_tag_names', None)
+    if deleted:
+        message_queue.broadcast(DELETED_EVENT, sorted(deleted))
+    stale = session.info.pop('stale_tag_generations', None)
+    if stale:
+        message_queue.broadcast(GENERATION_EVENT, sorted(u for u in stale if u is not None), None in stale)
+
+
+def _forget_deleted_tags(names):
+    tag_cache.forget(names)
+    tag_index.remove(names)
+
+
+message_queue.on_server_event(DELETED_EVENT, _forget_deleted_tags)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_rolled_back_tags(session):
+    session.info.pop('pending_tag_ids', None)
+    session.info.pop('deleted_tag_names', None)
+    session.info.pop('stale_tag_generations', None)
+
+
+def init_app(app):
+    app.config.setdefault('TAG_CACHE_TTL', 300.0)
+    tag_cache.ttl = app.config['TAG_CACHE_TTL']
+    tag_index.ttl = app.config['TAG_CACHE_TTL']
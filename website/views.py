@@ -1,11 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory, Response
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import func, insert, delete
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
-from .models import Note, Tag, ClassRoom, ClassPost, Message, User, Comment, Reaction, ClassChatMessage, Poll, PollOption, PollVote, NoteAttachment
+from .models import Note, ClassRoom, ClassPost, Message, User, Comment, Reaction, ClassChatMessage, Poll, PollOption, PollVote, NoteAttachment, classroom_students
 from . import db
+from .attachments import attachment_processor, upload_dir
+from . import history, collab
+from . import delta as ot
+from .autosave import autosave_buffer, AutosaveConflict
+from .tags import set_note_tags
+from .tag_filter import filter_user_notes, facet_counts
+from .metrics import registry
+from .longpoll import feed_notifier, dm_topic, class_chat_topic, wait_seconds
+from .sse import event_hub, user_topic, class_topic
+from .polling import poll_advisor
+from .load_shedding import load_shedder
+from .membership import membership_cache, is_enrolled, can_access_classroom
 import uuid
 import json
 
@@ -31,9 +44,26 @@ def inject_unread_message_count():
     return {'unread_messages': count}
 
 
-def _emit_unread_count(user_id: int):
-    """Broadcast unread count to a user's personal room."""
-    count = Message.query.filter_by(receiver_id=user_id, is_read=False).count()
+def _long_poll(topic, fetch):
+    """fetch(); when it is empty and the client sent ?wait=, park until `topic` moves and fetch again."""
+    wait = wait_seconds(request, current_app)
+    version = feed_notifier.version(topic)
+    rows = fetch()
+    if rows or not wait:
+        return rows
+    db.session.close()  # don't hold a pooled connection while parked
+    with load_shedder.parked():
+        moved = feed_notifier.wait(topic, version, wait)
+    if moved:
+        rows = fetch()
+    return rows
+
+
+def _emit_unread_count(user_id: int, count=None):
+    """Push a user's unread total to their event streams."""
+    if count is None:
+        count = Message.query.filter_by(receiver_id=user_id, is_read=False).count()
+    event_hub.publish(user_topic(user_id), 'unread', {'total': count})
     return count
 
 
@@ -66,8 +96,20 @@ def home():
 @views.route('/my-notes')
 @login_required
 def my_notes():
-    notes = Note.query.filter_by(user_id=current_user.id).order_by(Note.date.desc()).all()
-    return render_template('my_notes.html', user_notes=notes, user=current_user)
+    mode = request.args.get('mode', 'and')
+    page = request.args.get('page', 1, type=int)
+    q = (request.args.get('q') or '').strip()[:200]
+    pagination, selected = filter_user_notes(current_user.id, request.args.get('tags', ''), mode, page, text=q)
+    return render_template(
+        'my_notes.html',
+        user_notes=pagination.items if pagination else [],
+        pagination=pagination,
+        selected_tags=selected,
+        mode=mode,
+        q=q,
+        facets=facet_counts(current_user.id, selected, mode, text=q),
+        user=current_user
+    )
 
 
 # --------- CREATE NOTE ---------
@@ -78,7 +120,7 @@ def create_note():
     if request.method == 'POST':
         data = request.form.get('note')
         title = request.form.get('title', 'Untitled')
-        tags_list = request.form.get('tags', '').split(',')
+        tags_list = request.form.get('tags', '')
         is_public = bool(request.form.get('is_public'))
         pinned = bool(request.form.get('pinned'))
         upload = request.files.get('attachment')
@@ -95,16 +137,10 @@ def create_note():
                 pinned=pinned
             )
 
-            for t in tags_list:
-                t = t.strip()
-                if t:
-                    tag = Tag.query.filter_by(name=t).first()
-                    if not tag:
-                        tag = Tag(name=t)
-                        db.session.add(tag)
-                    new_note.tags.append(tag)
-
             db.session.add(new_note)
+            db.session.flush()
+            set_note_tags(new_note, tags_list, existing=False)
+            history.record_version(new_note)
             db.session.commit()
 
             if upload and upload.filename:
@@ -143,14 +179,22 @@ def edit_note_page(note_id):
         return redirect(url_for('views.my_notes'))
 
     if request.method == "POST":
+        previous_content = note.content
         note.title = request.form.get("title")
-        note.content = request.form.get("content")
+        # edit_note.html posts the Quill HTML as "note"
+        note.content = request.form.get("note") or request.form.get("content") or previous_content
         note.is_public = bool(request.form.get("is_public"))
         upload = request.files.get('attachment')
 
+        if 'tags' in request.form:
+            set_note_tags(note, request.form.get('tags', ''))
+
         if upload and upload.filename:
             _save_note_attachment(note, upload)
 
+        history.record_version(note, previous_content=previous_content)
+        collab.reset_document(note)
+        autosave_buffer.discard(note.id)
         db.session.commit()
         flash("Note updated successfully!", "success")
         return redirect(url_for('views.my_notes'))
@@ -158,6 +202,48 @@ def edit_note_page(note_id):
     return render_template("edit_note.html", note=note)
 
 
+@views.route('/note/<int:note_id>/autosave', methods=['POST'])
+@login_required
+def autosave_note(note_id):
+    """Accept a Quill delta from the editor; persisted by the write-behind buffer."""
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return jsonify(success=False, error="Not allowed"), 403
+
+    data = request.get_json(silent=True) or {}
+    ops = ot.validate(data.get('ops'))
+    if ops is None:
+        return jsonify(success=False, error="Malformed delta"), 400
+
+    try:
+        seq = autosave_buffer.submit(note, data.get('seq'), ops, bool(data.get('full')), data.get('length'))
+    except AutosaveConflict:
+        return jsonify(success=False, resync=True), 409
+    return jsonify(success=True, seq=seq)
+
+# --------- NOTE HISTORY API ---------
+
+@views.route('/note/<int:note_id>/history')
+@login_required
+def note_history(note_id):
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return jsonify(success=False, error="Not allowed"), 403
+    return jsonify(success=True, versions=history.list_versions(note.id))
+
+
+@views.route('/note/<int:note_id>/history/<int:version>')
+@login_required
+def note_history_version(note_id, version):
+    note = Note.query.get_or_404(note_id)
+    if note.user_id != current_user.id:
+        return jsonify(success=False, error="Not allowed"), 403
+    content = history.get_version_content(note.id, version)
+    if content is None:
+        return jsonify(success=False, error="Version not found"), 404
+    return jsonify(success=True, version=version, content=content)
+
+
 # --------- COMMENTS API ---------
 
 @views.route('/add-comment', methods=['POST'])
@@ -192,7 +278,13 @@ def add_comment():
         content=content
     )
     db.session.add(new_comment)
+    db.session.flush()
+    owner_id = note.user_id if note.user_id != current_user.id else None
+    event = {'note_id': note.id, 'note_title': note.title, 'comment_id': new_comment.id,
+             'author': current_user.first_name or current_user.email}
     db.session.commit()
+    if owner_id is not None:
+        event_hub.publish(user_topic(owner_id), 'comment', event)
 
     return jsonify(
         success=True,
@@ -254,7 +346,7 @@ def classes():
 @login_required
 def class_feed(class_id):
     classroom = ClassRoom.query.get_or_404(class_id)
-    if (current_user not in classroom.students) and (current_user.id != classroom.teacher_id) and (not current_user.is_admin):
+    if not can_access_classroom(current_user, classroom):
         flash('Access Denied to this class', category='danger')
         return redirect(url_for('views.home'))
 
@@ -266,11 +358,13 @@ def class_feed(class_id):
 @login_required
 def class_chat(class_id):
     classroom = ClassRoom.query.get_or_404(class_id)
-    if (current_user not in classroom.students) and (current_user.id != classroom.teacher_id) and (not current_user.is_admin):
+    if not can_access_classroom(current_user, classroom):
         flash('Access Denied to this class', category='danger')
         return redirect(url_for('views.home'))
 
+    # Authors are no longer in the identity map from loading the roster, so fetch them in one go
     chat_messages = ClassChatMessage.query.filter_by(classroom_id=classroom.id)\
+        .options(selectinload(ClassChatMessage.user))\
         .order_by(ClassChatMessage.timestamp.asc()).limit(200).all()
     polls = Poll.query.filter_by(classroom_id=classroom.id).order_by(Poll.timestamp.desc()).limit(10).all()
 
@@ -324,6 +418,7 @@ def messages(user_id):
             changed = True
     if changed:
         db.session.commit()
+        _emit_unread_count(current_user.id)
 
     return render_template(
         'messages.html',
@@ -352,6 +447,8 @@ def messages_send(user_id):
     )
     db.session.add(msg)
     db.session.commit()
+    feed_notifier.notify(dm_topic(msg.sender_id, msg.receiver_id))
+    _emit_unread_count(msg.receiver_id)
 
     return jsonify(
         success=True,
@@ -368,32 +465,40 @@ def messages_send(user_id):
 @views.route('/messages/<int:user_id>/feed', methods=['GET'])
 @login_required
 def messages_feed(user_id):
-    """HTTP pollable feed of last 50 messages between users."""
+    """HTTP pollable feed of last 50 messages between users.
+
+    With ?wait=<seconds> an empty result is held open (long-poll) until a
+    new message arrives in this conversation or the wait passes.
+    """
     other_user = User.query.get_or_404(user_id)
     after_id = request.args.get('after', type=int)
-    msgs_query = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == other_user.id)) |
-        ((Message.sender_id == other_user.id) & (Message.receiver_id == current_user.id))
-    )
-    if after_id:
-        msgs_query = msgs_query.filter(Message.id > after_id)
-
-    msgs_query = msgs_query.order_by(Message.timestamp.asc()).limit(200).all()
-    msgs = list(msgs_query)
-    return jsonify([{
+    me, other = current_user.id, other_user.id
+
+    def fetch():
+        msgs_query = Message.query.filter(
+            ((Message.sender_id == me) & (Message.receiver_id == other)) |
+            ((Message.sender_id == other) & (Message.receiver_id == me))
+        )
+        if after_id:
+            msgs_query = msgs_query.filter(Message.id > after_id)
+        return msgs_query.order_by(Message.timestamp.asc()).limit(200).all()
+
+    topic = dm_topic(me, other)
+    msgs = _long_poll(topic, fetch)
+    return poll_advisor.hint(jsonify([{
         'id': m.id,
         'sender_id': m.sender_id,
         'receiver_id': m.receiver_id,
         'content': m.content,
         'timestamp': m.timestamp.strftime('%Y-%m-%d %H:%M'),
-    } for m in msgs])
+    } for m in msgs]), topic)
 
 
 # --------- CLASS CHAT API ---------
 
 def _classroom_access_or_403(classroom_id):
     classroom = ClassRoom.query.get_or_404(classroom_id)
-    if (current_user not in classroom.students) and (current_user.id != classroom.teacher_id) and (not current_user.is_admin):
+    if not can_access_classroom(current_user, classroom):
         return None
     return classroom
 
@@ -408,10 +513,10 @@ def _save_note_attachment(note: Note, upload):
         flash('File type not allowed', 'danger')
         return
 
-    upload_dir = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, '..', 'uploads')
-    os.makedirs(upload_dir, exist_ok=True)
+    folder = upload_dir()
+    os.makedirs(folder, exist_ok=True)
     unique_name = f"{uuid.uuid4().hex}_{filename}"
-    dest = os.path.join(upload_dir, unique_name)
+    dest = os.path.join(folder, unique_name)
     upload.save(dest)
 
     attach = NoteAttachment(
@@ -419,9 +524,14 @@ def _save_note_attachment(note: Note, upload):
         filename=filename,
         filepath=unique_name,
         mimetype=upload.mimetype,
-        size=os.path.getsize(dest)
+        size=os.path.getsize(dest),
+        processing_status='pending'
     )
+    registry.inc('upload_bytes_total', {'kind': 'attachment'}, attach.size)
     db.session.add(attach)
+    db.session.flush()
+    # Thumbnail / text extraction runs on the worker pool once the caller commits
+    attachment_processor.schedule(attach.id)
 
 
 @views.route('/class/join', methods=['POST'])
@@ -432,13 +542,15 @@ def join_class_by_code():
     if not classroom:
         flash('Invalid class code', 'danger')
         return redirect(url_for('views.classes'))
-    if current_user not in classroom.students:
-        classroom.students.append(current_user)
+    class_id, name, user_id = classroom.id, classroom.name, current_user.id
+    if not is_enrolled(user_id, class_id):
+        db.session.execute(insert(classroom_students).values(user_id=user_id, classroom_id=class_id))
         db.session.commit()
-        flash(f'Joined {classroom.name}', 'success')
+        membership_cache.invalidate(user_id)
+        flash(f'Joined {name}', 'success')
     else:
         flash('You are already in this class.', 'info')
-    return redirect(url_for('views.class_feed', class_id=classroom.id))
+    return redirect(url_for('views.class_feed', class_id=class_id))
 
 
 @views.route('/class/<int:class_id>/remove-student/<int:user_id>', methods=['POST'])
@@ -449,10 +561,13 @@ def remove_student(class_id, user_id):
         flash('Only teacher or admin can remove students', 'danger')
         return redirect(url_for('views.class_feed', class_id=class_id))
     student = User.query.get_or_404(user_id)
-    if student in classroom.students:
-        classroom.students.remove(student)
+    if is_enrolled(student.id, class_id):
+        name = student.first_name or student.email
+        db.session.execute(delete(classroom_students).where(
+            classroom_students.c.user_id == student.id, classroom_students.c.classroom_id == class_id))
         db.session.commit()
-        flash(f'Removed {student.first_name or student.email}', 'success')
+        membership_cache.invalidate(user_id)
+        flash(f'Removed {name}', 'success')
     return redirect(url_for('views.class_feed', class_id=class_id))
 
 
@@ -470,6 +585,7 @@ def class_chat_send(class_id):
     msg = ClassChatMessage(classroom_id=classroom.id, user_id=current_user.id, content=content)
     db.session.add(msg)
     db.session.commit()
+    feed_notifier.notify(class_chat_topic(class_id))
 
     return jsonify(success=True, message={
         'id': msg.id,
@@ -487,17 +603,24 @@ def class_chat_feed(class_id):
     if not classroom:
         return jsonify([]), 403
     after_id = request.args.get('after', type=int)
-    qs = ClassChatMessage.query.filter_by(classroom_id=classroom.id)
-    if after_id:
-        qs = qs.filter(ClassChatMessage.id > after_id)
-    msgs = qs.order_by(ClassChatMessage.timestamp.asc()).limit(200).all()
-    return jsonify([{
+    class_id = classroom.id
+
+    def fetch():
+        qs = ClassChatMessage.query.filter_by(classroom_id=class_id).options(selectinload(ClassChatMessage.user))
+        if after_id:
+            qs = qs.filter(ClassChatMessage.id > after_id)
+        return qs.order_by(ClassChatMessage.timestamp.asc()).limit(200).all()
+
+    # ?wait=<seconds>: long-poll until a new chat message or the timeout
+    topic = class_chat_topic(class_id)
+    msgs = _long_poll(topic, fetch)
+    return poll_advisor.hint(jsonify([{
         'id': m.id,
         'user_id': m.user_id,
         'author': m.user.first_name or m.user.email,
         'content': m.content,
         'timestamp': m.timestamp.strftime('%Y-%m-%d %H:%M'),
-    } for m in msgs])
+    } for m in msgs]), topic)
 
 
 @views.route('/class/<int:class_id>/polls', methods=['POST'])
@@ -584,7 +707,11 @@ def create_class_post(class_id):
         classroom_id=classroom.id
     )
     db.session.add(post)
+    db.session.flush()
+    event = {'class_id': class_id, 'post_id': post.id, 'title': post.title,
+             'author': current_user.first_name or current_user.email}
     db.session.commit()
+    event_hub.publish(class_topic(class_id), 'class_post', event)
     flash('Post added to class feed.', 'success')
     return redirect(url_for('views.class_feed', class_id=class_id))
 
@@ -605,7 +732,10 @@ def messages_mark_read(user_id):
         changed = True
     if changed:
         db.session.commit()
-    return jsonify(success=True, unread=Message.query.filter_by(receiver_id=current_user.id, is_read=False).count())
+    unread = Message.query.filter_by(receiver_id=current_user.id, is_read=False).count()
+    if changed:
+        _emit_unread_count(current_user.id, unread)
+    return jsonify(success=True, unread=unread)
 
 
 @views.route('/messages/unread-summary', methods=['GET'])
@@ -620,7 +750,35 @@ def messages_unread_summary():
     )
     per_sender = {sid: count for sid, count in rows}
     total = sum(per_sender.values())
-    return jsonify(total=total, per_sender=per_sender)
+    return poll_advisor.hint(jsonify(total=total, per_sender=per_sender), user_topic(current_user.id))
+
+
+@views.route('/events')
+@login_required
+def event_stream():
+    """Server-Sent Events: unread totals, new posts in the user's classes, comments on their notes."""
+    user_id = current_user.id
+    member_of = db.session.query(classroom_students.c.classroom_id).filter(classroom_students.c.user_id == user_id)
+    teaching = db.session.query(ClassRoom.id).filter(ClassRoom.teacher_id == user_id)
+    topics = {user_topic(user_id)} | {class_topic(cid) for (cid,) in member_of.union(teaching).all()}
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    cursor, backlog, gap = event_hub.resume(last_event_id)
+    snapshots = []
+    if gap:
+        snapshots.append(('reset', {}))
+    if last_event_id is None or gap:
+        unread = Message.query.filter_by(receiver_id=user_id, is_read=False).count()
+        snapshots.append(('unread', {'total': unread}))
+    db.session.close()  # nothing below touches the database
+
+    config = current_app.config
+    return Response(
+        event_hub.stream(topics, cursor, backlog, snapshots,
+                         config['SSE_STREAM_SECONDS'], config['SSE_HEARTBEAT_SECONDS']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @views.route('/attachments/<int:attachment_id>')
@@ -631,8 +789,17 @@ def download_attachment(attachment_id):
     if note.user_id != current_user.id and not note.is_public:
         flash("You don't have access to this file.", 'danger')
         return redirect(url_for('views.home'))
-    upload_dir = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, '..', 'uploads')
-    return send_from_directory(upload_dir, att.filepath, as_attachment=True, download_name=att.filename)
+    return send_from_directory(upload_dir(), att.filepath, as_attachment=True, download_name=att.filename)
+
+
+@views.route('/attachments/<int:attachment_id>/thumbnail')
+@login_required
+def attachment_thumbnail(attachment_id):
+    att = NoteAttachment.query.get_or_404(attachment_id)
+    note = att.note
+    if (note.user_id != current_user.id and not note.is_public) or not att.thumbnail_path:
+        return ('', 404)
+    return send_from_directory(upload_dir(), att.thumbnail_path, max_age=86400)
 
 
 # --------- USER SEARCH (AJAX for messages.html search box) ---------